@@ -1,8 +1,11 @@
 import streamlit as st
 import os
 from dotenv import load_dotenv
-import time
-from doc_processing import process_video  # Import the processing function
+from instrumentation import start_metrics_server
+from job_manager import get_job_manager
+from storage import read_artifact
+from uploads import save_upload
+from ui_helpers import current_user, show_editor
 hide_github_icon = """
 <style>
 #MainMenu {visibility: hidden;}
@@ -15,55 +18,86 @@ header {visibility: hidden;}
 # Inject custom CSS
 st.markdown(hide_github_icon, unsafe_allow_html=True)
 load_dotenv()
+start_metrics_server()
+
+# Longest time a page waits for a job to change before refreshing its progress
+JOB_POLL_INTERVAL = 2
 
-def save_uploaded_file(uploaded_file, save_path):
-    """Save uploaded file to disk."""
-    with open(save_path, "wb") as f:
-        f.write(uploaded_file.getbuffer())
-    return save_path
 
 def main():
     st.title("Video to Word and DrawIO Converter")
 
+    manager = get_job_manager()
     uploaded_file = st.file_uploader("Upload a video file", type=["mp4", "avi", "mov", "mkv"])
 
-    if "word_file" not in st.session_state:
-        st.session_state.word_file = None
-    if "drawio_file" not in st.session_state:
-        st.session_state.drawio_file = None
+    # The job ID is kept in the URL too, so a refreshed tab finds its job again
+    if "job_id" not in st.session_state:
+        st.session_state.job_id = st.query_params.get("job")
 
     if uploaded_file is not None:
-        save_path = os.path.join("temp_videos", uploaded_file.name)
-        os.makedirs("temp_videos", exist_ok=True)
-
         if st.button("Upload and Process"):
-            st.info("Processing... Please wait.")
-            save_uploaded_file(uploaded_file, save_path)
-
+            save_path, video_hash = save_upload(uploaded_file, uploaded_file.name)
             try:
-                word_file, drawio_file = process_video(save_path)
-                time.sleep(2)  # Wait to ensure files are fully written
+                st.session_state.job_id = manager.submit(save_path, name=uploaded_file.name, user=current_user(),
+                                                         video_hash=video_hash)
+                st.query_params["job"] = st.session_state.job_id
+            except RuntimeError as e:
+                # Turned away by admission control; the message says why
+                st.warning(str(e))
 
-                if word_file and os.path.exists(word_file) and drawio_file and os.path.exists(drawio_file):
-                    st.success("Processing completed successfully!")
+    if not st.session_state.job_id:
+        return
+    try:
+        job = manager.get(st.session_state.job_id)
+    except RuntimeError as e:
+        # The job service is unreachable
+        st.error(str(e))
+        return
+    if job is None:
+        st.warning(f"Job {st.session_state.job_id} is no longer available. Please process the video again.")
+        return
 
-                    # Store file paths in session state
-                    st.session_state.word_file = word_file
-                    st.session_state.drawio_file = drawio_file
+    # Read before rendering so a change while the page renders still triggers a rerun
+    version = job.version
+    if not job.done:
+        st.info(f"Job {job.job_id} ({job.name}): {job.stage_label}...")
+        st.progress(job.progress)
+        # Rerun as soon as the job moves to another stage, or every few seconds
+        job.wait(version, timeout=JOB_POLL_INTERVAL)
+        st.rerun()
 
-            except Exception as e:
-                st.error(f"Error: {str(e)}")
+    if job.status == "completed":
+        st.success("Processing completed successfully!")
+    elif job.status == "partial":
+        st.warning("Only some of the files could be generated.")
+    else:
+        st.error(f"Error: {job.error}")
+    if job.status != "completed" and st.button("Retry"):
+        # Completed stages are kept, so only the failed part runs again
+        try:
+            manager.retry(job.job_id)
+        except RuntimeError as e:
+            st.warning(str(e))
+        else:
+            st.rerun()
 
-    # Show download buttons only if files exist in session state
-    if st.session_state.word_file:
+    # Show download buttons only if the files are still available
+    word_data = read_artifact(job.word_file) if job.word_file else None
+    if word_data is not None:
         st.subheader("Word File")
-        with open(st.session_state.word_file, "rb") as wf:
-            st.download_button("Download Word File", data=wf, file_name=os.path.basename(st.session_state.word_file))
+        st.download_button("Download Word File", data=word_data, file_name=os.path.basename(job.word_file))
 
-    if st.session_state.drawio_file:
+    drawio_data = read_artifact(job.drawio_file) if job.drawio_file else None
+    if drawio_data is not None:
         st.subheader("DrawIO File")
-        with open(st.session_state.drawio_file, "rb") as df:
-            st.download_button("Download DrawIO File", data=df, file_name=os.path.basename(st.session_state.drawio_file))
+        st.download_button("Download DrawIO File", data=drawio_data, file_name=os.path.basename(job.drawio_file))
+
+    show_editor(manager, job)
+
+    # Per-stage timing breakdown of the job
+    if job.timings:
+        with st.expander(f"Timing breakdown (job {job.job_id})"):
+            st.table(job.timings)
 
 if __name__ == "__main__":
     main()
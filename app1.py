@@ -1,15 +1,16 @@
 import streamlit as st
 import os
 from dotenv import load_dotenv
-import time
 load_dotenv()
-from doc_processing import process_video  # Import the processing function
+from instrumentation import start_metrics_server
+from job_manager import get_job_manager
+from storage import read_artifact
+from uploads import save_upload
+from ui_helpers import current_user, show_editor
+start_metrics_server()
 
-def save_uploaded_file(uploaded_file, save_path):
-    """Save uploaded file to disk."""
-    with open(save_path, "wb") as f:
-        f.write(uploaded_file.getbuffer())
-    return save_path
+# Longest time a page waits for a job to change before refreshing its progress
+JOB_POLL_INTERVAL = 2
 
 # start Arun hide github on streamlit
 
@@ -51,42 +52,88 @@ st.markdown(
     )
 
 
+def show_job(job):
+    """Show live progress of a running job, or its results once it has finished."""
+    if not job.done:
+        st.info(f"Job {job.job_id} ({job.name}): {job.stage_label}...")
+        st.progress(job.progress)
+        return
+
+    if job.status == "completed":
+        st.success("Processing completed successfully!")
+    elif job.status == "partial":
+        st.warning("Only some of the files could be generated.")
+    elif job.error:
+        st.error(f"Error: {job.error}")
+    else:
+        st.error("Failed to generate files. One or more files do not exist.")
+
+    # Show download buttons only if the files are still available
+    word_data = read_artifact(job.word_file) if job.word_file else None
+    if word_data is not None:
+        st.subheader("Word File")
+        st.download_button("Download Word File", data=word_data, file_name=os.path.basename(job.word_file))
+
+    drawio_data = read_artifact(job.drawio_file) if job.drawio_file else None
+    if drawio_data is not None:
+        st.subheader("DrawIO File")
+        st.download_button("Download DrawIO File", data=drawio_data, file_name=os.path.basename(job.drawio_file))
+
+    if job.status != "completed" and st.button("Retry"):
+        # Completed stages are kept, so only the failed part runs again
+        try:
+            get_job_manager().retry(job.job_id)
+        except RuntimeError as e:
+            st.warning(str(e))
+        else:
+            st.rerun()
+
+    show_editor(get_job_manager(), job)
+
+    # Per-stage timing breakdown of this job
+    with st.expander(f"Timing breakdown (job {job.job_id})"):
+        st.table(job.timings)
+
+
 def main():
     st.title("Video to Word and DrawIO Converter")
 
-
+    manager = get_job_manager()
     uploaded_file = st.file_uploader("Upload a video file", type=["mp4", "avi", "mov", "mkv"])
 
-    if uploaded_file is not None:
-        save_path = os.path.join("temp_videos", uploaded_file.name)
-        os.makedirs("temp_videos", exist_ok=True)
+    # The job ID is kept in the URL too, so a refreshed tab finds its job again
+    if "job_id" not in st.session_state:
+        st.session_state.job_id = st.query_params.get("job")
 
+    if uploaded_file is not None:
         if st.button("Upload and Process"):
-            st.info("Processing... Please wait.")
+            save_path, video_hash = save_upload(uploaded_file, uploaded_file.name)
+            try:
+                st.session_state.job_id = manager.submit(save_path, name=uploaded_file.name, user=current_user(),
+                                                         video_hash=video_hash)
+                st.query_params["job"] = st.session_state.job_id
+            except RuntimeError as e:
+                # Turned away by admission control; the message says why
+                st.warning(str(e))
 
-            save_uploaded_file(uploaded_file, save_path)
+    job = unavailable = None
+    if st.session_state.job_id:
+        try:
+            job = manager.get(st.session_state.job_id)
+        except RuntimeError as e:
+            # The job service is unreachable
+            unavailable = str(e)
+    # Read before rendering so a change while the page renders still triggers a rerun
+    version = job.version if job is not None else None
+    running = job is not None and not job.done
+    if st.session_state.job_id:
+        if unavailable:
+            st.error(unavailable)
+        elif job is None:
+            st.warning(f"Job {st.session_state.job_id} is no longer available. Please process the video again.")
+        else:
+            show_job(job)
 
-            try:
-                word_file, drawio_file = process_video(save_path)
-                time.sleep(2)  # Wait to ensure files are fully written
-
-                if word_file and os.path.exists(word_file) and drawio_file and os.path.exists(drawio_file):
-                    st.success("Processing completed successfully!")
-                    
-                    # Download Word file
-                    st.subheader("Word File")
-                    with open(word_file, "rb") as wf:
-                        st.download_button("Download Word File", data=wf, file_name=os.path.basename(word_file))
-                    
-                    # Download DrawIO file
-                    st.subheader("DrawIO File")
-                    with open(drawio_file, "rb") as df:
-                        st.download_button("Download DrawIO File", data=df, file_name=os.path.basename(drawio_file))
-                else:
-                    st.error("Failed to generate files. One or more files do not exist.")
-            except Exception as e:
-                st.error(f"Error: {str(e)}")
-                
 # Informational section
     st.markdown(
         """
@@ -100,5 +147,10 @@ def main():
         unsafe_allow_html=True,
     )
 
+    if running:
+        # Rerun as soon as the job moves to another stage, or every few seconds
+        job.wait(version, timeout=JOB_POLL_INTERVAL)
+        st.rerun()
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,152 @@
+import argparse
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import doc_processing
+from result_cache import hash_file
+from rate_limiting import TokenBucket
+from instrumentation import JobTrace
+
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv')
+MANIFEST_NAME = "manifest.json"
+
+
+def find_videos(paths):
+    """Expand files and folders into a sorted list of supported video files."""
+    videos = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                videos.extend(os.path.join(root, name) for name in names
+                              if name.lower().endswith(VIDEO_EXTENSIONS))
+        elif path.lower().endswith(VIDEO_EXTENSIONS):
+            videos.append(path)
+    return sorted(set(videos))
+
+
+def load_manifest(output_dir):
+    manifest_path = os.path.join(output_dir, MANIFEST_NAME)
+    if not os.path.exists(manifest_path):
+        return {"jobs": {}}
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_manifest(output_dir, manifest):
+    manifest_path = os.path.join(output_dir, MANIFEST_NAME)
+    fd, tmp_path = tempfile.mkstemp(dir=output_dir, prefix=".tmp_", suffix=".json")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp_path, manifest_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _is_completed(job):
+    if job.get("status") != "completed":
+        return False
+    return all(job.get(field) and os.path.exists(job[field]) for field in ("word_file", "drawio_file"))
+
+
+def _run_job(video_path, video_hash, job_dir, use_cache, drawio_mode):
+    started = time.time()
+    trace = JobTrace()
+    word_file, drawio_file = doc_processing.process_video(video_path, use_cache=use_cache,
+                                                          output_dir=job_dir, video_hash=video_hash,
+                                                          drawio_mode=drawio_mode, trace=trace)
+    status = doc_processing.artifact_status(word_file, drawio_file)
+    return {
+        "status": status,
+        "word_file": word_file,
+        "drawio_file": drawio_file,
+        "error": None if status != "failed" else "No JSON extracted from the analysis.",
+        "duration": round(time.time() - started, 3),
+        "trace_id": trace.job_id,
+        "timings": trace.breakdown(),
+    }
+
+
+def run_batch(paths, output_dir, concurrency=2, requests_per_minute=None, use_cache=True,
+              drawio_mode=doc_processing.DRAWIO_MODE):
+    """Process every video under paths and return the batch manifest.
+
+    Jobs already marked completed in output_dir/manifest.json are skipped, so an
+    interrupted batch can be re-run with the same arguments to resume it.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = load_manifest(output_dir)
+    manifest_lock = threading.Lock()
+    if requests_per_minute:
+        previous_limiter = doc_processing.set_rate_limiter(TokenBucket(requests_per_minute))
+
+    pending = []
+    for video_path in find_videos(paths):
+        video_hash = hash_file(video_path)
+        job = manifest["jobs"].get(video_hash)
+        if job is not None and _is_completed(job):
+            print(f"Skipping completed job: {video_path}")
+            continue
+        stem = os.path.splitext(os.path.basename(video_path))[0]
+        job_dir = os.path.join(output_dir, f"{stem}-{video_hash[:12]}")
+        manifest["jobs"][video_hash] = {"video": video_path, "output_dir": job_dir, "status": "pending"}
+        pending.append((video_path, video_hash, job_dir))
+    save_manifest(output_dir, manifest)
+
+    batch_started = time.time()
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            futures = {executor.submit(_run_job, video_path, video_hash, job_dir, use_cache, drawio_mode): video_hash
+                       for video_path, video_hash, job_dir in pending}
+            for future in as_completed(futures):
+                video_hash = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    result = {"status": "failed", "error": str(e)}
+                with manifest_lock:
+                    manifest["jobs"][video_hash].update(result)
+                    save_manifest(output_dir, manifest)
+                print(f"{manifest['jobs'][video_hash]['video']}: {result['status']}")
+    finally:
+        if requests_per_minute:
+            doc_processing.set_rate_limiter(previous_limiter)
+
+    statuses = [job["status"] for job in manifest["jobs"].values()]
+    manifest["summary"] = {
+        "total": len(statuses),
+        "completed": statuses.count("completed"),
+        "partial": statuses.count("partial"),
+        "failed": statuses.count("failed"),
+        "processed_this_run": len(pending),
+        "elapsed_seconds": round(time.time() - batch_started, 3),
+    }
+    save_manifest(output_dir, manifest)
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert a batch of process recordings to Word and Draw.io files.")
+    parser.add_argument("paths", nargs="+", help="Video files or folders containing videos")
+    parser.add_argument("-o", "--output-dir", default="batch_output", help="Where job outputs and the manifest go")
+    parser.add_argument("-c", "--concurrency", type=int, default=2, help="Number of videos processed at once")
+    parser.add_argument("--rpm", type=float, default=None, help="Max Gemini generation requests per minute")
+    parser.add_argument("--no-cache", action="store_true", help="Ignore the local result cache")
+    parser.add_argument("--drawio-mode", choices=["local", "llm"], default=doc_processing.DRAWIO_MODE,
+                        help="Lay the diagram out locally or ask the model for it")
+    args = parser.parse_args()
+
+    manifest = run_batch(args.paths, args.output_dir, concurrency=args.concurrency,
+                         requests_per_minute=args.rpm, use_cache=not args.no_cache,
+                         drawio_mode=args.drawio_mode)
+    print(json.dumps(manifest["summary"], indent=2))
+
+
+if __name__ == "__main__":
+    main()
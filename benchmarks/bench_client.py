@@ -0,0 +1,101 @@
+"""Exercise the resilient Gemini client against a fake backend that injects errors and delays.
+
+Compares bare calls with retries alone and with retries plus hedged requests.
+Run from the repository root:
+
+    python -m benchmarks.bench_client [--requests 200] [--error-rate 0.1] [--json results.json]
+"""
+import argparse
+import json
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.synthetic import make_process
+from gemini_client import ResilientBackend
+from model_backend import FakeBackend, FlakyBackend
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, max(0, round(fraction * (len(values) - 1))))]
+
+
+def request(backend, index):
+    model = backend.GenerativeModel("fake-model", generation_config={"response_mime_type": "application/json"})
+    started = time.perf_counter()
+    try:
+        # Alternate between streamed and plain requests, as the pipeline uses both
+        if index % 2:
+            text = "".join(chunk.text for chunk in model.generate_content("Analyse", stream=True))
+        else:
+            text = model.generate_content("Analyse").text
+        json.loads(text)
+        return time.perf_counter() - started, None
+    except Exception as e:
+        return time.perf_counter() - started, type(e).__name__
+
+
+def run_scenario(name, backend, requests, concurrency):
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        outcomes = list(executor.map(lambda index: request(backend, index), range(requests)))
+    elapsed = time.perf_counter() - started
+    latencies = [seconds for seconds, error in outcomes if error is None]
+    errors = {}
+    for _, error in outcomes:
+        if error is not None:
+            errors[error] = errors.get(error, 0) + 1
+    result = {
+        "scenario": name,
+        "requests": requests,
+        "success_rate": len(latencies) / requests,
+        "errors": errors,
+        "seconds": elapsed,
+        "p50": statistics.median(latencies) if latencies else None,
+        "p95": percentile(latencies, 0.95) if latencies else None,
+        "p99": percentile(latencies, 0.99) if latencies else None,
+    }
+    p95 = f"{result['p95']:.3f} s" if latencies else "-"
+    print(f"{name:>16}: {result['success_rate'] * 100:5.1f}% ok, p95 {p95}, errors {errors}")
+    return result
+
+
+def run(args):
+    def flaky():
+        fake = FakeBackend(process_json=make_process(20), first_token_latency=1.0, tokens_per_second=2000,
+                           time_scale=args.time_scale)
+        return FlakyBackend(fake, error_rate=args.error_rate, slow_rate=args.slow_rate,
+                            slow_delay=args.slow_delay, seed=args.seed)
+
+    scenarios = {
+        "bare": flaky(),
+        "retries": ResilientBackend(flaky(), backoff_base=args.backoff_base, hedge_after=0),
+        "retries+hedging": ResilientBackend(flaky(), backoff_base=args.backoff_base,
+                                            hedge_after=args.hedge_after * args.time_scale),
+    }
+    return [run_scenario(name, backend, args.requests, args.concurrency) for name, backend in scenarios.items()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--error-rate", type=float, default=0.1)
+    parser.add_argument("--slow-rate", type=float, default=0.05)
+    parser.add_argument("--slow-delay", type=float, default=20.0, help="Simulated stall in seconds")
+    parser.add_argument("--hedge-after", type=float, default=3.0, help="Simulated seconds before hedging")
+    parser.add_argument("--backoff-base", type=float, default=0.05)
+    parser.add_argument("--time-scale", type=float, default=0.05)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="Write machine-readable results to this file")
+    args = parser.parse_args()
+
+    results = run(args)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
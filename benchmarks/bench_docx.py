@@ -0,0 +1,61 @@
+"""Compare Word generation time and file size of the legacy and style-based renderers.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_docx [--sizes 10 100 1000 10000] [--json results.json]
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+from benchmarks.synthetic import make_process
+from docx_renderer import render_document, render_document_legacy
+
+RENDERERS = {
+    "legacy": render_document_legacy,
+    "style": render_document,
+}
+
+
+def measure(render, json_data, output_dir, repeat):
+    timings = []
+    for _ in range(repeat):
+        path = os.path.join(output_dir, "bench.docx")
+        started = time.perf_counter()
+        render(json_data).save(path)
+        timings.append(time.perf_counter() - started)
+    return {"seconds": min(timings), "bytes": os.path.getsize(path)}
+
+
+def run(sizes, repeat=3):
+    results = []
+    with tempfile.TemporaryDirectory() as output_dir:
+        for size in sizes:
+            json_data = make_process(size)
+            # The legacy renderer is too slow to repeat at the largest sizes
+            for name, render in RENDERERS.items():
+                result = measure(render, json_data, output_dir, 1 if size >= 10000 else repeat)
+                result.update({"renderer": name, "sub_steps": size})
+                results.append(result)
+                print(f"{name:>7} {size:>6} sub-steps: {result['seconds'] * 1000:9.1f} ms "
+                      f"{result['bytes'] / 1024:9.1f} KiB")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000, 10000])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--json", help="Write machine-readable results to this file")
+    args = parser.parse_args()
+
+    results = run(args.sizes, args.repeat)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
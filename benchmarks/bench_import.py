@@ -0,0 +1,71 @@
+"""Check the cold import time of the modules the apps load at startup.
+
+Each module is imported in a fresh interpreter with -X importtime. Run from
+the repository root:
+
+    python -m benchmarks.bench_import [--budget-ms 400] [--repeat 5] [--json results.json]
+
+Exits with status 1 when an import exceeds the budget or loads one of the
+heavy dependencies that should only be imported on first use. The test
+suite runs the same check (tests/test_imports.py).
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+MODULES = ["doc_processing", "job_manager"]
+LAZY_DEPENDENCIES = ["google.generativeai", "docx"]
+IMPORT_BUDGET_MS = 400
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def measure(module):
+    """Return (cumulative import time in ms, heavy dependencies loaded) for one cold import."""
+    code = (f"import sys, json; import {module}; "
+            f"print(json.dumps([name for name in {LAZY_DEPENDENCIES!r} if name in sys.modules]))")
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                            capture_output=True, text=True, check=True, cwd=ROOT)
+    cumulative = None
+    for line in result.stderr.splitlines():
+        parts = line.split("|")
+        if len(parts) == 3 and parts[2].strip() == module:
+            cumulative = int(parts[1].strip()) / 1000
+    return cumulative, json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def run(modules, repeat, budget_ms):
+    results = []
+    for module in modules:
+        timings = []
+        for _ in range(repeat):
+            milliseconds, loaded = measure(module)
+            timings.append(milliseconds)
+        result = {"module": module, "milliseconds": min(timings), "lazy_dependencies_loaded": loaded,
+                  "budget_ms": budget_ms}
+        result["ok"] = result["milliseconds"] <= budget_ms and not loaded
+        results.append(result)
+        print(f"{module:>16}: {result['milliseconds']:7.1f} ms (budget {budget_ms} ms)"
+              + (f", loads {', '.join(loaded)}" if loaded else ""))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--modules", nargs="+", default=MODULES)
+    parser.add_argument("--budget-ms", type=float, default=IMPORT_BUDGET_MS)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--json", help="Write machine-readable results to this file")
+    args = parser.parse_args()
+
+    results = run(args.modules, args.repeat, args.budget_ms)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    if not all(result["ok"] for result in results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
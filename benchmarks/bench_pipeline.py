@@ -0,0 +1,200 @@
+"""Benchmark process_video offline against the fake Gemini backend.
+
+Measures end-to-end latency, throughput at several concurrency levels and the
+docx/drawio rendering cost for synthetic process sizes. Run from the
+repository root:
+
+    python -m benchmarks.bench_pipeline [--time-scale 0.1] [--json results.json]
+        [--baseline previous.json --tolerance 0.2]
+
+With --baseline the run exits with status 1 when any timing is more than
+tolerance (relative) slower than the same timing in the baseline file.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import doc_processing as dp
+from benchmarks.synthetic import make_process
+from docx_renderer import render_document
+from drawio_layout import build_drawio_xml
+from instrumentation import JobTrace
+from model_backend import FakeBackend
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, round(fraction * (len(values) - 1))))
+    return values[index]
+
+
+def make_video(directory, index, size_mb):
+    """Write a dummy recording; random content gives every job its own hash and upload."""
+    path = os.path.join(directory, f"recording_{index:04d}.mp4")
+    with open(path, "wb") as f:
+        f.write(os.urandom(int(size_mb * 1024 * 1024)))
+    return path
+
+
+def run_job(video_path, drawio_mode):
+    trace = JobTrace()
+    output_dir = os.path.splitext(video_path)[0]
+    started = time.perf_counter()
+    word_file, drawio_file = dp.process_video(video_path, use_cache=False, output_dir=output_dir,
+                                              drawio_mode=drawio_mode, preprocess=False, trace=trace)
+    seconds = time.perf_counter() - started
+    if not word_file or not drawio_file:
+        raise RuntimeError(f"Pipeline did not produce both files for {video_path}")
+    return seconds, trace.breakdown()
+
+
+def bench_end_to_end(work_dir, runs, size_mb, drawio_mode):
+    timings = []
+    stages = {}
+    for index in range(runs):
+        seconds, breakdown = run_job(make_video(work_dir, index, size_mb), drawio_mode)
+        timings.append(seconds)
+        for item in breakdown:
+            stages.setdefault(item["stage"], []).append(item["seconds"])
+    result = {
+        "runs": runs,
+        "p50": statistics.median(timings),
+        "p95": percentile(timings, 0.95),
+        "stages": {name: statistics.median(values) for name, values in stages.items()},
+    }
+    print(f"end-to-end: p50 {result['p50']:.3f} s, p95 {result['p95']:.3f} s over {runs} runs")
+    return result
+
+
+def bench_throughput(work_dir, concurrency_levels, jobs_per_worker, size_mb, drawio_mode):
+    results = []
+    offset = 1000
+    for concurrency in concurrency_levels:
+        jobs = concurrency * jobs_per_worker
+        paths = [make_video(work_dir, offset + index, size_mb) for index in range(jobs)]
+        offset += jobs
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            timings = [seconds for seconds, _ in executor.map(lambda path: run_job(path, drawio_mode), paths)]
+        elapsed = time.perf_counter() - started
+        result = {
+            "concurrency": concurrency,
+            "jobs": jobs,
+            "seconds": elapsed,
+            "jobs_per_minute": jobs * 60 / elapsed,
+            "p95": percentile(timings, 0.95),
+        }
+        results.append(result)
+        print(f"concurrency {concurrency:>2}: {result['jobs_per_minute']:8.1f} jobs/min, "
+              f"p95 {result['p95']:.3f} s")
+    return results
+
+
+def bench_render(work_dir, sizes):
+    results = []
+    for size in sizes:
+        json_data = make_process(size)
+        started = time.perf_counter()
+        render_document(json_data).save(os.path.join(work_dir, "bench.docx"))
+        docx_seconds = time.perf_counter() - started
+        started = time.perf_counter()
+        build_drawio_xml(json_data)
+        drawio_seconds = time.perf_counter() - started
+        results.append({"sub_steps": size, "docx_seconds": docx_seconds, "drawio_seconds": drawio_seconds})
+        print(f"render {size:>6} sub-steps: docx {docx_seconds * 1000:8.1f} ms, "
+              f"drawio {drawio_seconds * 1000:8.1f} ms")
+    return results
+
+
+def timings(results):
+    """Flatten the results into metric name -> seconds, for comparing against a baseline."""
+    flat = {"end_to_end.p50": results["end_to_end"]["p50"], "end_to_end.p95": results["end_to_end"]["p95"]}
+    for item in results["throughput"]:
+        flat[f"throughput.c{item['concurrency']}.seconds_per_job"] = item["seconds"] / item["jobs"]
+    for item in results["render"]:
+        flat[f"render.{item['sub_steps']}.docx"] = item["docx_seconds"]
+        flat[f"render.{item['sub_steps']}.drawio"] = item["drawio_seconds"]
+    return flat
+
+
+def compare(results, baseline, tolerance):
+    """Return a message for every timing more than tolerance slower than the baseline."""
+    current = timings(results)
+    previous = timings(baseline)
+    regressions = []
+    for name, seconds in current.items():
+        if name in previous and previous[name] > 0 and seconds > previous[name] * (1 + tolerance):
+            regressions.append(f"{name}: {previous[name]:.4f} s -> {seconds:.4f} s "
+                               f"(+{(seconds / previous[name] - 1) * 100:.0f}%)")
+    return regressions
+
+
+def run(args):
+    backend = FakeBackend(
+        process_json=make_process(args.steps),
+        upload_bandwidth=args.upload_mbps * 1024 * 1024 / 8,
+        processing_delay=args.processing_delay,
+        first_token_latency=args.first_token_latency,
+        tokens_per_second=args.tokens_per_second,
+        time_scale=args.time_scale,
+    )
+    dp.set_model_backend(backend)
+    dp.set_context_cache_manager(None)
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as work_dir:
+        # The file registry and metrics export write relative to the working directory
+        os.chdir(work_dir)
+        try:
+            results = {
+                "config": {key: value for key, value in vars(args).items() if key not in ("json", "baseline")},
+                "end_to_end": bench_end_to_end(work_dir, args.runs, args.video_mb, args.drawio_mode),
+                "throughput": bench_throughput(work_dir, args.concurrency, args.jobs_per_worker,
+                                               args.video_mb, args.drawio_mode),
+                "render": bench_render(work_dir, args.sizes),
+                "api_calls": len(backend.calls),
+            }
+        finally:
+            os.chdir(cwd)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5, help="Sequential jobs for the latency run")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--jobs-per-worker", type=int, default=2)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000, 10000])
+    parser.add_argument("--steps", type=int, default=50, help="Sub-steps in the canned analysis")
+    parser.add_argument("--video-mb", type=float, default=5.0)
+    parser.add_argument("--upload-mbps", type=float, default=20.0)
+    parser.add_argument("--processing-delay", type=float, default=10.0)
+    parser.add_argument("--first-token-latency", type=float, default=5.0)
+    parser.add_argument("--tokens-per-second", type=float, default=150.0)
+    parser.add_argument("--time-scale", type=float, default=0.1,
+                        help="Multiplier for the simulated delays (1.0 is real time)")
+    parser.add_argument("--drawio-mode", choices=["local", "llm"], default=dp.DRAWIO_MODE)
+    parser.add_argument("--json", help="Write machine-readable results to this file")
+    parser.add_argument("--baseline", help="Fail when slower than the results in this file")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    results = run(args)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for message in regressions:
+            print("Regression:", message)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
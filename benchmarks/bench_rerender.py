@@ -0,0 +1,70 @@
+"""Time re-rendering a job's files after a one-step edit against rendering them from scratch.
+
+Uses the local diagram layout, so no model is involved. Run from the
+repository root:
+
+    python -m benchmarks.bench_rerender [--sizes 20 200 1000] [--json results.json]
+"""
+import argparse
+import copy
+import json
+import statistics
+import tempfile
+import time
+
+import docx_renderer
+import drawio_layout
+from benchmarks.synthetic import make_process
+from checkpoints import Checkpoint
+from doc_processing import generate_artifacts, rerender_artifacts
+
+
+def clear_fragments():
+    docx_renderer._cached_table_xml.cache_clear()
+    drawio_layout._cached_lane_xml.cache_clear()
+    drawio_layout._edges_xml.cache_clear()
+
+
+def measure(size, repeat):
+    process = make_process(size)
+    full, incremental = [], []
+    for attempt in range(repeat):
+        output_dir = tempfile.mkdtemp(prefix="bench-rerender-")
+        clear_fragments()
+        started = time.perf_counter()
+        checkpoint = Checkpoint(output_dir)
+        generate_artifacts(process, output_dir, "local", checkpoint)
+        checkpoint.save_json("parse", process)
+        full.append(time.perf_counter() - started)
+
+        edited = copy.deepcopy(process)
+        group = edited["list_of_steps"][len(edited["list_of_steps"]) // 2]
+        group["sub_steps"][0]["step"] = f"Edited step {attempt}"
+        started = time.perf_counter()
+        rerender_artifacts(output_dir, edited, "local")
+        incremental.append(time.perf_counter() - started)
+    result = {
+        "sub_steps": size,
+        "full_ms": statistics.median(full) * 1000,
+        "rerender_ms": statistics.median(incremental) * 1000,
+    }
+    print(f"{size:>6} sub-steps: full render {result['full_ms']:7.1f} ms, "
+          f"re-render after one edit {result['rerender_ms']:7.1f} ms")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[20, 200, 1000])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--json", help="Write machine-readable results to this file")
+    args = parser.parse_args()
+
+    results = [measure(size, args.repeat) for size in args.sizes]
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""Compare first-come-first-served with the fair scheduler when one user floods the queue.
+
+A heavy user submits several long videos just before light users submit
+short ones; the light users' queueing delay is what fair scheduling should
+cut. Jobs only sleep for their simulated cost. Run from the repository root:
+
+    python -m benchmarks.bench_scheduler [--heavy-jobs 6] [--light-users 4] [--json results.json]
+"""
+import argparse
+import json
+import statistics
+import threading
+import time
+
+from scheduler import FairScheduler
+
+
+def run_scenario(name, args, fair):
+    done = threading.Event()
+    waits = {}
+    lock = threading.Lock()
+
+    def run(task_id, payload):
+        user, submitted, cost = payload
+        with lock:
+            waits[task_id] = (user, time.perf_counter() - submitted)
+        time.sleep(cost * args.time_scale)
+        with lock:
+            if len(waits) == total:
+                done.set()
+
+    # Without fairness every job counts as the same user, which makes the queue FIFO
+    scheduler = FairScheduler(run, max_running=args.workers, max_queued=1000, max_queued_per_user=1000,
+                              max_wait=float("inf"), weights={})
+    jobs = [("heavy", args.heavy_cost)] * args.heavy_jobs
+    jobs += [(f"light-{index}", args.light_cost) for index in range(args.light_users)]
+    total = len(jobs)
+    for index, (user, cost) in enumerate(jobs):
+        scheduler.submit(index, user if fair else "everyone", cost, (user, time.perf_counter(), cost))
+    done.wait()
+
+    light = [wait / args.time_scale for user, wait in waits.values() if user != "heavy"]
+    heavy = [wait / args.time_scale for user, wait in waits.values() if user == "heavy"]
+    result = {
+        "scenario": name,
+        "light_wait_mean": statistics.mean(light),
+        "light_wait_max": max(light),
+        "heavy_wait_mean": statistics.mean(heavy),
+    }
+    print(f"{name:>6}: light users wait {result['light_wait_mean']:6.0f} s on average "
+          f"(max {result['light_wait_max']:.0f} s), heavy user {result['heavy_wait_mean']:.0f} s")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--heavy-jobs", type=int, default=6)
+    parser.add_argument("--heavy-cost", type=float, default=600, help="Simulated seconds per heavy job")
+    parser.add_argument("--light-users", type=int, default=4)
+    parser.add_argument("--light-cost", type=float, default=60, help="Simulated seconds per light job")
+    parser.add_argument("--time-scale", type=float, default=0.0005)
+    parser.add_argument("--json", help="Write machine-readable results to this file")
+    args = parser.parse_args()
+
+    results = [run_scenario("fifo", args, fair=False), run_scenario("fair", args, fair=True)]
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
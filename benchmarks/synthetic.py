@@ -0,0 +1,29 @@
+def make_process(sub_steps, steps_per_group=10, applications=3):
+    """Build a process JSON shaped like the analysis output with sub_steps sub-steps."""
+    groups = []
+    for group_index in range(-(-sub_steps // steps_per_group)):
+        count = min(steps_per_group, sub_steps - group_index * steps_per_group)
+        groups.append({
+            "group_name": f"Open application {group_index + 1} and complete the form",
+            "numbering": f"{group_index + 1}.0",
+            "time_stamp": f"{group_index // 60:02d}:{group_index % 60:02d}",
+            "sub_steps": [
+                {
+                    "step": f"Click the 'Field {step + 1}' input and enter the value from the request form",
+                    "numbering": f"{group_index + 1}.{step + 1}",
+                    "time_stamp": f"{group_index // 60:02d}:{group_index % 60:02d}",
+                }
+                for step in range(count)
+            ],
+        })
+    return {
+        "process_name": f"Synthetic Process {sub_steps}",
+        "short_process_description": "Synthetic process used for benchmarking the renderers.",
+        "list_of_applications": [
+            {"application_name": f"Application {i + 1}", "type": "web", "url": f"https://app{i + 1}.example.com"}
+            for i in range(applications)
+        ],
+        "list_of_steps": groups,
+        "exceptions": [{"exception": "Missing data", "description": "Return the request to the requester."}],
+        "clarifications": ["Which approver handles requests above the limit?"],
+    }
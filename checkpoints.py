@@ -0,0 +1,108 @@
+import json
+import os
+import tempfile
+import threading
+import time
+
+CHECKPOINT_FILE = "checkpoint.json"
+
+# Pipeline stages in the order process_video runs them
+STAGES = ("verify", "preprocess", "upload", "activate", "analyse", "parse", "render_docx", "render_drawio")
+
+
+def _write_text(path, text):
+    """Atomically replace path with text, via a uniquely named temp file beside it."""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp_")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class Checkpoint:
+    """Outputs of the completed pipeline stages of one job, saved in its output directory.
+
+    A retry with the same directory skips every completed stage. When
+    fingerprint (video hash, prompt and models) differs from the saved one,
+    the old checkpoint is discarded; pass None to open it as it is, e.g. to
+    regenerate a single artifact.
+    """
+
+    def __init__(self, job_dir, fingerprint=None):
+        self.job_dir = job_dir
+        self.path = os.path.join(job_dir, CHECKPOINT_FILE)
+        self._lock = threading.Lock()
+        self.state = self._load()
+        if fingerprint is not None and self.state.get("fingerprint") != fingerprint:
+            self.state = {"fingerprint": fingerprint, "stages": {}}
+
+    def _load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return {"fingerprint": None, "stages": {}}
+
+    def _write(self):
+        os.makedirs(self.job_dir, exist_ok=True)
+        _write_text(self.path, json.dumps(self.state, indent=2))
+
+    def done(self, stage):
+        return stage in self.state["stages"]
+
+    def get(self, stage):
+        return self.state["stages"].get(stage)
+
+    def completed(self):
+        """Names of the completed stages in pipeline order."""
+        return [stage for stage in STAGES if self.done(stage)]
+
+    def save(self, stage, **data):
+        with self._lock:
+            self.state["stages"][stage] = {**data, "completed": time.time()}
+            self._write()
+
+    def discard(self, *stages):
+        with self._lock:
+            for stage in stages:
+                self.state["stages"].pop(stage, None)
+            self._write()
+
+    def clear(self):
+        """Forget every completed stage, so the job runs again from the start."""
+        with self._lock:
+            self.state["stages"] = {}
+            self._write()
+
+    def save_text(self, stage, text, extension=".txt", **data):
+        """Save a stage whose output is text, such as the raw model response."""
+        name = stage + extension
+        _write_text(os.path.join(self.job_dir, name), text)
+        self.save(stage, file=name, **data)
+
+    def load_text(self, stage):
+        data = self.get(stage)
+        if data is None or not data.get("file"):
+            return None
+        try:
+            with open(os.path.join(self.job_dir, data["file"]), "r", encoding="utf-8") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def save_json(self, stage, json_data, **data):
+        # Not indented: that would bypass the C encoder, which matters for large processes
+        self.save_text(stage, json.dumps(json_data), extension=".json", **data)
+
+    def load_json(self, stage):
+        text = self.load_text(stage)
+        if text is None:
+            return None
+        try:
+            return json.loads(text)
+        except json.JSONDecodeError:
+            return None
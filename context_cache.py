@@ -0,0 +1,225 @@
+import datetime
+import hashlib
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from model_backend import gemini
+
+CONTEXT_CACHE_ENABLED = os.getenv("CONTEXT_CACHE", "1") == "1"
+CONTEXT_CACHE_TTL = int(os.getenv("CONTEXT_CACHE_TTL", "3600"))
+CONTEXT_CACHE_MAX_ENTRIES = int(os.getenv("CONTEXT_CACHE_MAX_ENTRIES", "20"))
+
+# Extend a cache's TTL on use once less than this many seconds remain
+REFRESH_MARGIN = 300
+# Don't retry creating a cache that the API refused (e.g. below the minimum token count)
+FAILURE_BACKOFF = 3600
+
+
+def _caching():
+    gemini()
+    from google.generativeai import caching
+    return caching
+
+
+class GeminiCacheBackend:
+    """Context caches stored by the Gemini API through google.generativeai.caching."""
+
+    def create(self, model, system_instruction, contents, ttl, display_name):
+        cache = _caching().CachedContent.create(
+            model=model,
+            display_name=display_name,
+            system_instruction=system_instruction,
+            contents=contents,
+            ttl=datetime.timedelta(seconds=ttl),
+        )
+        return cache.name
+
+    def extend(self, name, ttl):
+        _caching().CachedContent.get(name).update(ttl=datetime.timedelta(seconds=ttl))
+
+    def delete(self, name):
+        _caching().CachedContent.get(name).delete()
+
+    def model_for(self, name, generation_config=None):
+        return gemini().GenerativeModel.from_cached_content(
+            cached_content=_caching().CachedContent.get(name),
+            generation_config=generation_config,
+        )
+
+
+class FakeCacheBackend:
+    """In-memory stand-in for GeminiCacheBackend that follows the same lifecycle."""
+
+    def __init__(self, clock=time.time, fail_models=()):
+        self.clock = clock
+        self.fail_models = set(fail_models)
+        self.caches = {}
+        self.calls = []
+        self._counter = 0
+
+    def _get(self, name):
+        cache = self.caches.get(name)
+        if cache is None or cache["expires_at"] <= self.clock():
+            self.caches.pop(name, None)
+            raise KeyError(f"Cached content {name} not found.")
+        return cache
+
+    def create(self, model, system_instruction, contents, ttl, display_name):
+        self.calls.append(("create", display_name))
+        if model in self.fail_models:
+            raise ValueError(f"Cached content is too small for {model}.")
+        self._counter += 1
+        name = f"cachedContents/fake-{self._counter}"
+        self.caches[name] = {
+            "model": model,
+            "system_instruction": system_instruction,
+            "contents": list(contents or []),
+            "expires_at": self.clock() + ttl,
+        }
+        return name
+
+    def extend(self, name, ttl):
+        self.calls.append(("extend", name))
+        self._get(name)["expires_at"] = self.clock() + ttl
+
+    def delete(self, name):
+        self.calls.append(("delete", name))
+        self.caches.pop(name, None)
+
+    def model_for(self, name, generation_config=None):
+        self.calls.append(("model_for", name))
+        return FakeCachedModel(self._get(name))
+
+
+class FakeCachedModel:
+    def __init__(self, cache):
+        self.cache = cache
+
+    def generate_content(self, contents, stream=False):
+        return FakeResponse(f"Answer from {self.cache['model']} for: {contents}")
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+    def __iter__(self):
+        yield self
+
+
+def cache_key(model, system_instruction, content_ids):
+    digest = hashlib.sha256()
+    for part in [model, system_instruction or "", *content_ids]:
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class ContextCacheManager:
+    """Create, reuse, refresh and evict context caches for prompts and uploaded files.
+
+    Entries are tracked per process. A cache whose creation fails is remembered
+    for FAILURE_BACKOFF seconds so callers fall back to uncached requests
+    without hitting the API again.
+    """
+
+    def __init__(self, backend=None, ttl=CONTEXT_CACHE_TTL, max_entries=CONTEXT_CACHE_MAX_ENTRIES,
+                 clock=time.time):
+        self.backend = backend if backend is not None else GeminiCacheBackend()
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.clock = clock
+        self.entries = {}
+        self.failures = {}
+        self._lock = threading.Lock()
+        self._key_locks = {}
+
+    @contextmanager
+    def _key_lock(self, key):
+        # Serialise work on one key without blocking the others during remote calls
+        with self._lock:
+            lock, users = self._key_locks.get(key, (threading.Lock(), 0))
+            self._key_locks[key] = (lock, users + 1)
+        try:
+            with lock:
+                yield
+        finally:
+            with self._lock:
+                lock, users = self._key_locks[key]
+                if users == 1:
+                    del self._key_locks[key]
+                else:
+                    self._key_locks[key] = (lock, users - 1)
+
+    def get_or_create(self, model, system_instruction=None, contents=None, content_ids=(),
+                      display_name="video-doc-process"):
+        """Return the cached content name for this model/prompt/contents, or None."""
+        key = cache_key(model, system_instruction, list(content_ids))
+        with self._key_lock(key):
+            now = self.clock()
+            with self._lock:
+                if self.failures.get(key, 0) > now:
+                    return None
+                entry = self.entries.get(key)
+                if entry is not None and entry["expires_at"] > now:
+                    entry["last_used"] = now
+                else:
+                    self.entries.pop(key, None)
+                    entry = None
+            if entry is not None and entry["expires_at"] - now < REFRESH_MARGIN:
+                try:
+                    self.backend.extend(entry["name"], self.ttl)
+                    entry["expires_at"] = now + self.ttl
+                except Exception as e:
+                    print("Error extending context cache:", e)
+                    with self._lock:
+                        self.entries.pop(key, None)
+                    entry = None
+            if entry is not None:
+                return entry["name"]
+            try:
+                name = self.backend.create(model, system_instruction, contents, self.ttl, display_name)
+            except Exception as e:
+                print("Context cache not created, using uncached requests:", e)
+                with self._lock:
+                    self.failures[key] = now + FAILURE_BACKOFF
+                return None
+            with self._lock:
+                self.entries[key] = {"name": name, "expires_at": now + self.ttl, "last_used": now}
+                evicted = self._evict(now)
+            self._delete(evicted)
+            return name
+
+    def _evict(self, now):
+        """Drop expired entries and return the least recently used ones over max_entries."""
+        for key, entry in list(self.entries.items()):
+            if entry["expires_at"] <= now:
+                del self.entries[key]
+        excess = len(self.entries) - self.max_entries
+        if excess <= 0:
+            return []
+        # Keys another thread is working on stay, so it never hands out a deleted cache
+        idle = [item for item in self.entries.items() if item[0] not in self._key_locks]
+        evicted = []
+        for key, entry in sorted(idle, key=lambda item: item[1]["last_used"])[:excess]:
+            del self.entries[key]
+            evicted.append(entry)
+        return evicted
+
+    def _delete(self, entries):
+        for entry in entries:
+            try:
+                self.backend.delete(entry["name"])
+            except Exception as e:
+                print("Error deleting context cache:", e)
+
+    def model_for(self, name, generation_config=None):
+        return self.backend.model_for(name, generation_config)
+
+    def clear(self):
+        with self._lock:
+            entries = list(self.entries.values())
+            self.entries.clear()
+        self._delete(entries)
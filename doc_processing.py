@@ -1,69 +1,59 @@
-import google.generativeai as genai
+import io
 import os
-import time
-import pandas as pd
-from google.generativeai import caching
-from docx import Document
-from docx.shared import Pt, RGBColor, Inches
-from docx.enum.text import WD_ALIGN_PARAGRAPH
-from docx.oxml.ns import qn
-from docx.oxml import OxmlElement
+import asyncio
+import random
 from dotenv import load_dotenv
 import json
-import re
-import xml.etree.ElementTree as ET
+import subprocess
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from result_cache import ResultCache, hash_file, hash_text
+from checkpoints import Checkpoint
+from file_registry import FileRegistry
+from drawio_layout import build_drawio_xml, DRAWIO_LAYOUT_VERSION
+from drawio_validation import relabel_drawio, repair_drawio_locally, structural_errors
+from context_cache import ContextCacheManager, CONTEXT_CACHE_ENABLED
+from model_backend import GeminiBackend
+from gemini_client import ResilientBackend
+from storage import read_artifact, remove_artifact, write_artifact
+from scheduler import inflight
+from instrumentation import JobTrace, current_span, export_job, run_in_context, stage
+from step_schema import (PROCESS_SCHEMA, StreamingStepParser, check_process, normalize_process, repair_locally,
+                         section_hashes, validate_step_group)
+from video_preprocessing import (PREPROCESS_VIDEO, PREPROCESS_MAX_HEIGHT, PREPROCESS_FPS, PREPROCESS_DEDUPE,
+                                 detect_mime_type, preprocess_video, remap_timestamps)
+from segmented_analysis import LONG_VIDEO_THRESHOLD, analyse_in_segments, format_timestamp, probe_duration
 
 # Load environment variables from .env file
 load_dotenv()
 
-# Configure API Key (Ensure to set this in your environment)
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-genai.configure(api_key=GEMINI_API_KEY)
+# google.generativeai and python-docx are imported on first use to keep this module
+# fast to import; model_backend.gemini() configures GEMINI_API_KEY at that point
 
-def verify_video(video_path):
-    if not os.path.exists(video_path):
-        raise FileNotFoundError("Video file not found.")
-    if not video_path.lower().endswith(('.mp4', '.avi', '.mov', '.mkv')):
-        raise ValueError("Invalid file format. Only MP4, AVI, MOV, and MKV videos are allowed.")
-    return True
+ANALYSIS_MODEL = "gemini-1.5-pro-latest"
+DRAWIO_MODEL = "gemini-1.5-flash-002"
+REPAIR_MODEL = "gemini-1.5-flash-002"
+# Context caching needs explicitly versioned models
+ANALYSIS_CACHE_MODEL = "models/gemini-1.5-pro-002"
+DRAWIO_CACHE_MODEL = "models/gemini-1.5-flash-002"
 
-def upload_to_gemini(path, mime_type="video/mp4"):
-    file = genai.upload_file(path, mime_type=mime_type)
-    print(f"Uploaded file '{file.display_name}' as: {file.uri}")
-    return file
+# Overall limit for uploaded files to leave the PROCESSING state
+FILE_ACTIVE_TIMEOUT = int(os.getenv("FILE_ACTIVE_TIMEOUT", "900"))
 
-def wait_for_files_active(files):
-    print("Waiting for file processing...")
-    for name in (file.name for file in files):
-        file = genai.get_file(name)
-        while file.state.name == "PROCESSING":
-            print(".", end="", flush=True)
-            time.sleep(10)
-            file = genai.get_file(name)
-    print("Processing complete.")
+# analyse_video's result when the model returned no text
+NO_DATA_EXTRACTED = "No data extracted."
+
+# "local" lays the diagram out from the step JSON, "llm" asks DRAWIO_MODEL for it
+DRAWIO_MODE = os.getenv("DRAWIO_MODE", "local")
+
+# Shared context caches for the static prompts and uploaded videos
+_context_caches = ContextCacheManager() if CONTEXT_CACHE_ENABLED else None
+
+# Uploads, file lookups and models go through this backend, see set_model_backend
+_backend = ResilientBackend(GeminiBackend())
 
-def set_table_borders(table, border_color="auto"):
-    for row in table.rows:
-        for cell in row.cells:
-            tc = cell._element
-            tcPr = tc.get_or_add_tcPr()
-            tcBorders = OxmlElement('w:tcBorders')
-            for border in ['top', 'left', 'bottom', 'right', 'insideH', 'insideV']:
-                border_elem = OxmlElement(f'w:{border}')
-                border_elem.set(qn('w:val'), 'single')
-                border_elem.set(qn('w:sz'), '4')
-                border_elem.set(qn('w:space'), '0')
-                if border_color != "auto":
-                    border_elem.set(qn('w:color'), border_color)
-                tcBorders.append(border_elem)
-            tcPr.append(tcBorders)
-
-def process_video(video_path):
-    verify_video(video_path)
-    file = upload_to_gemini(video_path)
-    wait_for_files_active([file])
-    model = genai.GenerativeModel("gemini-1.5-pro-latest")
-    response = model.generate_content(["""You are a Business Analyst tasked with reviewing a process recording from the Subject Matter Expert (SME) in the form of a video. Your objective is to carefully analyze the video and extract a detailed, step-by-step outline of the process presented. The video may not cover the process end-to-end, so you need to assess both the explicit steps presented and any references the SME makes to previous steps.
+PDD_ANALYSIS_PROMPT = """You are a Business Analyst tasked with reviewing a process recording from the Subject Matter Expert (SME) in the form of a video. Your objective is to carefully analyze the video and extract a detailed, step-by-step outline of the process presented. The video may not cover the process end-to-end, so you need to assess both the explicit steps presented and any references the SME makes to previous steps.
 
 Your outline should be clear, precise, and suitable for inclusion in formal documentation, such as a Process Definition Document (PDD). Ensure that each step is detailed, any business exceptions are noted, and the process is presented in the order it is executed. Pay attention to the narrator’s comments to identify any transitions or additional information.
 
@@ -156,68 +146,9 @@ Provide the output in the following JSON format:
     "[Required clarification or question]",
     "[Required clarification or question]"
   ]
-}""", file])
-    
-    processed_text = response.text if response else "No data extracted."
-    pattern = r"\{.*\}"
-    json_match = re.search(pattern, processed_text, re.DOTALL)
-    if json_match:
-        json_str = json_match.group(0)
-        try:
-            json_data = json.loads(json_str)
-        except json.JSONDecodeError as e:
-            print("Error decoding JSON:", e)
-            return None, None
-    else:
-        print("No JSON found in the text.")
-        return None, None
-
-    # Generate Word file
-    doc = Document()
-    doc.styles['Normal'].font.name = 'Calibri'
-    doc.styles['Normal'].font.size = Pt(11)
-    doc.add_heading('Process Name: ' + json_data["process_name"], level=1)
-    doc.add_paragraph(json_data["short_process_description"])
-    doc.add_heading('List of applications', level=2)
-    table = doc.add_table(rows=1, cols=3)
-    hdr_cells = table.rows[0].cells
-    hdr_cells[0].text = 'Application Name'
-    hdr_cells[1].text = 'Type'
-    hdr_cells[2].text = 'URL'
-    for cell in hdr_cells:
-        cell.paragraphs[0].runs[0].bold = True
-    for app in json_data["list_of_applications"]:
-        row_cells = table.add_row().cells
-        row_cells[0].text = app['application_name']
-        row_cells[1].text = app['type']
-        row_cells[2].text = app['url'] if app['url'] is not None else ''
-    set_table_borders(table)
-    doc.add_heading('List of steps', level=2)
-    for step_group in json_data["list_of_steps"]:
-        table = doc.add_table(rows=1, cols=3)
-        table.autofit = False
-        col_widths = [Inches(0.5), Inches(4.5), Inches(1.5)]
-        for i, width in enumerate(col_widths):
-            table.columns[i].width = width
-        hdr_cells = table.rows[0].cells
-        hdr_cell = hdr_cells[0].merge(hdr_cells[2])
-        hdr_cell.paragraphs[0].add_run(f"{step_group['numbering']} {step_group['group_name']}").bold = True
-        hdr_cell.paragraphs[0].alignment = WD_ALIGN_PARAGRAPH.LEFT
-        shading_elm = OxmlElement('w:shd')
-        shading_elm.set(qn('w:fill'), 'D1E2F8')
-        hdr_cell._element.tcPr.append(shading_elm)
-        for sub_step in step_group["sub_steps"]:
-            row_cells = table.add_row().cells
-            row_cells[0].text = sub_step['numbering']
-            row_cells[1].text = sub_step['step']
-            row_cells[2].text = sub_step['time_stamp']
-        set_table_borders(table)
-    word_file_path = f"{json_data['process_name'].replace(' ', '_')}.docx"
-    doc.save(word_file_path)
-    print("Word file generated:", word_file_path)
+}"""
 
-   # Generate Draw.io file
-    systemPrompt_ChatGeneration="""Generate the MX file code that can be directly imported into Draw.io to create a process map. The MX should define a workflow process map according the <List_of_Steps/> in the user's message, including shapes (e.g., rectangles for actions, diamonds for decisions), connectors, and labels. Make sure that the MX file generated by you is correct and can be copied to the Draw.IO application without errors.
+DRAWIO_SYSTEM_PROMPT = """Generate the MX file code that can be directly imported into Draw.io to create a process map. The MX should define a workflow process map according the <List_of_Steps/> in the user's message, including shapes (e.g., rectangles for actions, diamonds for decisions), connectors, and labels. Make sure that the MX file generated by you is correct and can be copied to the Draw.IO application without errors.
 
 Follow the rules below:
 <RULES>
@@ -388,35 +319,643 @@ Be detailed and do not miss any steps in the <List_of_Steps/>.  The content will
     </mxGraphModel>
   </diagram>
 </mxfile>"""
-    generation_config = {
-        "temperature": 1,
-        "top_p": 0.8,
-        "top_k": 40,
-        "max_output_tokens": 8192,
-        "response_mime_type": "text/plain",
-    }
-    list_of_steps = json.dumps(json_data["list_of_steps"], indent=4)
-    model = genai.GenerativeModel(
-        model_name="gemini-1.5-flash-002",
-        generation_config=generation_config,
-        system_instruction=systemPrompt_ChatGeneration
+
+ANALYSIS_GENERATION_CONFIG = {
+    "max_output_tokens": 8192,
+    "response_mime_type": "application/json",
+    "response_schema": PROCESS_SCHEMA,
+}
+
+# Appended to the analysis prompt when a long recording is analysed in segments
+SEGMENT_PROMPT_NOTE = """
+
+Note: this video is part {part} of {parts} of a longer recording and covers {start} to {end} of the full recording. Describe only what happens in this part, do not invent steps from other parts, and give time stamps relative to the start of this part."""
+
+# User turn sent against the cached analysis prompt and video
+ANALYSIS_REQUEST = "Analyze the attached process recording and provide the output in the JSON format described in your instructions."
+
+DRAWIO_GENERATION_CONFIG = {
+    "temperature": 1,
+    "top_p": 0.8,
+    "top_k": 40,
+    "max_output_tokens": 8192,
+    "response_mime_type": "text/plain",
+}
+
+def set_rate_limiter(limiter):
+    """Throttle every Gemini generation request through limiter (e.g. a TokenBucket).
+
+    It replaces the GEMINI_RPM bucket of the current backend, which is
+    returned so callers can restore it; None disables throttling.
+    """
+    if not isinstance(_backend, ResilientBackend):
+        raise ValueError("Rate limits need a ResilientBackend, see set_model_backend.")
+    return _backend.set_request_limiter(limiter)
+
+def set_context_cache_manager(manager):
+    """Replace the context cache manager, or pass None to disable context caching."""
+    global _context_caches
+    _context_caches = manager
+
+def set_model_backend(backend, resilient=True):
+    """Replace the Gemini backend, e.g. with model_backend.FakeBackend for offline benchmarks.
+
+    The backend is wrapped in a ResilientBackend for retries, timeouts and
+    rate limits unless resilient is False or it already is one.
+    """
+    global _backend
+    if resilient and not isinstance(backend, ResilientBackend):
+        backend = ResilientBackend(backend)
+    _backend = backend
+
+def _cached_model(model_name, system_instruction, contents, content_ids, generation_config):
+    if _context_caches is None:
+        return None
+    name = _context_caches.get_or_create(model_name, system_instruction, contents, content_ids)
+    if name is None:
+        return None
+    model = _context_caches.model_for(name, generation_config)
+    if isinstance(_backend, ResilientBackend):
+        model = _backend.wrap(model)
+    return model
+
+def verify_video(video_path):
+    if not os.path.exists(video_path):
+        raise FileNotFoundError("Video file not found.")
+    if not video_path.lower().endswith(('.mp4', '.avi', '.mov', '.mkv')):
+        raise ValueError("Invalid file format. Only MP4, AVI, MOV, and MKV videos are allowed.")
+    return True
+
+def upload_to_gemini(path, mime_type="video/mp4"):
+    with inflight("upload"):
+        file = _backend.upload_file(path, mime_type=mime_type)
+    print(f"Uploaded file '{file.display_name}' as: {file.uri}")
+    return file
+
+async def _wait_for_file_active(name, initial_delay, max_delay):
+    delay = initial_delay
+    while True:
+        file = await asyncio.to_thread(_backend.get_file, name)
+        if file.state.name == "ACTIVE":
+            return file
+        if file.state.name == "FAILED":
+            raise RuntimeError(f"File {name} failed processing.")
+        print(".", end="", flush=True)
+        # Equal jitter (half fixed, half random) keeps concurrent jobs from polling in lockstep
+        await asyncio.sleep(random.uniform(delay / 2, delay))
+        delay = min(delay * 2, max_delay)
+
+async def wait_for_files_active_async(files, timeout=FILE_ACTIVE_TIMEOUT,
+                                      initial_delay=1.0, max_delay=10.0):
+    """Poll all files concurrently with exponential backoff until every one is ACTIVE."""
+    print("Waiting for file processing...")
+    waiters = [_wait_for_file_active(file.name, initial_delay, max_delay) for file in files]
+    try:
+        active_files = await asyncio.wait_for(asyncio.gather(*waiters), timeout)
+    except asyncio.TimeoutError:
+        raise TimeoutError(f"Files were not ACTIVE after {timeout} seconds.")
+    print("Processing complete.")
+    return active_files
+
+def wait_for_files_active(files, timeout=FILE_ACTIVE_TIMEOUT):
+    return asyncio.run(wait_for_files_active_async(files, timeout=timeout))
+
+def _get_remote_file(name):
+    try:
+        return _backend.get_file(name)
+    except Exception as e:
+        print(f"Uploaded file {name} is no longer available: {e}")
+        return None
+
+def get_or_upload_file(video_path, video_hash, registry=None, mime_type=None, checkpoint=None):
+    """Reuse a still-ACTIVE remote file for this video, uploading only when needed.
+
+    With a checkpoint, a file uploaded by an interrupted attempt of the same
+    job is picked up again even if it had not finished processing.
+    """
+    if registry is None:
+        registry = FileRegistry()
+    with stage("upload") as span:
+        file = None
+        upload = checkpoint.get("upload") if checkpoint is not None else None
+        if upload is not None and upload.get("video_hash") == video_hash:
+            file = _get_remote_file(upload["name"])
+            if file is not None and file.state.name in ("ACTIVE", "PROCESSING"):
+                print(f"Resuming with uploaded file {file.name} ({file.uri})")
+                span.set(cache_hit=True)
+                mime_type = upload["mime_type"]
+            else:
+                file = None
+        record = registry.lookup(video_hash) if file is None else None
+        if record is not None:
+            file = _get_remote_file(record["name"])
+            if file is not None and file.state.name == "ACTIVE":
+                print(f"Reusing uploaded file {file.name} ({file.uri})")
+                span.set(cache_hit=True)
+                if checkpoint is not None:
+                    checkpoint.save("upload", name=file.name, uri=file.uri, mime_type=record["mime_type"],
+                                    video_hash=video_hash)
+                    checkpoint.save("activate")
+                return file
+            file = None
+            registry.remove(video_hash)
+        if file is None:
+            if mime_type is None:
+                mime_type = detect_mime_type(video_path)
+            span.set(cache_hit=False, bytes_uploaded=os.path.getsize(video_path))
+            file = upload_to_gemini(video_path, mime_type=mime_type)
+            if checkpoint is not None:
+                checkpoint.save("upload", name=file.name, uri=file.uri, mime_type=mime_type, video_hash=video_hash)
+    with stage("activate"):
+        wait_for_files_active([file])
+    registry.register(video_hash, file, mime_type=mime_type)
+    if checkpoint is not None:
+        checkpoint.save("activate")
+    return file
+
+def analyse_video(file, on_step_group=None, prompt=PDD_ANALYSIS_PROMPT, use_context_cache=True):
+    """Stream the schema-constrained analysis, checking each step group as it completes.
+
+    on_step_group(index, group, errors) is called for every finished group in
+    list_of_steps before the rest of the response has arrived.
+    """
+    # With a context cache the prompt and video are already on the server
+    with stage("analyse") as span:
+        model = None
+        if use_context_cache:
+            model = _cached_model(ANALYSIS_CACHE_MODEL, prompt, [file], [file.uri], ANALYSIS_GENERATION_CONFIG)
+        span.set(cache_hit=model is not None)
+        if model is not None:
+            request = ANALYSIS_REQUEST
+        else:
+            model = _backend.GenerativeModel(ANALYSIS_MODEL, generation_config=ANALYSIS_GENERATION_CONFIG)
+            request = [prompt, file]
+        parser = StreamingStepParser()
+        with inflight("generate"):
+            response = model.generate_content(request, stream=True)
+            for chunk in response:
+                try:
+                    text = chunk.text
+                except ValueError:
+                    # Chunks without text parts, e.g. the final one carrying finish_reason
+                    continue
+                first_index = len(parser.groups)
+                for index, group in enumerate(parser.feed(text), start=first_index):
+                    errors = validate_step_group(group, index)
+                    if errors:
+                        print(f"Step group {index + 1} has defects:", errors)
+                    if on_step_group is not None:
+                        on_step_group(index, group, errors)
+        span.record_usage(response)
+    return parser.text or NO_DATA_EXTRACTED
+
+def ask_about_recording(file, question):
+    """Answer a follow-up question about an uploaded recording, reusing its context cache."""
+    model = _cached_model(ANALYSIS_CACHE_MODEL, PDD_ANALYSIS_PROMPT, [file], [file.uri], None)
+    if model is not None:
+        request = question
+    else:
+        model = _backend.GenerativeModel(ANALYSIS_MODEL)
+        request = [PDD_ANALYSIS_PROMPT, file, question]
+    with inflight("generate"):
+        response = model.generate_content(request)
+    return response.text
+
+def repair_json_with_model(processed_text, errors):
+    """Ask the small model to fix only the listed defects instead of re-analysing the video."""
+    model = _backend.GenerativeModel(REPAIR_MODEL, generation_config=ANALYSIS_GENERATION_CONFIG)
+    defects = "\n".join(f"- {error}" for error in errors)
+    prompt = (
+        "The JSON document below was produced by a process analysis but has the following defects:\n"
+        f"{defects}\n\n"
+        "Return the corrected JSON document. Fix only the listed defects and keep all other content unchanged.\n\n"
+        f"{processed_text}"
     )
+    with stage("repair") as span:
+        try:
+            with inflight("generate"):
+                response = model.generate_content(prompt)
+        except Exception as e:
+            print("Error repairing JSON:", e)
+            return None
+        span.record_usage(response)
+        return response.text
+
+def extract_json(processed_text):
+    with stage("parse"):
+        return _extract_json(processed_text)
+
+def _extract_json(processed_text):
+    json_data, errors = repair_locally(processed_text)
+    if not errors:
+        return json_data
+    print("Analysis output has defects:", errors[:10])
+    source = processed_text if json_data is None else json.dumps(json_data, indent=2)
+    repaired_text = repair_json_with_model(source, errors)
+    if repaired_text is None:
+        return None
+    json_data, errors = repair_locally(repaired_text)
+    if errors:
+        print("Could not repair the analysis output:", errors[:10])
+        return None
+    return json_data
+
+def _analyse_segment(segment_path, start, end, index, count):
+    prompt = PDD_ANALYSIS_PROMPT + SEGMENT_PROMPT_NOTE.format(
+        part=index + 1, parts=count, start=format_timestamp(start), end=format_timestamp(end))
+    file = get_or_upload_file(segment_path, hash_file(segment_path))
+    # Each segment has its own prompt, so a context cache would never be reused
+    processed_text = analyse_video(file, prompt=prompt, use_context_cache=False)
+    return extract_json(processed_text)
+
+def analyse_recording(video_path, video_hash, on_step_group=None, preprocess=PREPROCESS_VIDEO, checkpoint=None):
+    """Analyse a recording, optionally shrinking it first and splitting long ones into segments."""
+    resumed = checkpoint is not None and checkpoint.done("analyse")
+    if not preprocess or resumed:
+        json_data = _analyse_recording(video_path, video_hash, on_step_group, checkpoint)
+        remap = checkpoint.get("preprocess") if resumed and preprocess else None
+    else:
+        work_dir = tempfile.mkdtemp(prefix="preprocess_")
+        try:
+            try:
+                with stage("preprocess") as span:
+                    report = preprocess_video(video_path, work_dir)
+                    span.set(bytes_saved=report["bytes_saved"], duration_saved=report["duration_saved"])
+            except (OSError, subprocess.CalledProcessError, ValueError) as e:
+                print("Video pre-processing failed, uploading the original:", e)
+                if checkpoint is not None:
+                    checkpoint.discard("preprocess")
+                return _analyse_recording(video_path, video_hash, on_step_group, checkpoint)
+            remap = {"timestamp_map": report["timestamp_map"], "fps": report["fps"]}
+            if checkpoint is not None:
+                checkpoint.save("preprocess", **remap)
+            json_data = _analyse_recording(report["path"], hash_file(report["path"]), on_step_group, checkpoint)
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    if json_data is not None and remap is not None:
+        remap_timestamps(json_data, remap["timestamp_map"], remap["fps"])
+    return json_data
+
+def _analyse_recording(video_path, video_hash, on_step_group=None, checkpoint=None):
+    if checkpoint is not None and checkpoint.done("analyse"):
+        processed_text = checkpoint.load_text("analyse")
+        if processed_text is not None:
+            print("Resuming from the saved analysis")
+            return extract_json(processed_text)
+        checkpoint.discard("analyse")
+    try:
+        duration = probe_duration(video_path)
+    except (OSError, subprocess.CalledProcessError, ValueError):
+        # Without ffprobe the recording is analysed in one request
+        duration = None
+    if duration is not None and duration > LONG_VIDEO_THRESHOLD:
+        print(f"Long recording ({format_timestamp(duration)}), analysing in segments")
+        with stage("segmented_analysis"):
+            json_data = analyse_in_segments(video_path, _analyse_segment, duration=duration)
+        if checkpoint is not None and json_data is not None:
+            checkpoint.save_text("analyse", json.dumps(json_data, indent=2))
+        return json_data
+    file = get_or_upload_file(video_path, video_hash, checkpoint=checkpoint)
+    processed_text = analyse_video(file, on_step_group=on_step_group)
+    if checkpoint is not None and processed_text != NO_DATA_EXTRACTED:
+        checkpoint.save_text("analyse", processed_text)
+    return extract_json(processed_text)
+
+def generate_word_file(json_data, output_dir="."):
+    with stage("render_docx"):
+        from docx_renderer import render_document
+        doc = render_document(json_data)
+        word_file_path = os.path.join(output_dir, f"{json_data['process_name'].replace(' ', '_')}.docx")
+        # Render into memory so downloads don't read the file back from disk
+        buffer = io.BytesIO()
+        doc.save(buffer)
+        write_artifact(word_file_path, buffer.getvalue())
+    print("Word file generated:", word_file_path)
+    return word_file_path
+
+def _request_drawio_xml(list_of_steps):
+    model = _cached_model(DRAWIO_CACHE_MODEL, DRAWIO_SYSTEM_PROMPT, None, [], DRAWIO_GENERATION_CONFIG)
+    if model is None:
+        model = _backend.GenerativeModel(
+            model_name=DRAWIO_MODEL,
+            generation_config=DRAWIO_GENERATION_CONFIG,
+            system_instruction=DRAWIO_SYSTEM_PROMPT
+        )
     chat_session = model.start_chat()
-    response = chat_session.send_message(list_of_steps)
-    ChartGeneratedByAI = response.text
+    with inflight("generate"):
+        response = chat_session.send_message(list_of_steps)
+    current_span().record_usage(response)
+    return response.text
 
+def repair_drawio_with_model(xml_content, errors):
+    """Ask the small model to fix only the listed diagram defects instead of redrawing it."""
+    model = _backend.GenerativeModel(REPAIR_MODEL, generation_config=DRAWIO_GENERATION_CONFIG)
+    defects = "\n".join(f"- {error}" for error in errors)
+    prompt = (
+        "The draw.io mxfile below has the following defects:\n"
+        f"{defects}\n\n"
+        "Return the corrected complete mxfile in a ```xml block. Fix only the listed defects: add a cell "
+        "connected in order for every missing sub-step and keep all other cells unchanged.\n\n"
+        f"{xml_content}"
+    )
+    with stage("repair_drawio") as span:
+        try:
+            with inflight("generate"):
+                response = model.generate_content(prompt)
+        except Exception as e:
+            print("Error repairing diagram:", e)
+            return None
+        span.record_usage(response)
+        return response.text
+
+def generate_drawio_xml_llm(json_data):
+    """Generate the diagram with DRAWIO_MODEL, fixing defects locally, then with a repair call.
+
+    Requesting a whole new diagram is the last resort. Diagrams that are
+    valid apart from missing steps are kept.
+    """
+    list_of_steps = json.dumps(json_data["list_of_steps"], indent=4)
+    xml_content, errors = repair_drawio_locally(_request_drawio_xml(list_of_steps), json_data)
+    if errors and xml_content is not None:
+        print("Diagram has defects:", errors[:10])
+        repaired_text = repair_drawio_with_model(xml_content, errors)
+        if repaired_text is not None:
+            repaired_xml, repaired_errors = repair_drawio_locally(repaired_text, json_data)
+            if repaired_xml is not None and len(repaired_errors) < len(errors):
+                xml_content, errors = repaired_xml, repaired_errors
+    if xml_content is None or structural_errors(errors):
+        print("Diagram could not be repaired, generating it again:", errors[:10])
+        xml_content, errors = repair_drawio_locally(_request_drawio_xml(list_of_steps), json_data)
+    if xml_content is None or structural_errors(errors):
+        print("No valid diagram generated:", errors[:10])
+        return None
+    if errors:
+        print("Diagram is missing steps:", errors[:10])
+    return xml_content
+
+def generate_drawio_file(json_data, output_dir=".", mode=DRAWIO_MODE):
+    with stage("render_drawio"):
+        return _generate_drawio_file(json_data, output_dir, mode)
+
+def _generate_drawio_file(json_data, output_dir, mode):
+    if mode == "llm":
+        xml_content = generate_drawio_xml_llm(json_data)
+        if xml_content is None:
+            return None
+    else:
+        xml_content = build_drawio_xml(json_data)
+    return _write_drawio_file(json_data, output_dir, xml_content)
+
+def _write_drawio_file(json_data, output_dir, xml_content):
     # Generate file name based on the process_name
     file_name = f"{json_data['process_name'].replace(' ', '_')}.drawio"
-    pattern = r"```xml(.*?)```"
-    match = re.search(pattern, ChartGeneratedByAI, re.DOTALL)
-    if match:
-        xml_content = match.group(1).strip()
-    else:
-        print("No XML content found.")
-        return word_file_path, None
-    file_path = f"./{file_name}"
-    with open(file_path, "w", encoding="utf-8") as file:
-        file.write(xml_content)
+    file_path = os.path.join(output_dir, file_name)
+    write_artifact(file_path, xml_content.encode("utf-8"))
     print(f"Draw.io file saved as {file_name}")
-    
+    return file_path
+
+def _word_render_state(json_data):
+    """What update_document needs to patch this render later; saved with the render_docx stage."""
+    from docx_renderer import DOCX_TEMPLATE_PATH
+    return {"sections": section_hashes(json_data), "template": DOCX_TEMPLATE_PATH}
+
+def _checkpointed_artifact(checkpoint, stage_name, output_dir, **expected):
+    """Return the path saved for a completed render stage if the file is still there."""
+    saved = checkpoint.get(stage_name) if checkpoint is not None else None
+    if saved is None or any(saved.get(key) != value for key, value in expected.items()):
+        return None
+    path = os.path.join(output_dir, saved["path"])
+    return path if os.path.exists(path) else None
+
+def generate_artifacts(json_data, output_dir=".", drawio_mode=DRAWIO_MODE, checkpoint=None):
+    """Run the artifact producers in parallel; a failing producer yields None for its artifact.
+
+    With a checkpoint, artifacts already rendered by an earlier attempt are kept.
+    """
+    producers = {
+        "word": ("render_docx", {}, lambda: generate_word_file(json_data, output_dir)),
+        "drawio": ("render_drawio", {"mode": drawio_mode},
+                   lambda: generate_drawio_file(json_data, output_dir, drawio_mode)),
+    }
+    results = {}
+    futures = {}
+    with ThreadPoolExecutor(max_workers=len(producers)) as executor:
+        for name, (stage_name, expected, producer) in producers.items():
+            results[name] = _checkpointed_artifact(checkpoint, stage_name, output_dir, **expected)
+            if results[name] is None:
+                futures[name] = run_in_context(executor, producer)
+        for name, future in futures.items():
+            try:
+                results[name] = future.result()
+            except Exception as e:
+                print(f"Error generating {name} file:", e)
+                results[name] = None
+            stage_name, expected, _ = producers[name]
+            if checkpoint is not None and results[name] is not None:
+                state = _word_render_state(json_data) if name == "word" else {}
+                checkpoint.save(stage_name, path=os.path.basename(results[name]), **expected, **state)
+    return results["word"], results["drawio"]
+
+def regenerate_artifact(output_dir, artifact, drawio_mode=DRAWIO_MODE):
+    """Render one artifact ("word" or "drawio") again from the JSON saved in a job's directory."""
+    checkpoint = Checkpoint(output_dir)
+    json_data = checkpoint.load_json("parse")
+    if json_data is None:
+        raise FileNotFoundError(f"No saved analysis in {output_dir}.")
+    if artifact == "word":
+        path = generate_word_file(json_data, output_dir)
+        checkpoint.save("render_docx", path=os.path.basename(path), **_word_render_state(json_data))
+    elif artifact == "drawio":
+        path = generate_drawio_file(json_data, output_dir, drawio_mode)
+        if path is not None:
+            checkpoint.save("render_drawio", path=os.path.basename(path), mode=drawio_mode)
+    else:
+        raise ValueError(f"Unknown artifact: {artifact}")
+    return path
+
+def _saved_artifact_path(checkpoint, stage_name, output_dir):
+    saved = checkpoint.get(stage_name) or {}
+    return os.path.join(output_dir, saved["path"]) if saved.get("path") else None
+
+def _rerender_word_file(json_data, output_dir, checkpoint):
+    from docx import Document
+    from docx_renderer import DOCX_TEMPLATE_PATH, render_document, update_document
+    saved = checkpoint.get("render_docx") or {}
+    old_path = _saved_artifact_path(checkpoint, "render_docx", output_dir)
+    old_data = read_artifact(old_path) if old_path else None
+    doc = None
+    if old_data is not None and saved.get("sections") and saved.get("template") == DOCX_TEMPLATE_PATH:
+        doc = Document(io.BytesIO(old_data))
+        try:
+            rebuilt = update_document(doc, saved["sections"], json_data)
+            print(f"Word file: rebuilt {rebuilt} of {len(json_data['list_of_steps']) + 2} sections")
+        except ValueError as e:
+            print("Rendering the Word file again:", e)
+            doc = None
+    if doc is None:
+        doc = render_document(json_data)
+    path = os.path.join(output_dir, f"{json_data['process_name'].replace(' ', '_')}.docx")
+    buffer = io.BytesIO()
+    doc.save(buffer)
+    write_artifact(path, buffer.getvalue())
+    if old_path and os.path.abspath(old_path) != os.path.abspath(path):
+        remove_artifact(old_path)
+    checkpoint.save("render_docx", path=os.path.basename(path), **_word_render_state(json_data))
+    return path
+
+def _rerender_drawio_file(json_data, previous, output_dir, mode, checkpoint):
+    saved = checkpoint.get("render_drawio") or {}
+    old_path = _saved_artifact_path(checkpoint, "render_drawio", output_dir)
+    xml_content = None
+    # A model-drawn diagram keeps its layout when only texts changed; local layouts rebuild
+    # from memoized lanes, which only redraws the changed ones
+    if mode == "llm" and saved.get("mode") == "llm" and previous is not None and old_path:
+        old_data = read_artifact(old_path)
+        if old_data is not None:
+            xml_content = relabel_drawio(old_data.decode("utf-8"), previous, json_data)
+        if xml_content is None:
+            print("The step structure changed, drawing the diagram again")
+    if xml_content is not None:
+        path = _write_drawio_file(json_data, output_dir, xml_content)
+    else:
+        path = _generate_drawio_file(json_data, output_dir, mode)
+    if path is None:
+        return None
+    if old_path and os.path.abspath(old_path) != os.path.abspath(path):
+        remove_artifact(old_path)
+    checkpoint.save("render_drawio", path=os.path.basename(path), mode=mode)
+    return path
+
+def rerender_artifacts(output_dir, json_data, drawio_mode=DRAWIO_MODE):
+    """Render an edited process JSON into a job's directory without analysing the video again.
+
+    The edit is diffed against the JSON the job's files were rendered from:
+    only changed sections of the Word file are rebuilt, and the diagram is
+    rebuilt from memoized lanes (local layout) or relabelled in place (model
+    layout). The edited JSON then replaces the saved analysis, so retries
+    and later edits start from it. Raises ValueError for JSON that does not
+    match the process schema.
+    """
+    check_process(json_data)
+    normalize_process(json_data)
+    checkpoint = Checkpoint(output_dir)
+    previous = checkpoint.load_json("parse")
+    with stage("render_docx"):
+        word_file_path = _rerender_word_file(json_data, output_dir, checkpoint)
+    with stage("render_drawio"):
+        file_path = _rerender_drawio_file(json_data, previous, output_dir, drawio_mode, checkpoint)
+    # Keep the previous JSON while the diagram still shows it
+    if file_path is not None:
+        checkpoint.save_json("parse", json_data)
+    return word_file_path, file_path
+
+def _drawio_cache_parts(mode):
+    if mode == "llm":
+        return DRAWIO_SYSTEM_PROMPT, DRAWIO_MODEL
+    return DRAWIO_LAYOUT_VERSION, "local"
+
+def _preprocess_cache_part(preprocess):
+    if not preprocess:
+        return "original"
+    return f"preprocessed:{PREPROCESS_MAX_HEIGHT}:{PREPROCESS_FPS}:{PREPROCESS_DEDUPE}"
+
+def artifact_status(word_file, drawio_file):
+    """Job status for the artifacts that were generated: completed, partial or failed."""
+    return "completed" if word_file and drawio_file else "partial" if word_file or drawio_file else "failed"
+
+def process_video(video_path, use_cache=True, output_dir=".", video_hash=None, drawio_mode=DRAWIO_MODE,
+                  preprocess=PREPROCESS_VIDEO, trace=None, resume=None):
+    """Turn a process recording into Word and Draw.io files.
+
+    When output_dir is a job directory (not the current one), completed
+    stages are checkpointed there and, with resume, a later call continues
+    after the last of them. resume defaults to use_cache.
+
+    Pass a JobTrace as trace to read the per-stage timings afterwards; the
+    spans are also exported under METRICS_DIR.
+    """
+    if resume is None:
+        resume = use_cache
+    if trace is None:
+        trace = JobTrace()
+    status = "failed"
+    try:
+        with trace.activate():
+            word_file_path, file_path = _process_video(video_path, use_cache, output_dir, video_hash,
+                                                       drawio_mode, preprocess, resume)
+        status = artifact_status(word_file_path, file_path)
+        return word_file_path, file_path
+    finally:
+        trace.finish(status)
+        try:
+            export_job(trace)
+        except OSError as e:
+            print("Error exporting job metrics:", e)
+
+def _record_restored(checkpoint, json_data, word_file_path, file_path, drawio_mode):
+    # Record the analysis and files of a cache hit so the job can be edited and re-rendered
+    if checkpoint is None:
+        return
+    checkpoint.save_json("parse", json_data)
+    if word_file_path is not None:
+        checkpoint.save("render_docx", path=os.path.basename(word_file_path), **_word_render_state(json_data))
+    if file_path is not None:
+        checkpoint.save("render_drawio", path=os.path.basename(file_path), mode=drawio_mode)
+
+def _process_video(video_path, use_cache, output_dir, video_hash, drawio_mode, preprocess, resume):
+    with stage("verify"):
+        verify_video(video_path)
+        os.makedirs(output_dir, exist_ok=True)
+        if video_hash is None:
+            video_hash = hash_file(video_path)
+
+    # Stage outputs are saved in a job's own directory so a retry resumes after the last completed stage
+    checkpoint = None
+    if os.path.abspath(output_dir) != os.getcwd():
+        checkpoint = Checkpoint(output_dir, hash_text(video_hash, PDD_ANALYSIS_PROMPT, ANALYSIS_MODEL,
+                                                      _preprocess_cache_part(preprocess)))
+        if not resume:
+            checkpoint.clear()
+        elif checkpoint.completed():
+            print(f"Resuming job in {output_dir} after stages:", ", ".join(checkpoint.completed()))
+        checkpoint.save("verify", video_hash=video_hash)
+
+    # Serve repeated uploads of the same recording from the local result cache
+    json_data = None
+    cache = ResultCache() if use_cache else None
+    if cache is not None:
+        drawio_prompt, drawio_model = _drawio_cache_parts(drawio_mode)
+        cache_key = cache.key_for(video_path, PDD_ANALYSIS_PROMPT, drawio_prompt,
+                                  [ANALYSIS_MODEL, drawio_model, _preprocess_cache_part(preprocess)],
+                                  video_hash=video_hash)
+        with stage("cache_lookup") as span:
+            entry = cache.get(cache_key)
+            span.set(cache_hit=entry is not None and entry["word_file"] is not None)
+        if entry is not None and entry["word_file"] is not None:
+            print("Result cache hit:", cache_key)
+            word_file_path, file_path = cache.restore(entry, output_dir)
+            _record_restored(checkpoint, entry["json_data"], word_file_path, file_path, drawio_mode)
+            return word_file_path, file_path
+        if entry is not None:
+            # Only the analysis is cached; the files are rendered from it below
+            json_data = entry["json_data"]
+            if checkpoint is not None:
+                checkpoint.save_json("parse", json_data)
+
+    if json_data is None and checkpoint is not None:
+        json_data = checkpoint.load_json("parse")
+    if json_data is None:
+        json_data = analyse_recording(video_path, video_hash, preprocess=preprocess, checkpoint=checkpoint)
+        if json_data is None:
+            return None, None
+        if checkpoint is not None:
+            checkpoint.save_json("parse", json_data)
+
+    # Generate the Word and Draw.io files concurrently
+    word_file_path, file_path = generate_artifacts(json_data, output_dir, drawio_mode, checkpoint)
+
+    if cache is not None:
+        cache.put(cache_key, json_data, word_file_path, file_path)
+        cache.evict()
+
     return word_file_path, file_path
@@ -0,0 +1,216 @@
+import difflib
+import json
+import os
+from functools import lru_cache
+from xml.sax.saxutils import escape
+
+from docx import Document
+from docx.shared import Pt, Inches
+from docx.enum.text import WD_ALIGN_PARAGRAPH
+from docx.oxml import OxmlElement, parse_xml
+from docx.oxml.ns import nsdecls, qn
+
+from step_schema import section_hashes
+
+# Optional .docx whose styles (fonts, "Table Grid" borders, colours) are reused
+DOCX_TEMPLATE_PATH = os.getenv("DOCX_TEMPLATE_PATH") or None
+TABLE_STYLE = "Table Grid"
+GROUP_HEADER_FILL = "D1E2F8"
+
+# Column widths in twentieths of a point (dxa): 0.5", 4.5", 1.5" and 3 x 2.1667"
+STEP_COLUMN_WIDTHS = (720, 6480, 2160)
+APPLICATION_COLUMN_WIDTHS = (3120, 3120, 3120)
+
+# Table fragments kept in memory for reuse, keyed by table style and section content
+FRAGMENT_CACHE_SIZE = int(os.getenv("FRAGMENT_CACHE_SIZE", "4096"))
+
+
+def set_table_borders(table, border_color="auto"):
+    for row in table.rows:
+        for cell in row.cells:
+            tc = cell._element
+            tcPr = tc.get_or_add_tcPr()
+            tcBorders = OxmlElement('w:tcBorders')
+            for border in ['top', 'left', 'bottom', 'right', 'insideH', 'insideV']:
+                border_elem = OxmlElement(f'w:{border}')
+                border_elem.set(qn('w:val'), 'single')
+                border_elem.set(qn('w:sz'), '4')
+                border_elem.set(qn('w:space'), '0')
+                if border_color != "auto":
+                    border_elem.set(qn('w:color'), border_color)
+                tcBorders.append(border_elem)
+            tcPr.append(tcBorders)
+
+
+def _new_document(template_path):
+    doc = Document(template_path)
+    doc.styles['Normal'].font.name = 'Calibri'
+    doc.styles['Normal'].font.size = Pt(11)
+    return doc
+
+
+def _run_xml(text, bold=False):
+    run_props = "<w:rPr><w:b/></w:rPr>" if bold else ""
+    return f'<w:r>{run_props}<w:t xml:space="preserve">{escape(text or "")}</w:t></w:r>'
+
+
+def _cell_xml(text, width, bold=False, span=1, fill=None):
+    props = f'<w:tcW w:w="{width}" w:type="dxa"/>'
+    if span > 1:
+        props += f'<w:gridSpan w:val="{span}"/>'
+    if fill:
+        props += f'<w:shd w:val="clear" w:color="auto" w:fill="{fill}"/>'
+    return f"<w:tc><w:tcPr>{props}</w:tcPr><w:p>{_run_xml(text, bold)}</w:p></w:tc>"
+
+
+def _table_xml(style_id, widths, rows_xml, fixed=False):
+    layout = '<w:tblLayout w:type="fixed"/>' if fixed else ""
+    grid = "".join(f'<w:gridCol w:w="{width}"/>' for width in widths)
+    return (f"<w:tbl {nsdecls('w')}><w:tblPr><w:tblStyle w:val=\"{style_id}\"/>"
+            f'<w:tblW w:w="0" w:type="auto"/>{layout}<w:tblLook w:val="04A0"/></w:tblPr>'
+            f"<w:tblGrid>{grid}</w:tblGrid>{''.join(rows_xml)}</w:tbl>")
+
+
+def _append_table(doc, table_xml):
+    doc.element.body._insert_tbl(parse_xml(table_xml))
+
+
+def applications_table_xml(style_id, applications):
+    widths = APPLICATION_COLUMN_WIDTHS
+    rows = ["<w:tr>" + "".join(_cell_xml(title, width, bold=True) for title, width
+                               in zip(("Application Name", "Type", "URL"), widths)) + "</w:tr>"]
+    for app in applications:
+        values = (app['application_name'], app['type'], app.get('url') or '')
+        rows.append("<w:tr>" + "".join(_cell_xml(value, width) for value, width in zip(values, widths)) + "</w:tr>")
+    return _table_xml(style_id, widths, rows)
+
+
+def step_group_table_xml(style_id, step_group):
+    widths = STEP_COLUMN_WIDTHS
+    header = f"{step_group['numbering']} {step_group['group_name']}"
+    rows = ["<w:tr>" + _cell_xml(header, sum(widths), bold=True, span=3, fill=GROUP_HEADER_FILL) + "</w:tr>"]
+    for sub_step in step_group["sub_steps"]:
+        values = (sub_step['numbering'], sub_step['step'], sub_step['time_stamp'])
+        rows.append("<w:tr>" + "".join(_cell_xml(value, width) for value, width in zip(values, widths)) + "</w:tr>")
+    return _table_xml(style_id, widths, rows, fixed=True)
+
+
+@lru_cache(maxsize=FRAGMENT_CACHE_SIZE)
+def _cached_table_xml(kind, style_id, section_json):
+    section = json.loads(section_json)
+    if kind == "applications":
+        return applications_table_xml(style_id, section)
+    return step_group_table_xml(style_id, section)
+
+
+def table_fragment(kind, style_id, section):
+    """The "applications" or "step_group" table XML for section, memoized on its content."""
+    return _cached_table_xml(kind, style_id, json.dumps(section, sort_keys=True))
+
+
+def render_document(json_data, template_path=DOCX_TEMPLATE_PATH):
+    """Build the process Word document using the template's table style.
+
+    Tables are emitted as one XML fragment each instead of cell by cell, and
+    borders come from the shared table style rather than per-cell properties.
+    """
+    doc = _new_document(template_path)
+    style_id = doc.styles[TABLE_STYLE].style_id
+    doc.add_heading('Process Name: ' + json_data["process_name"], level=1)
+    doc.add_paragraph(json_data["short_process_description"])
+    doc.add_heading('List of applications', level=2)
+    _append_table(doc, table_fragment("applications", style_id, json_data["list_of_applications"]))
+    doc.add_heading('List of steps', level=2)
+    for step_group in json_data["list_of_steps"]:
+        _append_table(doc, table_fragment("step_group", style_id, step_group))
+    return doc
+
+
+def update_document(doc, old_sections, json_data):
+    """Patch a document built by render_document so it shows the edited json_data.
+
+    old_sections are the section_hashes() of the JSON the document was
+    rendered from. Only the header, the applications table and the step-group
+    tables whose hash changed are rebuilt; groups that were inserted, removed
+    or moved are matched up by their hashes. Returns the number of rebuilt
+    sections and raises ValueError when the document does not have the
+    layout render_document produces.
+    """
+    new_sections = section_hashes(json_data)
+    style_id = doc.styles[TABLE_STYLE].style_id
+    body = doc.element.body
+    tables = body.findall(qn("w:tbl"))
+    paragraphs = doc.paragraphs
+    if len(tables) != len(old_sections["groups"]) + 1 or len(paragraphs) < 2:
+        raise ValueError("The document does not match the sections it was rendered from.")
+    # The "List of steps" heading follows the applications table
+    anchor = tables[0].getnext()
+    rebuilt = 0
+    if new_sections["header"] != old_sections["header"]:
+        paragraphs[0].text = 'Process Name: ' + json_data["process_name"]
+        paragraphs[1].text = json_data["short_process_description"]
+        rebuilt += 1
+    if new_sections["applications"] != old_sections["applications"]:
+        tables[0].addprevious(parse_xml(table_fragment("applications", style_id, json_data["list_of_applications"])))
+        body.remove(tables[0])
+        rebuilt += 1
+
+    old_groups = tables[1:]
+    groups = json_data["list_of_steps"]
+    elements = []
+    matcher = difflib.SequenceMatcher(None, old_sections["groups"], new_sections["groups"], autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            elements.extend(old_groups[i1:i2])
+            continue
+        for table in old_groups[i1:i2]:
+            body.remove(table)
+        for step_group in groups[j1:j2]:
+            elements.append(parse_xml(table_fragment("step_group", style_id, step_group)))
+            rebuilt += 1
+    for element in elements:
+        anchor.addnext(element)
+        anchor = element
+    return rebuilt
+
+
+def render_document_legacy(json_data, template_path=DOCX_TEMPLATE_PATH):
+    """Build the document through the python-docx object API with per-cell borders."""
+    doc = _new_document(template_path)
+    doc.add_heading('Process Name: ' + json_data["process_name"], level=1)
+    doc.add_paragraph(json_data["short_process_description"])
+    doc.add_heading('List of applications', level=2)
+    table = doc.add_table(rows=1, cols=3)
+    hdr_cells = table.rows[0].cells
+    hdr_cells[0].text = 'Application Name'
+    hdr_cells[1].text = 'Type'
+    hdr_cells[2].text = 'URL'
+    for cell in hdr_cells:
+        cell.paragraphs[0].runs[0].bold = True
+    for app in json_data["list_of_applications"]:
+        row_cells = table.add_row().cells
+        row_cells[0].text = app['application_name']
+        row_cells[1].text = app['type']
+        row_cells[2].text = app.get('url') or ''
+    set_table_borders(table)
+    doc.add_heading('List of steps', level=2)
+    for step_group in json_data["list_of_steps"]:
+        table = doc.add_table(rows=1, cols=3)
+        table.autofit = False
+        col_widths = [Inches(0.5), Inches(4.5), Inches(1.5)]
+        for i, width in enumerate(col_widths):
+            table.columns[i].width = width
+        hdr_cells = table.rows[0].cells
+        hdr_cell = hdr_cells[0].merge(hdr_cells[2])
+        hdr_cell.paragraphs[0].add_run(f"{step_group['numbering']} {step_group['group_name']}").bold = True
+        hdr_cell.paragraphs[0].alignment = WD_ALIGN_PARAGRAPH.LEFT
+        shading_elm = OxmlElement('w:shd')
+        shading_elm.set(qn('w:fill'), GROUP_HEADER_FILL)
+        hdr_cell._element.tcPr.append(shading_elm)
+        for sub_step in step_group["sub_steps"]:
+            row_cells = table.add_row().cells
+            row_cells[0].text = sub_step['numbering']
+            row_cells[1].text = sub_step['step']
+            row_cells[2].text = sub_step['time_stamp']
+        set_table_borders(table)
+    return doc
@@ -0,0 +1,178 @@
+import json
+import os
+import xml.etree.ElementTree as ET
+from functools import lru_cache
+
+# Bump when the generated layout changes so cached diagrams are not reused
+DRAWIO_LAYOUT_VERSION = "local-layout-1"
+
+NODE_WIDTH = 120
+NODE_HEIGHT = 60
+TERMINAL_SIZE = 60
+H_GAP = 40
+V_GAP = 40
+LANE_HEADER = 30
+LANE_PADDING = 20
+LANE_GAP = 20
+MAX_STEPS_PER_ROW = 10
+ORIGIN_X = 120
+ORIGIN_Y = 40
+
+# Serialized lanes kept in memory for reuse, keyed by their content and position
+FRAGMENT_CACHE_SIZE = int(os.getenv("FRAGMENT_CACHE_SIZE", "4096"))
+
+TERMINAL_STYLE = "ellipse;whiteSpace=wrap;html=1;aspect=fixed;"
+STEP_STYLE = "rounded=0;whiteSpace=wrap;html=1;"
+LANE_STYLE = ("swimlane;horizontal=0;whiteSpace=wrap;html=1;startSize=30;"
+              "fillColor=#D1E2F8;strokeColor=#6C8EBF;")
+EDGE_STYLE = ("edgeStyle=orthogonalEdgeStyle;rounded=0;orthogonalLoop=1;jettySize=auto;html=1;"
+              "exitX=1;exitY=0.5;exitDx=0;exitDy=0;entryX=0;entryY=0.5;entryDx=0;entryDy=0;")
+
+
+def _add_vertex(root, cell_id, value, style, parent, x, y, width, height):
+    cell = ET.SubElement(root, "mxCell", id=cell_id, value=value, style=style,
+                         parent=parent, vertex="1")
+    ET.SubElement(cell, "mxGeometry", x=str(x), y=str(y), width=str(width),
+                  height=str(height), attrib={"as": "geometry"})
+    return cell
+
+
+def _add_edge(root, cell_id, source, target):
+    cell = ET.SubElement(root, "mxCell", id=cell_id, value="", style=EDGE_STYLE,
+                         parent="1", source=source, target=target, edge="1")
+    ET.SubElement(cell, "mxGeometry", relative="1", attrib={"as": "geometry"})
+    return cell
+
+
+def _layout_lane(group_index, group, y, max_per_row):
+    sub_steps = group.get("sub_steps") or []
+    columns = max(1, min(len(sub_steps), max_per_row))
+    rows = max(1, -(-len(sub_steps) // max_per_row))
+    nodes = []
+    for step_index, sub_step in enumerate(sub_steps):
+        row, column = divmod(step_index, max_per_row)
+        nodes.append({
+            "id": f"step-{group_index}-{step_index + 1}",
+            "step": sub_step,
+            "x": LANE_HEADER + LANE_PADDING + column * (NODE_WIDTH + H_GAP),
+            "y": LANE_PADDING + row * (NODE_HEIGHT + V_GAP),
+        })
+    return {
+        "id": f"group-{group_index}",
+        "index": group_index,
+        "group": group,
+        "y": y,
+        "width": LANE_HEADER + 2 * LANE_PADDING + columns * NODE_WIDTH + (columns - 1) * H_GAP,
+        "height": 2 * LANE_PADDING + rows * NODE_HEIGHT + (rows - 1) * V_GAP,
+        "nodes": nodes,
+    }
+
+
+def layout_steps(list_of_steps, max_per_row=MAX_STEPS_PER_ROW):
+    """Assign lanes, rows and columns to every step group and sub-step.
+
+    Each group becomes a horizontal lane stacked under the previous one; its
+    sub-steps run left to right and wrap onto further rows in the same lane.
+    """
+    lanes = []
+    y = ORIGIN_Y
+    for group_index, group in enumerate(list_of_steps, start=1):
+        lane = _layout_lane(group_index, group, y, max_per_row)
+        lanes.append(lane)
+        y += lane["height"] + LANE_GAP
+    # Give all lanes the width of the widest one so the diagram lines up
+    lane_width = max((lane["width"] for lane in lanes), default=0)
+    for lane in lanes:
+        lane["width"] = lane_width
+    return lanes
+
+
+def _step_label(item, text_key):
+    numbering = item.get("numbering")
+    text = item.get(text_key) or ""
+    return f"{numbering} {text}" if numbering else text
+
+
+def _add_lane(root, lane):
+    _add_vertex(root, lane["id"], _step_label(lane["group"], "group_name"), LANE_STYLE, "1",
+                ORIGIN_X, lane["y"], lane["width"], lane["height"])
+    for node in lane["nodes"]:
+        _add_vertex(root, node["id"], _step_label(node["step"], "step"), STEP_STYLE, lane["id"],
+                    node["x"], node["y"], NODE_WIDTH, NODE_HEIGHT)
+
+
+def _serialize(root):
+    """The serialized children of root, without the root element itself."""
+    text = ET.tostring(root, encoding="unicode")
+    return text[len("<root>"):-len("</root>")] if len(root) else ""
+
+
+@lru_cache(maxsize=FRAGMENT_CACHE_SIZE)
+def _cached_lane_xml(group_index, group_json, y, width, max_per_row):
+    lane = _layout_lane(group_index, json.loads(group_json), y, max_per_row)
+    lane["width"] = width
+    root = ET.Element("root")
+    _add_lane(root, lane)
+    return _serialize(root)
+
+
+@lru_cache(maxsize=FRAGMENT_CACHE_SIZE)
+def _edges_xml(flow):
+    # Edges only depend on the cell ids, which stay the same when step texts are edited
+    root = ET.Element("root")
+    for index, (source, target) in enumerate(zip(flow, flow[1:]), start=1):
+        _add_edge(root, f"edge-{index}", source, target)
+    return _serialize(root)
+
+
+def lane_fragment(lane, max_per_row=MAX_STEPS_PER_ROW):
+    """Serialized cells of one lane from layout_steps, memoized on its group and position.
+
+    After an edit only the lanes whose group changed, or that moved because
+    an earlier lane changed height, are built again.
+    """
+    return _cached_lane_xml(lane["index"], json.dumps(lane["group"], sort_keys=True), lane["y"],
+                            lane["width"], max_per_row)
+
+
+def build_drawio_xml(json_data):
+    """Build an uncompressed draw.io mxfile for the process described by json_data."""
+    process_name = json_data.get("process_name") or "Process"
+    lanes = layout_steps(json_data.get("list_of_steps") or [])
+
+    mxfile = ET.Element("mxfile", host="app.diagrams.net", type="device", compressed="false")
+    diagram = ET.SubElement(mxfile, "diagram", id="process-map", name=process_name)
+    model = ET.SubElement(diagram, "mxGraphModel", dx="1400", dy="800", grid="1", gridSize="10",
+                          guides="1", tooltips="1", connect="1", arrows="1", fold="1", page="0",
+                          pageScale="1", math="0", shadow="0")
+    ET.SubElement(model, "root")
+    # Cells are serialized separately so unchanged lanes can come from lane_fragment()
+    root = ET.Element("root")
+    ET.SubElement(root, "mxCell", id="0")
+    ET.SubElement(root, "mxCell", id="1", parent="0")
+
+    first_row_y = ORIGIN_Y + LANE_PADDING + (NODE_HEIGHT - TERMINAL_SIZE) // 2
+    _add_vertex(root, "start", "Start", TERMINAL_STYLE, "1",
+                ORIGIN_X - TERMINAL_SIZE - H_GAP, first_row_y, TERMINAL_SIZE, TERMINAL_SIZE)
+    cells = [_serialize(root)]
+
+    flow = ["start"]
+    for lane in lanes:
+        cells.append(lane_fragment(lane))
+        flow.extend(node["id"] for node in lane["nodes"])
+
+    root = ET.Element("root")
+    if lanes:
+        last_lane = lanes[-1]
+        end_x = ORIGIN_X + last_lane["width"] + H_GAP
+        last_row_y = last_lane["nodes"][-1]["y"] if last_lane["nodes"] else LANE_PADDING
+        end_y = last_lane["y"] + last_row_y + (NODE_HEIGHT - TERMINAL_SIZE) // 2
+    else:
+        end_x, end_y = ORIGIN_X + H_GAP, first_row_y
+    _add_vertex(root, "end", "End", TERMINAL_STYLE, "1", end_x, end_y, TERMINAL_SIZE, TERMINAL_SIZE)
+    flow.append("end")
+    cells.append(_serialize(root))
+    cells.append(_edges_xml(tuple(flow)))
+
+    head, _, tail = ET.tostring(mxfile, encoding="unicode").partition("<root />")
+    return head + "<root>" + "".join(cells) + "</root>" + tail
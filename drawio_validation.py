@@ -0,0 +1,268 @@
+import difflib
+import re
+import xml.etree.ElementTree as ET
+
+# Sub-step labels that match a cell's text at least this closely count as present
+STEP_MATCH_RATIO = 0.75
+
+CONTAINER_TAGS = ("mxfile", "diagram", "mxGraphModel", "root")
+
+
+def extract_xml(text):
+    """Pull the mxfile (or bare mxGraphModel) out of a model response, fenced or not."""
+    if not text:
+        return None
+    match = re.search(r"```(?:xml)?\s*(.*?)```", text, re.DOTALL)
+    if match and "<mx" in match.group(1):
+        text = match.group(1)
+    start = min((index for index in (text.find("<mxfile"), text.find("<mxGraphModel")) if index >= 0),
+                default=-1)
+    if start < 0:
+        return None
+    text = text[start:]
+    for tag in ("</mxfile>", "</mxGraphModel>"):
+        end = text.rfind(tag)
+        if end >= 0:
+            return text[:end + len(tag)].strip()
+    # No closing tag, the response was probably cut off
+    return text.strip()
+
+
+def _close_truncated(xml):
+    """Cut a truncated document after its last complete cell and close the open containers."""
+    end = max(xml.rfind("</mxCell>") + len("</mxCell>"), xml.rfind("/>") + 2)
+    if end < 2:
+        return None
+    xml = xml[:end]
+    for tag in reversed(CONTAINER_TAGS):
+        if f"<{tag}" in xml and f"</{tag}>" not in xml:
+            xml += f"</{tag}>"
+    return xml
+
+
+def _escape_ampersands(xml):
+    return re.sub(r"&(?!(?:amp|lt|gt|quot|apos|#\d+|#x[0-9a-fA-F]+);)", "&amp;", xml)
+
+
+def _parse(xml):
+    """Parse xml into an mxfile element, wrapping a bare mxGraphModel; raises ET.ParseError."""
+    element = ET.fromstring(xml)
+    if element.tag == "mxGraphModel":
+        mxfile = ET.Element("mxfile", host="app.diagrams.net", type="device", compressed="false")
+        ET.SubElement(mxfile, "diagram", id="process-map", name="Process").append(element)
+        element = mxfile
+    return element
+
+
+def _normalise(text):
+    text = re.sub(r"<[^>]+>", " ", text or "")
+    return re.sub(r"\W+", " ", text.lower()).strip()
+
+
+def _cells(mxfile):
+    root = mxfile.find("./diagram/mxGraphModel/root")
+    return root, ([] if root is None else root.findall("mxCell"))
+
+
+def _missing_steps(cells, json_data):
+    """Match every sub-step to its own cell, by contained text first, then by similarity."""
+    labels = [_normalise(cell.get("value")) for cell in cells if cell.get("vertex") == "1"]
+    unused = set(range(len(labels)))
+    missing = []
+    for group in json_data.get("list_of_steps") or []:
+        for sub_step in group.get("sub_steps") or []:
+            text = _normalise(sub_step.get("step"))
+            if not text:
+                continue
+            match = next((index for index in sorted(unused) if text in labels[index]), None)
+            if match is None:
+                ratio, index = max(((difflib.SequenceMatcher(None, text, labels[index]).ratio(), index)
+                                    for index in unused), default=(0, None))
+                match = index if ratio >= STEP_MATCH_RATIO else None
+            if match is None:
+                missing.append(f"sub-step {sub_step.get('numbering', '?')} '{sub_step.get('step')}' has no cell")
+            else:
+                unused.discard(match)
+    return missing
+
+
+def validate_drawio(xml, json_data=None):
+    """Return a list of defects in a draw.io document; empty when it is valid.
+
+    Checks that the mxfile parses, cell ids are unique, parents and edge
+    endpoints refer to existing cells, vertices have a geometry and, given the
+    step JSON, that every sub-step appears in some cell.
+    """
+    try:
+        mxfile = _parse(xml)
+    except ET.ParseError as e:
+        return [f"XML does not parse: {e}"]
+    if mxfile.tag != "mxfile":
+        return [f"root element is <{mxfile.tag}>, expected <mxfile>"]
+    root, cells = _cells(mxfile)
+    if root is None:
+        return ["missing diagram/mxGraphModel/root"]
+    errors = []
+    ids = {}
+    for cell in cells:
+        cell_id = cell.get("id")
+        if not cell_id:
+            errors.append("mxCell without id")
+        elif cell_id in ids:
+            errors.append(f"duplicate id '{cell_id}'")
+        ids[cell_id] = cell
+    for required in ("0", "1"):
+        if required not in ids:
+            errors.append(f"missing root cell '{required}'")
+    for cell in cells:
+        cell_id = cell.get("id")
+        if cell_id != "0" and cell.get("parent") not in ids:
+            errors.append(f"cell '{cell_id}' has unknown parent '{cell.get('parent')}'")
+        if cell.get("edge") == "1":
+            for end in ("source", "target"):
+                if cell.get(end) is not None and cell.get(end) not in ids:
+                    errors.append(f"edge '{cell_id}' {end} '{cell.get(end)}' does not exist")
+        if cell.get("vertex") == "1" and cell.find("mxGeometry") is None:
+            errors.append(f"vertex '{cell_id}' has no mxGeometry")
+    if json_data is not None:
+        errors.extend(_missing_steps(cells, json_data))
+    return errors
+
+
+def structural_errors(errors):
+    """The defects that make a diagram unusable, i.e. all but missing sub-steps."""
+    return [error for error in errors if not error.startswith("sub-step ")]
+
+
+def _fix_cells(root, cells):
+    ids = {cell.get("id") for cell in cells}
+    if "0" not in ids:
+        root.insert(0, ET.Element("mxCell", id="0"))
+    if "1" not in ids:
+        root.insert(1, ET.Element("mxCell", id="1", parent="0"))
+    cells = root.findall("mxCell")
+
+    seen = set()
+    for index, cell in enumerate(cells):
+        if not cell.get("id") or cell.get("id") in seen:
+            cell.set("id", f"{cell.get('id') or 'cell'}-{index}")
+        seen.add(cell.get("id"))
+
+    # Place vertices without a geometry on a row below the rest of the diagram
+    bottom = 0
+    for cell in cells:
+        geometry = cell.find("mxGeometry")
+        if geometry is not None and geometry.get("relative") != "1":
+            try:
+                bottom = max(bottom, float(geometry.get("y", 0)) + float(geometry.get("height", 0)))
+            except ValueError:
+                pass
+    x = 40
+    for cell in cells:
+        if cell.get("id") not in ("0", "1") and cell.get("parent") not in seen:
+            cell.set("parent", "1")
+        if cell.get("vertex") == "1" and cell.find("mxGeometry") is None:
+            ET.SubElement(cell, "mxGeometry", x=str(x), y=str(int(bottom) + 60), width="120", height="60",
+                          attrib={"as": "geometry"})
+            x += 160
+        if cell.get("edge") == "1" and cell.find("mxGeometry") is None:
+            ET.SubElement(cell, "mxGeometry", relative="1", attrib={"as": "geometry"})
+
+    # Drop dangling edges along with their descendants (e.g. edge labels) and anything attached to those
+    removed = set()
+    changed = True
+    while changed:
+        changed = False
+        for cell in cells:
+            cell_id = cell.get("id")
+            if cell_id in removed:
+                continue
+            dangling = cell.get("edge") == "1" and any(
+                cell.get(end) is not None and (cell.get(end) not in seen or cell.get(end) in removed)
+                for end in ("source", "target"))
+            if dangling or cell.get("parent") in removed:
+                removed.add(cell_id)
+                changed = True
+    for cell in cells:
+        if cell.get("id") in removed:
+            root.remove(cell)
+
+
+def repair_drawio_locally(text, json_data=None):
+    """Try cheap local fixes for a draw.io response before asking a model.
+
+    Returns (xml, errors): xml is None when the response holds no diagram at
+    all, otherwise errors lists the defects left over (e.g. missing steps).
+    """
+    xml = extract_xml(text)
+    if xml is None:
+        return None, ["no mxfile found in the response"]
+    candidates = [xml, _escape_ampersands(xml)]
+    closed = _close_truncated(_escape_ampersands(xml))
+    if closed is not None:
+        candidates.append(closed)
+    for candidate in candidates:
+        try:
+            mxfile = _parse(candidate)
+        except ET.ParseError:
+            continue
+        root, cells = _cells(mxfile)
+        if root is None:
+            continue
+        _fix_cells(root, cells)
+        xml = ET.tostring(mxfile, encoding="unicode")
+        return xml, validate_drawio(xml, json_data)
+    return xml, validate_drawio(xml, json_data)
+
+
+def _label_edits(old_json, new_json):
+    """(numbering, old, new) for renamed groups and sub-steps, or None if the structure changed."""
+    old_groups = old_json.get("list_of_steps") or []
+    new_groups = new_json.get("list_of_steps") or []
+    if len(old_groups) != len(new_groups):
+        return None
+    edits = []
+    for old_group, new_group in zip(old_groups, new_groups):
+        old_steps = old_group.get("sub_steps") or []
+        new_steps = new_group.get("sub_steps") or []
+        if len(old_steps) != len(new_steps) or old_group.get("numbering") != new_group.get("numbering"):
+            return None
+        pairs = [(old_group, new_group, "group_name")]
+        pairs += [(old_step, new_step, "step") for old_step, new_step in zip(old_steps, new_steps)]
+        for old_item, new_item, key in pairs:
+            if key == "step" and old_item.get("numbering") != new_item.get("numbering"):
+                return None
+            if old_item.get(key) != new_item.get(key):
+                edits.append((new_item.get("numbering") or "", old_item.get(key) or "", new_item.get(key) or ""))
+    return edits
+
+
+def relabel_drawio(xml, old_json, new_json):
+    """Carry text edits of the step JSON over to an existing diagram, keeping its layout.
+
+    Meant for diagrams drawn by the model, which cannot be rebuilt locally.
+    Returns the updated xml, or None when groups or sub-steps were added,
+    removed or renumbered, or an edited text cannot be traced to a single
+    cell (by its text, then its numbering), in which case the diagram has to
+    be drawn again.
+    """
+    edits = _label_edits(old_json, new_json)
+    if edits is None:
+        return None
+    try:
+        mxfile = _parse(xml)
+    except ET.ParseError:
+        return None
+    _, cells = _cells(mxfile)
+    vertices = [cell for cell in cells if cell.get("vertex") == "1"]
+    for numbering, old, new in edits:
+        matches = [cell for cell in vertices if old and old in (cell.get("value") or "")]
+        if len(matches) > 1 and numbering:
+            matches = [cell for cell in matches if numbering in cell.get("value")]
+        if len(matches) != 1:
+            return None
+        matches[0].set("value", matches[0].get("value").replace(old, new))
+    diagram = mxfile.find("diagram")
+    if diagram is not None and new_json.get("process_name"):
+        diagram.set("name", new_json["process_name"])
+    return ET.tostring(mxfile, encoding="unicode")
@@ -0,0 +1,71 @@
+import os
+import sqlite3
+import threading
+import time
+
+FILE_REGISTRY_PATH = os.getenv("FILE_REGISTRY_PATH", "gemini_files.sqlite3")
+
+# Gemini keeps uploaded files for 48 hours; stop reusing them a little earlier
+DEFAULT_FILE_TTL = 47 * 3600
+EXPIRY_MARGIN = 15 * 60
+
+
+class FileRegistry:
+    """SQLite map from video content hash to the remote Gemini file holding it."""
+
+    def __init__(self, db_path=FILE_REGISTRY_PATH):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS uploaded_files (
+                    video_hash TEXT PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    uri TEXT NOT NULL,
+                    mime_type TEXT,
+                    uploaded_at REAL NOT NULL,
+                    expires_at REAL NOT NULL
+                )"""
+            )
+        self.purge_expired()
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def lookup(self, video_hash):
+        """Return the registered file for video_hash if it has not expired yet."""
+        with self._lock, self._connect() as conn:
+            row = conn.execute(
+                "SELECT name, uri, mime_type, expires_at FROM uploaded_files WHERE video_hash = ?",
+                (video_hash,),
+            ).fetchone()
+            if row is None:
+                return None
+            name, uri, mime_type, expires_at = row
+            if expires_at - EXPIRY_MARGIN <= time.time():
+                conn.execute("DELETE FROM uploaded_files WHERE video_hash = ?", (video_hash,))
+                return None
+        return {"name": name, "uri": uri, "mime_type": mime_type, "expires_at": expires_at}
+
+    def register(self, video_hash, file, mime_type=None):
+        """Record an uploaded genai file, using its expiration_time when available."""
+        expiration = getattr(file, "expiration_time", None)
+        if expiration is not None and hasattr(expiration, "timestamp"):
+            expires_at = expiration.timestamp()
+        else:
+            expires_at = time.time() + DEFAULT_FILE_TTL
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO uploaded_files VALUES (?, ?, ?, ?, ?, ?)",
+                (video_hash, file.name, file.uri, mime_type, time.time(), expires_at),
+            )
+
+    def remove(self, video_hash):
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM uploaded_files WHERE video_hash = ?", (video_hash,))
+
+    def purge_expired(self):
+        """Drop every entry that lookup would no longer return."""
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM uploaded_files WHERE expires_at - ? <= ?",
+                         (EXPIRY_MARGIN, time.time()))
@@ -0,0 +1,318 @@
+import http.client
+import os
+import queue
+import random
+import threading
+import time
+
+from instrumentation import current_span
+from rate_limiting import TokenBucket
+
+GEMINI_MAX_RETRIES = int(os.getenv("GEMINI_MAX_RETRIES", "4"))
+GEMINI_BACKOFF_BASE = float(os.getenv("GEMINI_BACKOFF_BASE", "1.0"))
+GEMINI_BACKOFF_MAX = float(os.getenv("GEMINI_BACKOFF_MAX", "30"))
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "8"))
+# Generation requests and tokens per minute across the process; 0 disables the limit
+GEMINI_RPM = int(os.getenv("GEMINI_RPM", "0"))
+GEMINI_TPM = int(os.getenv("GEMINI_TPM", "0"))
+# Fire a second generation when the first has not answered after this many seconds; 0 disables
+GEMINI_HEDGE_AFTER = float(os.getenv("GEMINI_HEDGE_AFTER", "0"))
+
+# Per-call timeouts in seconds; streams time out on the first chunk and between chunks
+UPLOAD_TIMEOUT = float(os.getenv("GEMINI_UPLOAD_TIMEOUT", "900"))
+GET_FILE_TIMEOUT = float(os.getenv("GEMINI_GET_FILE_TIMEOUT", "30"))
+GENERATE_TIMEOUT = float(os.getenv("GEMINI_GENERATE_TIMEOUT", "600"))
+STREAM_IDLE_TIMEOUT = float(os.getenv("GEMINI_STREAM_IDLE_TIMEOUT", "120"))
+
+# Rough prompt size of an uploaded file, used for the TPM limit
+FILE_TOKEN_ESTIMATE = int(os.getenv("FILE_TOKEN_ESTIMATE", "30000"))
+
+# HTTP status codes worth retrying: timeouts, rate limits and server errors
+RETRYABLE_CODES = {408, 429, 500, 502, 503, 504}
+
+
+def status_code(error):
+    """HTTP status of an API error, or None when it carries none."""
+    candidates = (
+        getattr(error, "code", None),                                 # google.api_core and fakes
+        getattr(error, "status_code", None),                          # googleapiclient HttpError
+        getattr(getattr(error, "resp", None), "status", None),        # older HttpError, httplib2
+        getattr(getattr(error, "response", None), "status_code", None),  # requests.HTTPError
+    )
+    for code in candidates:
+        # google.api_core exceptions carry an HTTPStatus, plain ints come from the others
+        code = getattr(code, "value", code)
+        if isinstance(code, int):
+            return code
+    return None
+
+
+def transport_errors():
+    """Exception types raised when a connection drops or times out, from whichever HTTP stacks are installed."""
+    errors = [TimeoutError, ConnectionError, http.client.IncompleteRead]
+    try:
+        import requests
+        errors += [requests.ConnectionError, requests.Timeout]
+    except ImportError:
+        pass
+    try:
+        from google.auth.exceptions import TransportError
+        errors.append(TransportError)
+    except ImportError:
+        pass
+    return tuple(errors)
+
+
+def is_retryable(error):
+    """Classify an API error: retry dropped connections, timeouts, rate limits and server errors."""
+    if isinstance(error, transport_errors()):
+        return True
+    return status_code(error) in RETRYABLE_CODES
+
+
+def backoff_delay(attempt, base=GEMINI_BACKOFF_BASE, maximum=GEMINI_BACKOFF_MAX):
+    """Full-jitter exponential backoff for the given retry attempt (0 based)."""
+    return random.uniform(0, min(maximum, base * 2 ** attempt))
+
+
+def estimate_tokens(contents):
+    if isinstance(contents, str):
+        return len(contents) // 4
+    if isinstance(contents, (list, tuple)):
+        return sum(estimate_tokens(part) for part in contents)
+    if isinstance(contents, dict):
+        return estimate_tokens(contents.get("parts", []))
+    return FILE_TOKEN_ESTIMATE
+
+
+class _Slot:
+    """One concurrency slot, returned once by whichever lets go first: the request or its caller."""
+
+    def __init__(self, semaphore):
+        self._semaphore = semaphore
+        self._held = True
+        self._lock = threading.Lock()
+
+    def release(self):
+        with self._lock:
+            if not self._held:
+                return
+            self._held = False
+        self._semaphore.release()
+
+
+class ResilientBackend:
+    """Wrap a model backend with timeouts, retries, concurrency and rate limits, and hedging.
+
+    Every call made through it, including models and chats it returns, is
+    retried with jittered exponential backoff when is_retryable() says so.
+    All calls share one concurrency limit; generation requests also share
+    the optional RPM/TPM buckets. A request the caller gives up on (timed
+    out, or the losing half of a hedge) hands its slot back right away even
+    if the underlying call never returns.
+    """
+
+    def __init__(self, backend, max_retries=GEMINI_MAX_RETRIES, max_concurrency=GEMINI_MAX_CONCURRENCY,
+                 rpm=GEMINI_RPM, tpm=GEMINI_TPM, hedge_after=GEMINI_HEDGE_AFTER,
+                 backoff_base=GEMINI_BACKOFF_BASE, backoff_max=GEMINI_BACKOFF_MAX):
+        self.backend = backend
+        self.max_retries = max_retries
+        self.hedge_after = hedge_after
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._requests = TokenBucket(rpm) if rpm else None
+        self._tokens = TokenBucket(tpm) if tpm else None
+
+    def set_request_limiter(self, limiter):
+        """Replace the RPM bucket with limiter (anything with acquire()) and return the old one."""
+        previous, self._requests = self._requests, limiter
+        return previous
+
+    def _admit(self, tokens, generation, timeout):
+        """Wait for the rate limits and a concurrency slot; raise TimeoutError if no slot frees up in time."""
+        if generation and self._requests is not None:
+            self._requests.acquire()
+        if generation and self._tokens is not None and tokens:
+            self._tokens.acquire(min(tokens, self._tokens.capacity))
+        if not self._slots.acquire(timeout=timeout):
+            raise TimeoutError(f"No Gemini request slot became free within {timeout:.0f} s.")
+        return _Slot(self._slots)
+
+    def _try_admit(self, tokens):
+        """Admit a hedged request only if a slot and the rate limits allow it right away."""
+        if not self._slots.acquire(blocking=False):
+            return None
+        slot = _Slot(self._slots)
+        if self._requests is not None and not self._requests.acquire(timeout=0):
+            slot.release()
+            return None
+        if self._tokens is not None and tokens and not self._tokens.acquire(min(tokens, self._tokens.capacity),
+                                                                             timeout=0):
+            slot.release()
+            return None
+        return slot
+
+    def _start(self, fn, outcomes, tag, slot, stream=False):
+        """Run fn in a daemon thread, reporting its outcome (and chunks when streaming) to outcomes."""
+        def target():
+            try:
+                result = fn()
+                if not stream:
+                    outcomes.put(("result", tag, result))
+                    return
+                outcomes.put(("response", tag, result))
+                for chunk in result:
+                    outcomes.put(("chunk", tag, chunk))
+                outcomes.put(("end", tag, None))
+            except Exception as e:
+                outcomes.put(("error", tag, e))
+            finally:
+                slot.release()
+
+        threading.Thread(target=target, daemon=True).start()
+
+    def _attempt(self, fn, timeout, tokens, hedge, stream, generation):
+        """One attempt, hedged if allowed; return (tag, outcomes, first message, slot) of the winner."""
+        outcomes = queue.Queue()
+        slots = {0: self._admit(tokens, generation, timeout)}
+        started = time.monotonic()
+        self._start(fn, outcomes, 0, slots[0], stream)
+        running = {0}
+        hedged = not (hedge and self.hedge_after)
+        responses = {}
+        error = None
+        while running:
+            remaining = started + timeout - time.monotonic()
+            wait = remaining if hedged else min(remaining, started + self.hedge_after - time.monotonic())
+            try:
+                kind, tag, value = outcomes.get(timeout=max(0.0, wait))
+            except queue.Empty:
+                if not hedged and time.monotonic() < started + timeout:
+                    hedged = True
+                    slot = self._try_admit(tokens)
+                    if slot is not None:
+                        current_span().add("hedged_requests")
+                        slots[1] = slot
+                        self._start(fn, outcomes, 1, slot, stream)
+                        running.add(1)
+                    continue
+                for slot in slots.values():
+                    slot.release()
+                raise TimeoutError(f"Gemini request timed out after {timeout:.0f} s.")
+            if kind == "response":
+                responses[tag] = value
+                continue
+            if kind == "error":
+                running.discard(tag)
+                error = value
+                continue
+            # A result, or the first chunk (or end) of a stream, decides the winner
+            for other, slot in slots.items():
+                if other != tag:
+                    slot.release()
+            return tag, outcomes, (kind, responses.get(tag), value), slots[tag]
+        raise error
+
+    def call(self, fn, timeout, tokens=0, hedge=False, stream=False, generation=False):
+        """Call fn with retries; streams are only retried until their first chunk arrives.
+
+        Generation calls also count against the RPM/TPM limits.
+        """
+        for attempt in range(self.max_retries + 1):
+            try:
+                tag, outcomes, (kind, response, value), slot = self._attempt(fn, timeout, tokens, hedge, stream,
+                                                                             generation)
+            except Exception as e:
+                if attempt >= self.max_retries or not is_retryable(e):
+                    raise
+                delay = backoff_delay(attempt, self.backoff_base, self.backoff_max)
+                print(f"Gemini request failed ({e}), retrying in {delay:.1f} s")
+                current_span().add("retries")
+                time.sleep(delay)
+                continue
+            if not stream:
+                return value
+            return ResilientStream(response, tag, outcomes, kind, value, slot)
+
+    def upload_file(self, path, mime_type=None):
+        return self.call(lambda: self.backend.upload_file(path, mime_type=mime_type), UPLOAD_TIMEOUT)
+
+    def get_file(self, name):
+        return self.call(lambda: self.backend.get_file(name), GET_FILE_TIMEOUT)
+
+    def GenerativeModel(self, model_name, generation_config=None, system_instruction=None):
+        model = self.backend.GenerativeModel(model_name, generation_config=generation_config,
+                                             system_instruction=system_instruction)
+        return ResilientModel(self, model, estimate_tokens(system_instruction or ""))
+
+    def wrap(self, model):
+        """Route an existing model, e.g. one bound to a context cache, through this client."""
+        return ResilientModel(self, model)
+
+
+class ResilientStream:
+    """Streaming response of the winning request, read with an idle timeout between chunks."""
+
+    def __init__(self, response, tag, outcomes, first_kind, first_value, slot):
+        self.response = response
+        self._tag = tag
+        self._outcomes = outcomes
+        self._first = (first_kind, first_value)
+        self._slot = slot
+
+    def __iter__(self):
+        kind, value = self._first
+        while kind == "chunk":
+            yield value
+            while True:
+                try:
+                    kind, tag, value = self._outcomes.get(timeout=STREAM_IDLE_TIMEOUT)
+                except queue.Empty:
+                    self._slot.release()
+                    raise TimeoutError(f"No response data for {STREAM_IDLE_TIMEOUT:.0f} s.")
+                # Chunks of the losing hedged request are dropped
+                if tag == self._tag and kind != "response":
+                    break
+        if kind == "error":
+            raise value
+
+    def __getattr__(self, name):
+        return getattr(self.response, name)
+
+
+class ResilientModel:
+    def __init__(self, client, model, base_tokens=0):
+        self.client = client
+        self.model = model
+        self.base_tokens = base_tokens
+
+    def generate_content(self, contents, stream=False):
+        return self.client.call(lambda: self.model.generate_content(contents, stream=stream),
+                                GENERATE_TIMEOUT, self.base_tokens + estimate_tokens(contents),
+                                hedge=True, stream=stream, generation=True)
+
+    def start_chat(self, history=None):
+        return ResilientChat(self, history)
+
+
+class ResilientChat:
+    """Chat whose messages can be retried and hedged safely.
+
+    Every attempt runs on a fresh chat built from the history so far, so a
+    failed or duplicate request never leaves an extra turn behind.
+    """
+
+    def __init__(self, model, history=None):
+        self.model = model
+        self.history = list(history or [])
+
+    def send_message(self, content):
+        def send():
+            return self.model.model.start_chat(history=list(self.history)).send_message(content)
+
+        response = self.model.client.call(send, GENERATE_TIMEOUT,
+                                          self.model.base_tokens + estimate_tokens([content, self.history]),
+                                          hedge=True, generation=True)
+        self.history += [{"role": "user", "parts": [content]}, {"role": "model", "parts": [response.text]}]
+        return response
@@ -0,0 +1,327 @@
+import contextvars
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+METRICS_DIR = os.getenv("METRICS_DIR", "metrics")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+
+_current_trace = contextvars.ContextVar("current_trace", default=None)
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+
+class Span:
+    """Timing and counters for one pipeline stage."""
+
+    def __init__(self, name, parent=None):
+        self.name = name
+        self.parent = parent.name if parent is not None else None
+        self.started = time.time()
+        self.duration = None
+        self.attrs = {
+            "bytes_uploaded": 0,
+            "prompt_tokens": 0,
+            "response_tokens": 0,
+            "cached_tokens": 0,
+            "retries": 0,
+            "cache_hit": None,
+        }
+        self.error = None
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def add(self, key, amount=1):
+        self.attrs[key] = self.attrs.get(key, 0) + amount
+
+    def record_usage(self, response):
+        """Add the token counts from a Gemini response's usage_metadata."""
+        usage = getattr(response, "usage_metadata", None)
+        if usage is None:
+            return
+        self.add("prompt_tokens", getattr(usage, "prompt_token_count", 0) or 0)
+        self.add("response_tokens", getattr(usage, "candidates_token_count", 0) or 0)
+        self.add("cached_tokens", getattr(usage, "cached_content_token_count", 0) or 0)
+
+    def to_dict(self):
+        return {"stage": self.name, "parent": self.parent, "started": self.started,
+                "duration": self.duration, "error": self.error, **self.attrs}
+
+
+class JobTrace:
+    """Collects the spans of one process_video job."""
+
+    def __init__(self, job_id=None, on_change=None):
+        self.job_id = job_id or uuid.uuid4().hex[:12]
+        self.started = time.time()
+        self.duration = None
+        self.status = None
+        self.spans = []
+        self.running = []
+        # Called with the trace whenever a stage starts or ends, e.g. to report progress
+        self.on_change = on_change
+        self._lock = threading.Lock()
+
+    def _changed(self):
+        if self.on_change is not None:
+            self.on_change(self)
+
+    def start(self, span):
+        with self._lock:
+            self.running.append(span)
+        self._changed()
+
+    def add(self, span):
+        with self._lock:
+            if span in self.running:
+                self.running.remove(span)
+            self.spans.append(span)
+        self._changed()
+
+    def current_stages(self):
+        """Names of the stages running right now, outermost first."""
+        with self._lock:
+            return [span.name for span in self.running]
+
+    @contextmanager
+    def activate(self):
+        """Make this the trace that stage() records into for the current context."""
+        token = _current_trace.set(self)
+        try:
+            yield self
+        finally:
+            _current_trace.reset(token)
+
+    def finish(self, status):
+        self.duration = time.time() - self.started
+        self.status = status
+
+    def breakdown(self):
+        """Seconds spent per top-level stage, in the order the stages started."""
+        totals = {}
+        with self._lock:
+            spans = sorted(self.spans, key=lambda span: span.started)
+        for span in spans:
+            if span.parent is None and span.duration is not None:
+                totals[span.name] = totals.get(span.name, 0.0) + span.duration
+        return [{"stage": name, "seconds": round(seconds, 3)} for name, seconds in totals.items()]
+
+    def to_records(self):
+        with self._lock:
+            spans = [span.to_dict() for span in self.spans]
+        return [{"job_id": self.job_id, **span} for span in spans] + [{
+            "job_id": self.job_id, "stage": "job", "parent": None, "started": self.started,
+            "duration": self.duration, "status": self.status,
+        }]
+
+
+class _NullSpan(Span):
+    def set(self, **attrs):
+        pass
+
+    def add(self, key, amount=1):
+        pass
+
+    def record_usage(self, response):
+        pass
+
+
+@contextmanager
+def stage(name, **attrs):
+    """Time a pipeline stage as a span of the active JobTrace (a no-op without one)."""
+    trace = _current_trace.get()
+    if trace is None:
+        yield _NullSpan(name)
+        return
+    span = Span(name, parent=_current_span.get())
+    span.set(**attrs)
+    token = _current_span.set(span)
+    trace.start(span)
+    try:
+        yield span
+    except Exception as e:
+        span.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        span.duration = time.time() - span.started
+        _current_span.reset(token)
+        trace.add(span)
+
+
+def current_span():
+    return _current_span.get() or _NullSpan("none")
+
+
+def run_in_context(executor, fn, *args):
+    """Submit fn to a thread pool so stage() inside it still records into the caller's trace."""
+    return executor.submit(contextvars.copy_context().run, fn, *args)
+
+
+class MetricsRegistry:
+    """Process-wide counters rendered in the Prometheus text exposition format."""
+
+    HELP = {
+        "videodoc_jobs_total": ("counter", "Jobs finished by status."),
+        "videodoc_job_duration_seconds_sum": ("counter", "Total job wall-clock time."),
+        "videodoc_stage_duration_seconds_sum": ("counter", "Total time spent per stage."),
+        "videodoc_stage_duration_seconds_count": ("counter", "Number of times a stage ran."),
+        "videodoc_stage_errors_total": ("counter", "Stages that raised."),
+        "videodoc_bytes_uploaded_total": ("counter", "Bytes uploaded to Gemini."),
+        "videodoc_tokens_total": ("counter", "Prompt, response and cached tokens per stage."),
+        "videodoc_retries_total": ("counter", "Retried requests per stage."),
+        "videodoc_cache_hits_total": ("counter", "Cache hits per stage."),
+        "videodoc_cache_misses_total": ("counter", "Cache misses per stage."),
+    }
+
+    def __init__(self):
+        self.values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, metric, amount=1, **labels):
+        key = (metric, tuple(sorted(labels.items())))
+        with self._lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def samples(self):
+        """The counters as [metric, labels, value] lists, e.g. to send them as JSON."""
+        with self._lock:
+            return [[metric, dict(labels), value] for (metric, labels), value in sorted(self.values.items())]
+
+    def merge(self, samples):
+        """Add counters given as samples() lists."""
+        for metric, labels, value in samples:
+            self.inc(metric, value, **labels)
+
+    def observe_job(self, trace):
+        self.inc("videodoc_jobs_total", status=trace.status or "unknown")
+        self.inc("videodoc_job_duration_seconds_sum", trace.duration or 0)
+        for span in list(trace.spans):
+            self.inc("videodoc_stage_duration_seconds_sum", span.duration or 0, stage=span.name)
+            self.inc("videodoc_stage_duration_seconds_count", 1, stage=span.name)
+            if span.error:
+                self.inc("videodoc_stage_errors_total", stage=span.name)
+            if span.attrs["bytes_uploaded"]:
+                self.inc("videodoc_bytes_uploaded_total", span.attrs["bytes_uploaded"])
+            for kind in ("prompt", "response", "cached"):
+                if span.attrs[f"{kind}_tokens"]:
+                    self.inc("videodoc_tokens_total", span.attrs[f"{kind}_tokens"], stage=span.name, kind=kind)
+            if span.attrs["retries"]:
+                self.inc("videodoc_retries_total", span.attrs["retries"], stage=span.name)
+            if span.attrs["cache_hit"] is True:
+                self.inc("videodoc_cache_hits_total", stage=span.name)
+            elif span.attrs["cache_hit"] is False:
+                self.inc("videodoc_cache_misses_total", stage=span.name)
+
+    def render(self):
+        with self._lock:
+            values = dict(self.values)
+        lines = []
+        for metric, (kind, help_text) in self.HELP.items():
+            samples = [(labels, value) for (name, labels), value in sorted(values.items()) if name == metric]
+            if not samples:
+                continue
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} {kind}")
+            for labels, value in samples:
+                label_text = ",".join(f'{key}="{val}"' for key, val in labels)
+                lines.append(f"{metric}{{{label_text}}} {value}" if label_text else f"{metric} {value}")
+        return "\n".join(lines) + "\n"
+
+
+METRICS = MetricsRegistry()
+
+_metrics_store = None
+
+
+def use_metrics_store(store):
+    """Keep the metric totals in store, so every process sharing it reports the same totals.
+
+    store needs add_metrics(samples) and metrics(), like JobStore and
+    JobServiceClient; None goes back to the totals of this process.
+    """
+    global _metrics_store
+    _metrics_store = store
+
+
+def metrics_totals():
+    """Registry with the totals to report: the shared store's if one is in use, else METRICS."""
+    if _metrics_store is None:
+        return METRICS
+    totals = MetricsRegistry()
+    totals.merge(_metrics_store.metrics())
+    return totals
+
+
+def export_job(trace, metrics_dir=METRICS_DIR):
+    """Write the job's spans as JSON lines and refresh the Prometheus text file."""
+    job_metrics = MetricsRegistry()
+    job_metrics.observe_job(trace)
+    METRICS.merge(job_metrics.samples())
+    jobs_dir = os.path.join(metrics_dir, "jobs")
+    os.makedirs(jobs_dir, exist_ok=True)
+    with open(os.path.join(jobs_dir, f"{trace.job_id}.jsonl"), "w", encoding="utf-8") as f:
+        for record in trace.to_records():
+            f.write(json.dumps(record) + "\n")
+    try:
+        if _metrics_store is not None:
+            _metrics_store.add_metrics(job_metrics.samples())
+        text = metrics_totals().render()
+    except Exception as e:
+        # Totals of this process alone would overwrite the shared ones in the file
+        print("Error sharing job metrics:", e)
+        return
+    # Other worker processes refresh the same file
+    fd, tmp_path = tempfile.mkstemp(dir=metrics_dir, prefix=".tmp_", suffix=".prom")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp_path, os.path.join(metrics_dir, "metrics.prom"))
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        try:
+            body = metrics_totals().render().encode("utf-8")
+        except Exception as e:
+            self.send_error(503, f"Metrics unavailable: {e}")
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+_metrics_server = None
+_metrics_server_lock = threading.Lock()
+
+
+def start_metrics_server(port=METRICS_PORT):
+    """Serve /metrics on port from a daemon thread; safe to call on every Streamlit rerun."""
+    global _metrics_server
+    if not port:
+        return None
+    with _metrics_server_lock:
+        if _metrics_server is None:
+            try:
+                _metrics_server = ThreadingHTTPServer(("0.0.0.0", port), _MetricsHandler)
+            except OSError as e:
+                print(f"Metrics server not started on port {port}:", e)
+                return None
+            threading.Thread(target=_metrics_server.serve_forever, daemon=True).start()
+    return _metrics_server
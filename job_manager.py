@@ -0,0 +1,274 @@
+import os
+import threading
+import time
+import uuid
+
+from checkpoints import Checkpoint
+from doc_processing import DRAWIO_MODE, artifact_status, process_video, rerender_artifacts
+from instrumentation import JobTrace, use_metrics_store
+from scheduler import FairScheduler, estimate_cost
+from step_schema import check_process
+from storage import StorageManager
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+# Finished jobs are forgotten after this many seconds
+JOB_RETENTION = int(os.getenv("JOB_RETENTION", str(6 * 3600)))
+# Base URL of a running job service, e.g. http://127.0.0.1:8765; empty runs jobs in-process
+JOB_SERVICE_URL = os.getenv("JOB_SERVICE_URL", "")
+
+# User-facing labels and rough overall progress for the pipeline stages
+STAGE_LABELS = {
+    "cache_lookup": ("Checking for earlier results", 0.05),
+    "preprocess": ("Pre-processing the video", 0.1),
+    "upload": ("Uploading the video", 0.2),
+    "activate": ("Waiting for Gemini to process the video", 0.35),
+    "segmented_analysis": ("Analysing the recording in segments", 0.5),
+    "analyse": ("Analysing the recording", 0.6),
+    "parse": ("Reading the analysis", 0.8),
+    "repair": ("Repairing the analysis", 0.8),
+    "render_docx": ("Rendering the documents", 0.9),
+    "render_drawio": ("Rendering the documents", 0.9),
+}
+
+
+# Job attributes that are shared with the job service and its clients
+JOB_FIELDS = ("job_id", "video_path", "name", "user", "cost", "status", "queue_position", "queue_eta", "stage",
+              "progress", "output_dir", "options", "word_file", "drawio_file", "error", "timings", "submitted",
+              "finished", "version")
+
+
+class Job:
+    """State of one submitted video, updated by the worker thread as stages run."""
+
+    def __init__(self, video_path, name=None, user=None, cost=0.0):
+        self.job_id = uuid.uuid4().hex[:12]
+        self.video_path = video_path
+        self.name = name or os.path.basename(video_path)
+        self.user = user
+        self.cost = cost
+        self.status = "queued"
+        self.queue_position = None
+        self.queue_eta = None
+        self.stage = None
+        self.progress = 0.0
+        self.output_dir = None
+        self.options = {}
+        self.word_file = None
+        self.drawio_file = None
+        self.error = None
+        self.timings = []
+        self.submitted = time.time()
+        self.finished = None
+        self.version = 0
+        self._changed = threading.Condition()
+
+    @property
+    def done(self):
+        return self.status in ("completed", "partial", "failed")
+
+    @property
+    def stage_label(self):
+        if self.done:
+            return "Finished"
+        if self.stage is None:
+            if self.status != "queued":
+                return "Starting"
+            if self.queue_position is None:
+                return "Waiting for a free worker"
+            minutes = max(1, round((self.queue_eta or 0) / 60))
+            return f"Waiting in the queue (position {self.queue_position}, starts in about {minutes} min)"
+        return STAGE_LABELS.get(self.stage, (self.stage, None))[0]
+
+    def update(self, **fields):
+        with self._changed:
+            for key, value in fields.items():
+                setattr(self, key, value)
+            self.version += 1
+            self._changed.notify_all()
+
+    def wait(self, version, timeout=None):
+        """Block until the job changes after version, or timeout; return the current version."""
+        with self._changed:
+            self._changed.wait_for(lambda: self.version != version, timeout)
+            return self.version
+
+    def on_trace_change(self, trace):
+        # The innermost known stage is the most specific one to show
+        stages = [name for name in trace.current_stages() if name in STAGE_LABELS]
+        if not stages:
+            return
+        progress = max(self.progress, STAGE_LABELS[stages[-1]][1])
+        self.update(stage=stages[-1], progress=progress, timings=trace.breakdown())
+
+
+class JobManager:
+    """Run process_video in background threads so the app can return a job ID right away.
+
+    Jobs live in memory for the lifetime of the server process and are shared
+    by every session, so a rerun or refreshed tab can pick up a job by its ID.
+    A FairScheduler decides which queued job runs next, sharing the workers
+    between users and turning away submissions the queue cannot absorb.
+    Each job writes into its own directory from the StorageManager, which is
+    trimmed to its quota whenever a job finishes.
+    """
+
+    def __init__(self, workers=JOB_WORKERS, retention=JOB_RETENTION, process=process_video, storage=None,
+                 scheduler=None):
+        self.process = process
+        self.storage = storage if storage is not None else StorageManager()
+        self.retention = retention
+        self.jobs = {}
+        self._lock = threading.Lock()
+        self.scheduler = scheduler if scheduler is not None else FairScheduler(max_running=workers)
+        self.scheduler.run = self._run
+        self.scheduler.on_change = self._on_queue_change
+
+    def submit(self, video_path, name=None, user=None, **options):
+        """Queue video_path for processing and return the job ID; options go to process_video.
+
+        Raises RuntimeError with a message for the user when the scheduler
+        does not admit the job.
+        """
+        user = user or "anonymous"
+        job = Job(video_path, name, user=user, cost=estimate_cost(video_path))
+        if "output_dir" not in options:
+            options["output_dir"] = self.storage.job_dir(job.job_id)
+        # The job directory belongs to this job alone, so a retry always resumes from it
+        options.setdefault("resume", True)
+        job.output_dir = options["output_dir"]
+        job.options = dict(options)
+        with self._lock:
+            self._prune()
+            self.jobs[job.job_id] = job
+        try:
+            self.scheduler.submit(job.job_id, user, job.cost, (job, options))
+        except RuntimeError:
+            with self._lock:
+                del self.jobs[job.job_id]
+            raise
+        return job.job_id
+
+    def retry(self, job_id):
+        """Run a finished job again in the same directory, resuming after its last completed stage.
+
+        Raises RuntimeError like submit() when the scheduler does not admit it.
+        """
+        job = self.get(job_id)
+        if job is None or not job.done:
+            return False
+        previous = {"status": job.status, "finished": job.finished}
+        job.update(status="queued", stage=None, progress=0.0, error=None, finished=None)
+        try:
+            self.scheduler.submit(job.job_id, job.user, job.cost, (job, dict(job.options)))
+        except RuntimeError:
+            job.update(progress=1.0, **previous)
+            raise
+        return True
+
+    def analysis(self, job_id):
+        """The process JSON a job's files were rendered from, or None."""
+        job = self.get(job_id)
+        return Checkpoint(job.output_dir).load_json("parse") if job is not None else None
+
+    def rerender(self, job_id, json_data):
+        """Render edited process JSON into a finished job's files without analysing the video again.
+
+        Raises ValueError when json_data does not match the process schema.
+        """
+        check_process(json_data)
+        job = self.get(job_id)
+        if job is None or not job.done:
+            return False
+        execute_rerender(job, json_data)
+        return True
+
+    def get(self, job_id):
+        with self._lock:
+            return self.jobs.get(job_id)
+
+    def _prune(self):
+        cutoff = time.time() - self.retention
+        for job_id, job in list(self.jobs.items()):
+            if job.finished is not None and job.finished < cutoff:
+                del self.jobs[job_id]
+
+    def _active_paths(self):
+        with self._lock:
+            jobs = [job for job in self.jobs.values() if not job.done]
+        return [path for job in jobs for path in (job.video_path, job.output_dir)]
+
+    def _on_queue_change(self, positions):
+        with self._lock:
+            jobs = [job for job in self.jobs.values() if job.status == "queued"]
+        for job in jobs:
+            position, eta = positions.get(job.job_id, (None, None))
+            if position != job.queue_position or (eta is not None and abs(eta - (job.queue_eta or 0)) >= 30):
+                job.update(queue_position=position, queue_eta=eta)
+
+    def _run(self, job_id, payload):
+        job, options = payload
+        execute_job(job, self.process, options)
+        try:
+            self.storage.evict(protected=self._active_paths() + [job.output_dir])
+        except OSError as e:
+            print("Error evicting stored files:", e)
+
+
+def execute_job(job, process, options):
+    """Run process for job, reporting its stages and outcome through job.update()."""
+    trace = JobTrace(job_id=job.job_id, on_change=job.on_trace_change)
+    job.update(status="running", queue_position=None, queue_eta=None)
+    word_file = drawio_file = error = None
+    try:
+        word_file, drawio_file = process(job.video_path, trace=trace, **options)
+        if not word_file and not drawio_file:
+            error = "No data could be extracted from the video."
+    except Exception as e:
+        print(f"Job {job.job_id} failed:", e)
+        error = str(e)
+    job.update(status=artifact_status(word_file, drawio_file), stage=None, progress=1.0, word_file=word_file,
+               drawio_file=drawio_file, error=error, timings=trace.breakdown(), finished=time.time())
+
+
+def execute_rerender(job, json_data):
+    """Render edited process JSON into job's files, reporting the outcome through job.update().
+
+    When rendering fails the job keeps its previous files.
+    """
+    job.update(status="running", stage="render_docx", queue_position=None, queue_eta=None)
+    word_file, drawio_file, error = job.word_file, job.drawio_file, None
+    try:
+        word_file, drawio_file = rerender_artifacts(job.output_dir, json_data,
+                                                    job.options.get("drawio_mode", DRAWIO_MODE))
+        if not drawio_file:
+            error = "The diagram could not be generated."
+        status = artifact_status(word_file, drawio_file)
+    except Exception as e:
+        print(f"Updating the files of job {job.job_id} failed:", e)
+        error = str(e)
+        status = "failed"
+    job.update(status=status, stage=None, progress=1.0, word_file=word_file, drawio_file=drawio_file, error=error,
+               finished=time.time())
+
+
+_job_manager = None
+_job_manager_lock = threading.Lock()
+
+
+def get_job_manager():
+    """Return the process-wide JobManager; safe to call on every Streamlit rerun.
+
+    With JOB_SERVICE_URL set this is a client of the standalone job service
+    instead, with the same interface, and no video is processed in this process.
+    """
+    global _job_manager
+    with _job_manager_lock:
+        if _job_manager is None:
+            if JOB_SERVICE_URL:
+                from job_service import JobServiceClient
+                _job_manager = JobServiceClient(JOB_SERVICE_URL)
+                # The jobs run in the service's workers, so /metrics reports the service's totals
+                use_metrics_store(_job_manager)
+            else:
+                _job_manager = JobManager()
+        return _job_manager
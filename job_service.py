@@ -0,0 +1,673 @@
+"""Standalone job service: an HTTP API in front of a SQLite job queue and a pool of worker processes.
+
+Run it next to the Streamlit apps and point them at it with JOB_SERVICE_URL:
+
+    python job_service.py [--workers 2] [--port 8765]
+    JOB_SERVICE_URL=http://127.0.0.1:8765 streamlit run app.py
+
+Jobs are stored in JOB_SERVICE_DB, so queued jobs survive a restart and a
+job whose worker died is picked up again after JOB_LEASE_SECONDS, resuming
+from its checkpoint. Use --workers 0 for an API-only process, or
+--no-api to add worker processes on the same host against the same database.
+
+Only job metadata goes over HTTP. The apps, the API and the workers must
+share a filesystem: clients submit the absolute path of an uploaded video
+and read the generated files straight from the job directories under
+STORAGE_OUTPUT_DIR, so run them on one host or on a shared volume.
+"""
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import sqlite3
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from instrumentation import MetricsRegistry, use_metrics_store
+from job_manager import JOB_FIELDS, JOB_RETENTION, Job, execute_job, execute_rerender
+from scheduler import SCHEDULER_WEIGHTS, admission_error, estimate_cost, parse_weights, share_inflight_limits
+from step_schema import check_process, normalize_process
+from storage import StorageManager
+
+JOB_SERVICE_DB = os.getenv("JOB_SERVICE_DB", "job_service.sqlite3")
+JOB_SERVICE_HOST = os.getenv("JOB_SERVICE_HOST", "127.0.0.1")
+JOB_SERVICE_PORT = int(os.getenv("JOB_SERVICE_PORT", "8765"))
+JOB_SERVICE_WORKERS = int(os.getenv("JOB_SERVICE_WORKERS", "2"))
+# A running job whose worker has not reported for this long is queued again
+JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", "120"))
+# Jobs that keep taking their worker down are failed after this many starts
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+# How often idle workers look for new jobs, and the longest a client long-poll waits
+JOB_POLL_INTERVAL = float(os.getenv("JOB_SERVICE_POLL_INTERVAL", "1"))
+MAX_LONG_POLL = 30
+# process_video options a client may set; the service chooses output_dir and resume itself
+JOB_OPTIONS = ("use_cache", "video_hash", "drawio_mode", "preprocess")
+# Queue cost in worker seconds of re-rendering edited JSON, next to estimate_cost() of a video
+RERENDER_COST = 5.0
+
+_JSON_COLUMNS = ("options", "timings")
+_COLUMNS = ("job_id", "video_path", "name", "user", "cost", "status", "stage", "progress", "output_dir",
+            "options", "word_file", "drawio_file", "error", "timings", "submitted", "started", "finished",
+            "version", "tag", "start_tag", "heartbeat", "worker", "attempts", "kind", "payload")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    video_path TEXT NOT NULL,
+    name TEXT,
+    user TEXT,
+    cost REAL,
+    status TEXT NOT NULL,
+    stage TEXT,
+    progress REAL DEFAULT 0,
+    output_dir TEXT,
+    options TEXT,
+    word_file TEXT,
+    drawio_file TEXT,
+    error TEXT,
+    timings TEXT,
+    submitted REAL,
+    started REAL,
+    finished REAL,
+    version INTEGER DEFAULT 0,
+    tag REAL,
+    start_tag REAL,
+    heartbeat REAL,
+    worker TEXT,
+    attempts INTEGER DEFAULT 0,
+    kind TEXT DEFAULT 'process',
+    payload TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_queue ON jobs (status, tag, submitted);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value REAL);
+CREATE TABLE IF NOT EXISTS metrics (
+    metric TEXT NOT NULL,
+    labels TEXT NOT NULL,
+    value REAL NOT NULL,
+    PRIMARY KEY (metric, labels)
+);
+CREATE TABLE IF NOT EXISTS slots (
+    slot_id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    owner TEXT,
+    heartbeat REAL
+);
+"""
+
+# Columns added after the first release, created on databases that predate them
+_ADDED_COLUMNS = {"kind": "TEXT DEFAULT 'process'", "payload": "TEXT"}
+
+
+class JobStore:
+    """Persistent job queue shared by the API and the worker processes.
+
+    Queued jobs are ordered by the same weighted fair-queuing tags as the
+    in-process FairScheduler, kept in the database so the order survives
+    restarts. Every method opens its own connection, so a store can be used
+    from any thread or process.
+
+    A job's kind says what a worker does with it: "process" runs the
+    pipeline on the video, "rerender" renders the edited JSON in payload
+    into the job's existing files.
+
+    The store also keeps the metric totals of all workers and the in-flight
+    upload and generation slots, so the caps hold for the whole service.
+    """
+
+    def __init__(self, path=JOB_SERVICE_DB, workers=JOB_SERVICE_WORKERS, lease=JOB_LEASE_SECONDS,
+                 max_attempts=JOB_MAX_ATTEMPTS, weights=None):
+        self.path = path
+        self.workers = max(1, workers)
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self.weights = weights if weights is not None else parse_weights(SCHEDULER_WEIGHTS)
+        with self._connect() as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.executescript(SCHEMA)
+            existing = {row["name"] for row in db.execute("PRAGMA table_info(jobs)")}
+            for column, definition in _ADDED_COLUMNS.items():
+                if column not in existing:
+                    db.execute(f"ALTER TABLE jobs ADD COLUMN {column} {definition}")
+
+    def _connect(self):
+        db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        db.row_factory = sqlite3.Row
+        return _Transaction(db)
+
+    def _row(self, row):
+        if row is None:
+            return None
+        data = dict(row)
+        for column in _JSON_COLUMNS:
+            data[column] = json.loads(data[column]) if data[column] else ({} if column == "options" else [])
+        return data
+
+    def _queue_tags(self, db, user, cost):
+        """(start, finish) tags for a new job of user, as in FairScheduler.submit."""
+        virtual_time = db.execute("SELECT value FROM meta WHERE key = 'virtual_time'").fetchone()
+        user_finish = db.execute("SELECT MAX(tag) FROM jobs WHERE user = ? AND status IN ('queued', 'running')",
+                                 (user,)).fetchone()[0]
+        start = max(virtual_time[0] if virtual_time else 0.0, user_finish or 0.0)
+        return start, start + cost / self.weights.get(user, 1.0)
+
+    def _wait_estimate(self, db, tag=None):
+        now = time.time()
+        running = db.execute("SELECT cost, started FROM jobs WHERE status = 'running'").fetchall()
+        remaining = sum(max(0.0, (row["cost"] or 0) - (now - (row["started"] or now))) for row in running)
+        query = "SELECT COALESCE(SUM(cost), 0), COUNT(*) FROM jobs WHERE status = 'queued'"
+        args = ()
+        if tag is not None:
+            query += " AND tag < ?"
+            args = (tag,)
+        ahead, count = db.execute(query, args).fetchone()
+        if len(running) < self.workers and not count:
+            return 0.0
+        return (remaining + ahead) / self.workers
+
+    def _admit(self, db, user):
+        users = [row[0] for row in db.execute("SELECT user FROM jobs WHERE status = 'queued'")]
+        reason = admission_error(users, user, self._wait_estimate(db))
+        if reason is not None:
+            raise RuntimeError(reason)
+
+    def submit(self, video_path, name=None, user=None, options=None, output_dir=None, cost=None):
+        """Queue a job and return its ID; raises RuntimeError when it is not admitted."""
+        user = user or "anonymous"
+        cost = estimate_cost(video_path) if cost is None else cost
+        job_id = uuid.uuid4().hex[:12]
+        options = dict(options or {})
+        if "output_dir" not in options:
+            # Absolute, so clients running elsewhere on the host can read the artifacts
+            options["output_dir"] = os.path.abspath(output_dir or StorageManager().job_dir(job_id))
+        # A reclaimed or retried job continues from its checkpoint
+        options.setdefault("resume", True)
+        with self._connect() as db:
+            db.execute("BEGIN IMMEDIATE")
+            self._admit(db, user)
+            start, tag = self._queue_tags(db, user, cost)
+            db.execute(
+                "INSERT INTO jobs (job_id, video_path, name, user, cost, status, output_dir, options, submitted,"
+                " tag, start_tag) VALUES (?, ?, ?, ?, ?, 'queued', ?, ?, ?, ?, ?)",
+                (job_id, video_path, name or os.path.basename(video_path), user, cost, options["output_dir"],
+                 json.dumps(options), time.time(), tag, start))
+        return job_id
+
+    def retry(self, job_id):
+        """Queue a finished job again; raises RuntimeError when it is not admitted."""
+        with self._connect() as db:
+            db.execute("BEGIN IMMEDIATE")
+            job = db.execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+            if job is None or job["status"] in ("queued", "running"):
+                return False
+            self._admit(db, job["user"])
+            start, tag = self._queue_tags(db, job["user"], job["cost"] or 0.0)
+            db.execute("UPDATE jobs SET status = 'queued', kind = 'process', payload = NULL, stage = NULL,"
+                       " progress = 0, error = NULL, finished = NULL, attempts = 0, tag = ?, start_tag = ?,"
+                       " version = version + 1 WHERE job_id = ?", (tag, start, job_id))
+        return True
+
+    def rerender(self, job_id, json_data):
+        """Queue rendering edited process JSON into a finished job's files.
+
+        Returns None for an unknown job and False while the job is queued or
+        running. A rerender is cheap, so it is not subject to admission control.
+        """
+        json_data = normalize_process(json_data)
+        with self._connect() as db:
+            db.execute("BEGIN IMMEDIATE")
+            job = db.execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+            if job is None:
+                return None
+            if job["status"] in ("queued", "running"):
+                return False
+            start, tag = self._queue_tags(db, job["user"], RERENDER_COST)
+            db.execute("UPDATE jobs SET status = 'queued', kind = 'rerender', payload = ?, stage = NULL,"
+                       " progress = 0, error = NULL, finished = NULL, attempts = 0, tag = ?, start_tag = ?,"
+                       " version = version + 1 WHERE job_id = ?", (json.dumps(json_data), tag, start, job_id))
+        return True
+
+    def claim(self, worker):
+        """Take the next job in fair order for worker, after requeueing jobs of dead workers.
+
+        Besides JOB_FIELDS the returned dict holds the job's kind and payload.
+        """
+        now = time.time()
+        with self._connect() as db:
+            db.execute("BEGIN IMMEDIATE")
+            db.execute("UPDATE jobs SET status = 'failed', error = 'The job stopped its worker too often.',"
+                       " finished = ?, version = version + 1"
+                       " WHERE status = 'running' AND heartbeat < ? AND attempts >= ?",
+                       (now, now - self.lease, self.max_attempts))
+            db.execute("UPDATE jobs SET status = 'queued', stage = NULL, worker = NULL, version = version + 1"
+                       " WHERE status = 'running' AND heartbeat < ?", (now - self.lease,))
+            job = db.execute("SELECT * FROM jobs WHERE status = 'queued' ORDER BY tag, submitted LIMIT 1").fetchone()
+            if job is None:
+                return None
+            db.execute("INSERT INTO meta (key, value) VALUES ('virtual_time', ?) ON CONFLICT(key) DO UPDATE"
+                       " SET value = MAX(value, excluded.value)", (job["start_tag"] or 0.0,))
+            db.execute("UPDATE jobs SET status = 'running', worker = ?, started = ?, heartbeat = ?,"
+                       " attempts = attempts + 1, version = version + 1 WHERE job_id = ?",
+                       (worker, now, now, job["job_id"]))
+        return dict(self.get(job["job_id"]), kind=job["kind"] or "process", payload=job["payload"])
+
+    def update(self, job_id, **fields):
+        fields = {key: value for key, value in fields.items() if key in _COLUMNS and key != "job_id"}
+        for column in _JSON_COLUMNS:
+            if column in fields:
+                fields[column] = json.dumps(fields[column])
+        assignments = "".join(f"{key} = ?, " for key in fields)
+        with self._connect() as db:
+            db.execute(f"UPDATE jobs SET {assignments}heartbeat = ?, version = version + 1 WHERE job_id = ?",
+                       (*fields.values(), time.time(), job_id))
+
+    def heartbeat(self, job_id, worker=None):
+        """Keep job_id, and the in-flight slots held by worker, from expiring."""
+        now = time.time()
+        with self._connect() as db:
+            db.execute("UPDATE jobs SET heartbeat = ? WHERE job_id = ?", (now, job_id))
+            if worker is not None:
+                db.execute("UPDATE slots SET heartbeat = ? WHERE owner = ?", (now, worker))
+
+    def acquire_slot(self, kind, limit, owner, poll_interval=0.2):
+        """Wait until fewer than limit kind slots are held service-wide, take one and return its ID.
+
+        Slots whose owner has not sent a heartbeat within the lease are freed.
+        """
+        slot_id = uuid.uuid4().hex
+        while True:
+            now = time.time()
+            with self._connect() as db:
+                db.execute("BEGIN IMMEDIATE")
+                db.execute("DELETE FROM slots WHERE heartbeat < ?", (now - self.lease,))
+                held = db.execute("SELECT COUNT(*) FROM slots WHERE kind = ?", (kind,)).fetchone()[0]
+                if held < limit:
+                    db.execute("INSERT INTO slots (slot_id, kind, owner, heartbeat) VALUES (?, ?, ?, ?)",
+                               (slot_id, kind, owner, now))
+                    return slot_id
+            time.sleep(poll_interval)
+
+    def release_slot(self, slot_id):
+        with self._connect() as db:
+            db.execute("DELETE FROM slots WHERE slot_id = ?", (slot_id,))
+
+    def add_metrics(self, samples):
+        """Add [metric, labels, value] samples, as from MetricsRegistry.samples(), to the totals."""
+        with self._connect() as db:
+            db.execute("BEGIN IMMEDIATE")
+            db.executemany("INSERT INTO metrics (metric, labels, value) VALUES (?, ?, ?) ON CONFLICT(metric, labels)"
+                           " DO UPDATE SET value = value + excluded.value",
+                           [(metric, json.dumps(labels, sort_keys=True), value) for metric, labels, value in samples])
+
+    def metrics(self):
+        """The metric totals of all workers as [metric, labels, value] samples."""
+        with self._connect() as db:
+            rows = db.execute("SELECT metric, labels, value FROM metrics ORDER BY metric, labels").fetchall()
+        return [[row["metric"], json.loads(row["labels"]), row["value"]] for row in rows]
+
+    def get(self, job_id):
+        """The job as a dict of JOB_FIELDS (with its queue position while queued), or None."""
+        with self._connect() as db:
+            data = self._row(db.execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone())
+            if data is None:
+                return None
+            data["queue_position"] = data["queue_eta"] = None
+            if data["status"] == "queued":
+                data["queue_position"] = 1 + db.execute(
+                    "SELECT COUNT(*) FROM jobs WHERE status = 'queued' AND (tag < ? OR (tag = ? AND submitted < ?))",
+                    (data["tag"], data["tag"], data["submitted"])).fetchone()[0]
+                data["queue_eta"] = self._wait_estimate(db, data["tag"])
+        return {field: data.get(field) for field in JOB_FIELDS}
+
+    def counts(self):
+        with self._connect() as db:
+            return dict(db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+
+    def active_paths(self):
+        with self._connect() as db:
+            rows = db.execute("SELECT video_path, output_dir FROM jobs WHERE status IN ('queued', 'running')")
+            return [path for row in rows for path in row if path]
+
+    def prune(self, retention=JOB_RETENTION):
+        with self._connect() as db:
+            db.execute("DELETE FROM jobs WHERE finished IS NOT NULL AND finished < ? AND status NOT IN"
+                       " ('queued', 'running')", (time.time() - retention,))
+
+
+class _Transaction:
+    """Connection context that commits on success, rolls back on errors and always closes."""
+
+    def __init__(self, db):
+        self.db = db
+
+    def __enter__(self):
+        return self.db
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if self.db.in_transaction:
+                self.db.execute("ROLLBACK" if exc_type else "COMMIT")
+        finally:
+            self.db.close()
+
+
+class StoredJob(Job):
+    """Job whose updates are written through to the JobStore as the pipeline runs."""
+
+    def __init__(self, store, data):
+        super().__init__(data["video_path"], data.get("name"))
+        for field in JOB_FIELDS:
+            setattr(self, field, data.get(field, getattr(self, field)))
+        self.store = store
+
+    def update(self, **fields):
+        super().update(**fields)
+        self.store.update(self.job_id, **fields)
+
+
+def _heartbeat(store, job_id, worker, stop):
+    while not stop.wait(store.lease / 4):
+        store.heartbeat(job_id, worker)
+
+
+def worker_main(db_path, worker_name, poll_interval=JOB_POLL_INTERVAL):
+    """Worker process: claim jobs from the store and run the pipeline until killed."""
+    # Imported here so the API process never loads the pipeline
+    from doc_processing import process_video
+
+    store = JobStore(db_path)
+    storage = StorageManager()
+    # Report metrics and respect the upload and generation caps service-wide
+    use_metrics_store(store)
+    share_inflight_limits(store, worker_name)
+    print(f"Worker {worker_name} started")
+    while True:
+        data = store.claim(worker_name)
+        if data is None:
+            time.sleep(poll_interval)
+            continue
+        job = StoredJob(store, data)
+        stop = threading.Event()
+        threading.Thread(target=_heartbeat, args=(store, job.job_id, worker_name, stop), daemon=True).start()
+        try:
+            if data["kind"] == "rerender":
+                execute_rerender(job, json.loads(data["payload"]))
+                store.update(job.job_id, payload=None)
+            else:
+                execute_job(job, process_video, dict(job.options))
+        finally:
+            stop.set()
+        try:
+            storage.evict(protected=store.active_paths() + [job.output_dir])
+        except OSError as e:
+            print("Error evicting stored files:", e)
+
+
+def start_workers(db_path, count):
+    # Spawned rather than forked, so workers do not inherit the API server's threads
+    context = multiprocessing.get_context("spawn")
+    workers = []
+    for index in range(count):
+        process = context.Process(target=worker_main, args=(db_path, f"{os.getpid()}-{index}"),
+                                  name=f"job-worker-{index}", daemon=True)
+        process.start()
+        workers.append(process)
+    return workers
+
+
+class JobServiceHandler(BaseHTTPRequestHandler):
+    """JSON API over the JobStore.
+
+    POST /jobs {"video_path", "name", "user", "options"}  -> {"job_id"}, 429 when not admitted
+    GET  /jobs/<id>[?version=N&timeout=S]                 -> job, waiting up to S s for a newer version
+    POST /jobs/<id>/retry                                 -> {"retried"}, 429 when not admitted
+    GET  /jobs/<id>/analysis                              -> {"analysis"}
+    POST /jobs/<id>/rerender {"analysis"}                 -> job queued for rendering, 400 for invalid JSON
+    GET  /health                                          -> job counts by status
+    GET  /metrics                                         -> metric totals of all workers, Prometheus text
+    GET  /metrics/values                                  -> {"metrics": [[metric, labels, value], ...]}
+    POST /metrics/values {"metrics"}                      -> {"added"}, adds the samples to the totals
+    """
+
+    store = None
+
+    def log_message(self, format, *args):
+        # Every open page long-polls its job, which would flood stderr
+        pass
+
+    def _send_text(self, status, text):
+        body = text.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send(self, status, data):
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def _route(self):
+        url = urllib.parse.urlsplit(self.path)
+        return [part for part in url.path.split("/") if part], urllib.parse.parse_qs(url.query)
+
+    def do_GET(self):
+        parts, query = self._route()
+        if parts == ["health"]:
+            return self._send(200, {"status": "ok", "jobs": self.store.counts()})
+        if parts == ["metrics"]:
+            totals = MetricsRegistry()
+            totals.merge(self.store.metrics())
+            return self._send_text(200, totals.render())
+        if parts == ["metrics", "values"]:
+            return self._send(200, {"metrics": self.store.metrics()})
+        if len(parts) == 2 and parts[0] == "jobs":
+            return self._get_job(parts[1], query)
+        if len(parts) == 3 and parts[0] == "jobs" and parts[2] == "analysis":
+            job = self.store.get(parts[1])
+            if job is None:
+                return self._send(404, {"error": "Unknown job."})
+            from checkpoints import Checkpoint
+            return self._send(200, {"analysis": Checkpoint(job["output_dir"]).load_json("parse")})
+        self._send(404, {"error": "Not found."})
+
+    def _get_job(self, job_id, query):
+        job = self.store.get(job_id)
+        if job is None:
+            return self._send(404, {"error": "Unknown job."})
+        if "version" in query:
+            version = int(query["version"][0])
+            deadline = time.monotonic() + min(float(query.get("timeout", ["0"])[0]), MAX_LONG_POLL)
+            while job is not None and job["version"] == version and time.monotonic() < deadline:
+                time.sleep(0.2)
+                job = self.store.get(job_id)
+        self._send(200, job)
+
+    def do_POST(self):
+        parts, _ = self._route()
+        try:
+            body = self._body()
+        except json.JSONDecodeError as e:
+            return self._send(400, {"error": f"Invalid JSON: {e}"})
+        if parts == ["jobs"]:
+            return self._submit(body)
+        if parts == ["metrics", "values"]:
+            samples = body.get("metrics") or []
+            try:
+                self.store.add_metrics(samples)
+            except (TypeError, ValueError, sqlite3.Error) as e:
+                return self._send(400, {"error": f"Invalid metrics: {e}"})
+            return self._send(200, {"added": len(samples)})
+        if len(parts) == 3 and parts[0] == "jobs" and parts[2] == "retry":
+            try:
+                return self._send(200, {"retried": self.store.retry(parts[1])})
+            except RuntimeError as e:
+                return self._send(429, {"error": str(e)})
+        if len(parts) == 3 and parts[0] == "jobs" and parts[2] == "rerender":
+            return self._rerender(parts[1], body.get("analysis"))
+        self._send(404, {"error": "Not found."})
+
+    def _submit(self, body):
+        video_path = body.get("video_path")
+        if not video_path or not os.path.isabs(video_path) or not os.path.isfile(video_path):
+            return self._send(400, {"error": f"Video not found on the shared filesystem: {video_path}"})
+        options = body.get("options") or {}
+        if not isinstance(options, dict):
+            return self._send(400, {"error": "options must be an object."})
+        unknown = sorted(set(options) - set(JOB_OPTIONS))
+        if unknown:
+            return self._send(400, {"error": f"Unknown options: {', '.join(unknown)}"})
+        try:
+            job_id = self.store.submit(video_path, body.get("name"), body.get("user"), options)
+        except RuntimeError as e:
+            return self._send(429, {"error": str(e)})
+        self.store.prune()
+        self._send(201, {"job_id": job_id})
+
+    def _rerender(self, job_id, json_data):
+        # Rendering is left to a worker; the API only checks the JSON
+        try:
+            check_process(json_data)
+        except ValueError as e:
+            return self._send(400, {"error": str(e)})
+        queued = self.store.rerender(job_id, json_data)
+        if queued is None:
+            return self._send(404, {"error": "Unknown job."})
+        if not queued:
+            return self._send(409, {"error": "The job has not finished yet."})
+        self._send(202, self.store.get(job_id))
+
+
+class RemoteJob(Job):
+    """Snapshot of a job held by the job service; wait() long-polls the service for changes."""
+
+    def __init__(self, client, data):
+        super().__init__(data["video_path"], data.get("name"))
+        self.client = client
+        self._load(data)
+
+    def _load(self, data):
+        for field in JOB_FIELDS:
+            if field in data:
+                setattr(self, field, data[field])
+
+    def wait(self, version, timeout=None):
+        try:
+            data = self.client._request("GET", f"/jobs/{self.job_id}?version={version}&timeout={timeout or 0}",
+                                        timeout=(timeout or 0) + 10)
+        except RuntimeError as e:
+            # The page's next get() reports the outage; until then behave like a wait without news
+            print("Error waiting for job:", e)
+            time.sleep(timeout or 0)
+            return self.version
+        if data is not None:
+            self._load(data)
+        return self.version
+
+
+class JobServiceClient:
+    """JobManager lookalike that forwards everything to the job service over HTTP."""
+
+    def __init__(self, url, timeout=10):
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+
+    def _request(self, method, path, data=None, timeout=None):
+        """Call the service; raises RuntimeError when it is unreachable or turns the request away."""
+        body = json.dumps(data).encode("utf-8") if data is not None else None
+        request = urllib.request.Request(self.url + path, data=body, method=method,
+                                         headers={"Content-Type": "application/json"})
+        try:
+            with urllib.request.urlopen(request, timeout=timeout or self.timeout) as response:
+                return json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            try:
+                message = json.loads(e.read() or b"{}").get("error", str(e))
+            except ValueError:
+                message = str(e)
+            if e.code == 404:
+                return None
+            if e.code == 429:
+                raise RuntimeError(message)
+            if e.code >= 500:
+                raise RuntimeError(f"Job service unavailable: {message}") from e
+            raise ValueError(message)
+        except (OSError, http.client.HTTPException) as e:
+            # Refused or dropped connections and timeouts; URLError is an OSError
+            raise RuntimeError(f"Job service unavailable: {getattr(e, 'reason', e)}") from e
+
+    def submit(self, video_path, name=None, user=None, **options):
+        """Queue video_path on the service; raises RuntimeError when it is not admitted."""
+        data = self._request("POST", "/jobs", {"video_path": os.path.abspath(video_path), "name": name,
+                                               "user": user, "options": options})
+        return data["job_id"]
+
+    def get(self, job_id):
+        data = self._request("GET", f"/jobs/{job_id}")
+        return RemoteJob(self, data) if data is not None else None
+
+    def retry(self, job_id):
+        data = self._request("POST", f"/jobs/{job_id}/retry", {})
+        return bool(data and data["retried"])
+
+    def analysis(self, job_id):
+        data = self._request("GET", f"/jobs/{job_id}/analysis")
+        return data["analysis"] if data is not None else None
+
+    def metrics(self):
+        """The service's metric totals, for use_metrics_store()."""
+        return self._request("GET", "/metrics/values")["metrics"]
+
+    def add_metrics(self, samples):
+        self._request("POST", "/metrics/values", {"metrics": samples})
+
+    def rerender(self, job_id, json_data):
+        """Queue rendering json_data into the job's files on a worker.
+
+        Raises ValueError when json_data does not match the process schema or
+        the job has not finished yet.
+        """
+        return self._request("POST", f"/jobs/{job_id}/rerender", {"analysis": json_data}) is not None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db", default=JOB_SERVICE_DB)
+    parser.add_argument("--host", default=JOB_SERVICE_HOST)
+    parser.add_argument("--port", type=int, default=JOB_SERVICE_PORT)
+    parser.add_argument("--workers", type=int, default=JOB_SERVICE_WORKERS)
+    parser.add_argument("--no-api", action="store_true", help="Only run worker processes")
+    args = parser.parse_args()
+
+    store = JobStore(args.db, workers=args.workers)
+    workers = start_workers(args.db, args.workers)
+    if args.no_api:
+        for worker in workers:
+            worker.join()
+        return
+    JobServiceHandler.store = store
+    server = ThreadingHTTPServer((args.host, args.port), JobServiceHandler)
+    print(f"Job service listening on http://{args.host}:{args.port} with {args.workers} workers")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+import datetime
+import json
+import os
+import random
+import threading
+import time
+from types import SimpleNamespace
+
+from drawio_layout import build_drawio_xml
+
+_genai = None
+_genai_lock = threading.Lock()
+
+
+def gemini():
+    """Import google.generativeai and configure the API key on first use.
+
+    The import takes around a second, so it is kept off the app's startup path.
+    """
+    global _genai
+    with _genai_lock:
+        if _genai is None:
+            import google.generativeai as genai
+            genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+            _genai = genai
+        return _genai
+
+
+class GeminiBackend:
+    """The real Gemini API, exposing the subset of google.generativeai the pipeline uses."""
+
+    def upload_file(self, path, mime_type=None):
+        return gemini().upload_file(path, mime_type=mime_type)
+
+    def get_file(self, name):
+        return gemini().get_file(name)
+
+    def GenerativeModel(self, model_name, generation_config=None, system_instruction=None):
+        return gemini().GenerativeModel(model_name=model_name, generation_config=generation_config,
+                                        system_instruction=system_instruction)
+
+
+class FakeBackend:
+    """Offline stand-in for GeminiBackend with simulated network and model timings.
+
+    Uploads take size / upload_bandwidth seconds, files stay PROCESSING for
+    processing_delay seconds, and generations wait first_token_latency before
+    streaming the canned response at tokens_per_second. All delays are
+    multiplied by time_scale so benchmarks can run faster than real time.
+    """
+
+    def __init__(self, process_json=None, upload_bandwidth=10 * 1024 * 1024, processing_delay=2.0,
+                 first_token_latency=3.0, tokens_per_second=200.0, time_scale=1.0):
+        self.process_json = process_json
+        self.upload_bandwidth = upload_bandwidth
+        self.processing_delay = processing_delay
+        self.first_token_latency = first_token_latency
+        self.tokens_per_second = tokens_per_second
+        self.time_scale = time_scale
+        self.files = {}
+        self.calls = []
+        self._lock = threading.Lock()
+        self._counter = 0
+
+    def sleep(self, seconds):
+        if seconds > 0 and self.time_scale > 0:
+            time.sleep(seconds * self.time_scale)
+
+    def _record(self, call):
+        with self._lock:
+            self.calls.append(call)
+
+    def upload_file(self, path, mime_type=None):
+        self._record("upload_file")
+        size = os.path.getsize(path)
+        self.sleep(size / self.upload_bandwidth)
+        with self._lock:
+            self._counter += 1
+            name = f"files/fake-{self._counter}"
+            self.files[name] = {"created": time.time(), "mime_type": mime_type,
+                                "display_name": os.path.basename(path), "size": size}
+        return self.get_file(name)
+
+    def get_file(self, name):
+        self._record("get_file")
+        record = self.files.get(name)
+        if record is None:
+            raise KeyError(f"File {name} not found.")
+        ready_at = record["created"] + self.processing_delay * self.time_scale
+        state = "ACTIVE" if time.time() >= ready_at else "PROCESSING"
+        return SimpleNamespace(
+            name=name,
+            uri=f"https://fake.local/{name}",
+            display_name=record["display_name"],
+            mime_type=record["mime_type"],
+            state=SimpleNamespace(name=state),
+            expiration_time=datetime.datetime.now() + datetime.timedelta(hours=48),
+        )
+
+    def GenerativeModel(self, model_name, generation_config=None, system_instruction=None):
+        return FakeModel(self, model_name, generation_config, system_instruction)
+
+    def response_for(self, contents, generation_config):
+        config = generation_config or {}
+        if config.get("response_mime_type") == "application/json":
+            return json.dumps(self.process_json, indent=2)
+        try:
+            list_of_steps = json.loads(contents)
+        except (TypeError, ValueError):
+            return "This is a canned answer from the fake backend."
+        xml = build_drawio_xml({"process_name": "Fake Process", "list_of_steps": list_of_steps})
+        return f"```xml\n{xml}\n```"
+
+
+def _count_tokens(contents):
+    if isinstance(contents, str):
+        return len(contents) // 4
+    if isinstance(contents, (list, tuple)):
+        return sum(_count_tokens(part) for part in contents)
+    # Uploaded files are billed per second of video; use a fixed estimate
+    return 258 * 60
+
+
+class FakeAPIError(Exception):
+    """Error with an HTTP status code, like the google.api_core exceptions."""
+
+    def __init__(self, code, message=None):
+        super().__init__(message or f"{code} injected by FlakyBackend")
+        self.code = code
+
+
+class FlakyBackend:
+    """Wrap a (fake) backend to inject API errors and slow responses at the given rates."""
+
+    def __init__(self, backend, error_rate=0.1, error_codes=(429, 503), slow_rate=0.05, slow_delay=30.0,
+                 seed=None):
+        self.backend = backend
+        self.error_rate = error_rate
+        self.error_codes = tuple(error_codes)
+        self.slow_rate = slow_rate
+        self.slow_delay = slow_delay
+        self.injected = {"errors": 0, "slow": 0}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def disturb(self):
+        with self._lock:
+            roll = self._random.random()
+            code = self._random.choice(self.error_codes)
+        if roll < self.error_rate:
+            self.injected["errors"] += 1
+            raise FakeAPIError(code)
+        if roll < self.error_rate + self.slow_rate:
+            self.injected["slow"] += 1
+            self.backend.sleep(self.slow_delay)
+
+    def upload_file(self, path, mime_type=None):
+        self.disturb()
+        return self.backend.upload_file(path, mime_type=mime_type)
+
+    def get_file(self, name):
+        self.disturb()
+        return self.backend.get_file(name)
+
+    def GenerativeModel(self, model_name, generation_config=None, system_instruction=None):
+        model = self.backend.GenerativeModel(model_name, generation_config, system_instruction)
+        return FlakyModel(self, model)
+
+
+class FlakyModel:
+    def __init__(self, flaky, model):
+        self.flaky = flaky
+        self.model = model
+
+    def generate_content(self, contents, stream=False):
+        self.flaky.disturb()
+        return self.model.generate_content(contents, stream=stream)
+
+    def start_chat(self, history=None):
+        return FakeChat(self)
+
+
+class FakeModel:
+    def __init__(self, backend, model_name, generation_config, system_instruction):
+        self.backend = backend
+        self.model_name = model_name
+        self.generation_config = generation_config
+        self.system_instruction = system_instruction
+
+    def generate_content(self, contents, stream=False):
+        self.backend._record(f"generate_content:{self.model_name}")
+        text = self.backend.response_for(contents, self.generation_config)
+        prompt_tokens = _count_tokens(contents) + _count_tokens(self.system_instruction or "")
+        response = FakeResponse(self.backend, text, prompt_tokens)
+        if not stream:
+            response.wait()
+        return response
+
+    def start_chat(self, history=None):
+        return FakeChat(self)
+
+
+class FakeChat:
+    def __init__(self, model):
+        self.model = model
+
+    def send_message(self, content):
+        return self.model.generate_content(content)
+
+
+class FakeResponse:
+    """Response with .text and usage_metadata; iterating streams it in timed chunks."""
+
+    CHUNK_SIZE = 400
+
+    def __init__(self, backend, text, prompt_tokens):
+        self.backend = backend
+        self.text = text
+        self.usage_metadata = SimpleNamespace(prompt_token_count=prompt_tokens,
+                                              candidates_token_count=len(text) // 4,
+                                              cached_content_token_count=0)
+
+    def _chunk_delay(self, chunk):
+        return (len(chunk) / 4) / self.backend.tokens_per_second
+
+    def wait(self):
+        self.backend.sleep(self.backend.first_token_latency + self._chunk_delay(self.text))
+
+    def __iter__(self):
+        self.backend.sleep(self.backend.first_token_latency)
+        for start in range(0, len(self.text), self.CHUNK_SIZE):
+            chunk = self.text[start:start + self.CHUNK_SIZE]
+            self.backend.sleep(self._chunk_delay(chunk))
+            yield SimpleNamespace(text=chunk)
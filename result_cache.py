@@ -0,0 +1,167 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+
+# Defaults can be overridden from the .env file
+RESULT_CACHE_DIR = os.getenv("RESULT_CACHE_DIR", ".result_cache")
+RESULT_CACHE_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_BYTES", str(500 * 1024 * 1024)))
+RESULT_CACHE_MAX_AGE = int(os.getenv("RESULT_CACHE_MAX_AGE", str(30 * 24 * 3600)))
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def hash_file(path):
+    """Return the SHA-256 hex digest of a file, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def hash_text(*parts):
+    """Return the SHA-256 hex digest of the given strings."""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def _write_json(path, data):
+    """Atomically replace path with data, via a uniquely named temp file beside it."""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp_", suffix=".json")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class ResultCache:
+    """On-disk cache of process_video results keyed by video content and prompts.
+
+    Each entry is a directory holding the parsed step JSON, the generated
+    .docx/.drawio files and a small meta.json used for eviction. The files
+    are only kept as a pair; an entry without them still saves the analysis.
+    """
+
+    def __init__(self, cache_dir=RESULT_CACHE_DIR, max_bytes=RESULT_CACHE_MAX_BYTES,
+                 max_age=RESULT_CACHE_MAX_AGE):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def key_for(self, video_path, analysis_prompt, drawio_prompt, model_names, video_hash=None):
+        if video_hash is None:
+            video_hash = hash_file(video_path)
+        prompt_hash = hash_text(analysis_prompt, drawio_prompt, *model_names)
+        return hash_text(video_hash, prompt_hash)
+
+    def _entry_dir(self, key):
+        return os.path.join(self.cache_dir, key)
+
+    def _read_meta(self, key):
+        meta_path = os.path.join(self._entry_dir(key), "meta.json")
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+
+    def _write_meta(self, key, meta):
+        _write_json(os.path.join(self._entry_dir(key), "meta.json"), meta)
+
+    def get(self, key):
+        """Return the cached entry for key, or None on a miss or expired entry.
+
+        word_file and drawio_file are both None when the entry only holds the
+        analysis, e.g. because one of the files could not be generated.
+        """
+        meta = self._read_meta(key)
+        if meta is None:
+            return None
+        if time.time() - meta["created"] > self.max_age:
+            self.remove(key)
+            return None
+        entry_dir = self._entry_dir(key)
+        try:
+            with open(os.path.join(entry_dir, "steps.json"), "r", encoding="utf-8") as f:
+                json_data = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            self.remove(key)
+            return None
+        meta["last_access"] = time.time()
+        self._write_meta(key, meta)
+        word_file = os.path.join(entry_dir, meta["word_file"]) if meta.get("word_file") else None
+        drawio_file = os.path.join(entry_dir, meta["drawio_file"]) if meta.get("drawio_file") else None
+        if not (word_file and drawio_file and os.path.exists(word_file) and os.path.exists(drawio_file)):
+            word_file = drawio_file = None
+        return {
+            "key": key,
+            "json_data": json_data,
+            "word_file": word_file,
+            "drawio_file": drawio_file,
+        }
+
+    def put(self, key, json_data, word_file_path=None, drawio_file_path=None):
+        """Store the parsed JSON under key, with the artifacts when both of them were generated."""
+        entry_dir = self._entry_dir(key)
+        os.makedirs(entry_dir, exist_ok=True)
+        _write_json(os.path.join(entry_dir, "steps.json"), json_data)
+        meta = {"created": time.time(), "last_access": time.time(),
+                "word_file": None, "drawio_file": None}
+        artifacts = (("word_file", word_file_path), ("drawio_file", drawio_file_path))
+        if not all(path and os.path.exists(path) for _, path in artifacts):
+            # A partial result would be served as a hit and never completed
+            artifacts = ()
+        for field, path in artifacts:
+            name = os.path.basename(path)
+            shutil.copyfile(path, os.path.join(entry_dir, name))
+            meta[field] = name
+        meta["size"] = self._dir_size(entry_dir)
+        self._write_meta(key, meta)
+
+    def restore(self, entry, output_dir="."):
+        """Copy cached artifacts to output_dir and return (word_path, drawio_path)."""
+        paths = []
+        for field in ("word_file", "drawio_file"):
+            cached_path = entry[field]
+            if cached_path is None or not os.path.exists(cached_path):
+                paths.append(None)
+                continue
+            target = os.path.join(output_dir, os.path.basename(cached_path))
+            shutil.copyfile(cached_path, target)
+            paths.append(target)
+        return paths[0], paths[1]
+
+    def remove(self, key):
+        shutil.rmtree(self._entry_dir(key), ignore_errors=True)
+
+    def evict(self):
+        """Drop expired entries, then least recently used ones until under max_bytes."""
+        now = time.time()
+        entries = []
+        for key in os.listdir(self.cache_dir):
+            meta = self._read_meta(key)
+            if meta is None or now - meta["created"] > self.max_age:
+                self.remove(key)
+                continue
+            entries.append((meta["last_access"], meta.get("size", 0), key))
+        total = sum(size for _, size, _ in entries)
+        for _, size, key in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            self.remove(key)
+            total -= size
+
+    @staticmethod
+    def _dir_size(path):
+        return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
@@ -0,0 +1,186 @@
+import itertools
+import os
+import subprocess
+import threading
+import time
+from contextlib import contextmanager
+
+from segmented_analysis import probe_duration
+from video_preprocessing import UPLOAD_BANDWIDTH
+
+SCHEDULER_MAX_QUEUED = int(os.getenv("SCHEDULER_MAX_QUEUED", "20"))
+SCHEDULER_MAX_QUEUED_PER_USER = int(os.getenv("SCHEDULER_MAX_QUEUED_PER_USER", "3"))
+# Reject new jobs that would not start within this many seconds
+SCHEDULER_MAX_WAIT = int(os.getenv("SCHEDULER_MAX_WAIT", str(3600)))
+# Relative shares, e.g. "alice@example.com=2,batch=0.5"; everyone else gets 1
+SCHEDULER_WEIGHTS = os.getenv("SCHEDULER_WEIGHTS", "")
+
+# Caps on requests in flight, shared by all jobs of a process (or of a job service)
+MAX_INFLIGHT_UPLOADS = int(os.getenv("MAX_INFLIGHT_UPLOADS", "2"))
+MAX_INFLIGHT_GENERATIONS = int(os.getenv("MAX_INFLIGHT_GENERATIONS", "4"))
+INFLIGHT_LIMITS = {"upload": MAX_INFLIGHT_UPLOADS, "generate": MAX_INFLIGHT_GENERATIONS}
+
+# Cost model in seconds of pipeline time
+JOB_OVERHEAD_SECONDS = 30
+ANALYSIS_SECONDS_PER_VIDEO_SECOND = float(os.getenv("ANALYSIS_SECONDS_PER_VIDEO_SECOND", "0.1"))
+# Used to guess the duration when ffprobe is not available (about 2 Mbit/s)
+ASSUMED_BYTES_PER_SECOND = 250000
+
+_inflight = {kind: threading.BoundedSemaphore(limit) for kind, limit in INFLIGHT_LIMITS.items()}
+# (store, owner) once the caps are shared with other processes
+_shared_inflight = None
+
+
+def share_inflight_limits(store, owner):
+    """Enforce INFLIGHT_LIMITS across every process using store, e.g. the job service workers.
+
+    store needs acquire_slot(kind, limit, owner) and release_slot(slot_id),
+    like JobStore; owner names this process when it refreshes its slots.
+    """
+    global _shared_inflight
+    _shared_inflight = (store, owner) if store is not None else None
+
+
+@contextmanager
+def inflight(kind):
+    """Hold one of the "upload" or "generate" slots for the duration of the block."""
+    slots = _inflight[kind]
+    slots.acquire()
+    try:
+        shared = _shared_inflight
+        if shared is None:
+            yield
+            return
+        store, owner = shared
+        slot_id = store.acquire_slot(kind, INFLIGHT_LIMITS[kind], owner)
+        try:
+            yield
+        finally:
+            store.release_slot(slot_id)
+    finally:
+        slots.release()
+
+
+def parse_weights(text):
+    weights = {}
+    for item in text.split(","):
+        if "=" in item:
+            user, weight = item.rsplit("=", 1)
+            weights[user.strip()] = float(weight)
+    return weights
+
+
+def estimate_cost(video_path, duration=None):
+    """Estimate the seconds a video will keep a worker busy, from its size and duration."""
+    size = os.path.getsize(video_path)
+    if duration is None:
+        try:
+            duration = probe_duration(video_path)
+        except (OSError, subprocess.CalledProcessError, ValueError):
+            duration = size / ASSUMED_BYTES_PER_SECOND
+    return JOB_OVERHEAD_SECONDS + size / UPLOAD_BANDWIDTH + duration * ANALYSIS_SECONDS_PER_VIDEO_SECOND
+
+
+def admission_error(queued_users, user, wait, max_queued=SCHEDULER_MAX_QUEUED,
+                    max_queued_per_user=SCHEDULER_MAX_QUEUED_PER_USER, max_wait=SCHEDULER_MAX_WAIT):
+    """Why a new job from user should be turned away, or None to admit it.
+
+    queued_users lists the user of every job already waiting and wait is the
+    estimated seconds before the new job would start.
+    """
+    if len(queued_users) >= max_queued:
+        return f"The processing queue is full ({len(queued_users)} videos waiting). Please try again later."
+    waiting = sum(1 for queued_user in queued_users if queued_user == user)
+    if waiting >= max_queued_per_user:
+        return f"You already have {waiting} videos waiting. Please wait until one of them has started."
+    if wait > max_wait:
+        return f"The queue already holds about {wait / 60:.0f} minutes of work. Please try again later."
+    return None
+
+
+class FairScheduler:
+    """Call run(task_id, payload) on max_running worker threads, sharing them fairly between users.
+
+    Tasks are ordered by weighted fair queuing: each one gets a virtual finish
+    tag of its user's previous tag (or the current virtual time) plus
+    cost / weight, and the smallest tag runs next. A user with a long video
+    therefore waits behind other users' short ones instead of starving them.
+    Submissions that would overfill the queue are rejected straight away
+    with a RuntimeError explaining why.
+    """
+
+    def __init__(self, run=None, max_running=2, max_queued=SCHEDULER_MAX_QUEUED,
+                 max_queued_per_user=SCHEDULER_MAX_QUEUED_PER_USER, max_wait=SCHEDULER_MAX_WAIT,
+                 weights=None, on_change=None):
+        self.run = run
+        self.max_running = max_running
+        self.max_queued = max_queued
+        self.max_queued_per_user = max_queued_per_user
+        self.max_wait = max_wait
+        self.weights = weights if weights is not None else parse_weights(SCHEDULER_WEIGHTS)
+        self.on_change = on_change
+        self.queued = {}
+        self.running = {}
+        self.virtual_time = 0.0
+        self._user_finish = {}
+        self._counter = itertools.count()
+        self._cond = threading.Condition()
+        for index in range(max_running):
+            threading.Thread(target=self._worker, name=f"scheduler-{index}", daemon=True).start()
+
+    def _wait_estimate(self, ahead):
+        now = time.time()
+        remaining = sum(max(0.0, entry["cost"] - (now - entry["started"])) for entry in self.running.values())
+        if len(self.running) < self.max_running and not ahead:
+            return 0.0
+        return (remaining + sum(entry["cost"] for entry in ahead)) / self.max_running
+
+    def submit(self, task_id, user, cost, payload):
+        """Queue a task; raises RuntimeError when it is not admitted."""
+        with self._cond:
+            reason = admission_error([entry["user"] for entry in self.queued.values()], user,
+                                     self._wait_estimate(list(self.queued.values())), self.max_queued,
+                                     self.max_queued_per_user, self.max_wait)
+            if reason is not None:
+                raise RuntimeError(reason)
+            start = max(self.virtual_time, self._user_finish.get(user, 0.0))
+            tag = start + cost / self.weights.get(user, 1.0)
+            self._user_finish[user] = tag
+            self.queued[task_id] = {"user": user, "cost": cost, "start": start, "tag": tag,
+                                    "seq": next(self._counter), "payload": payload}
+            self._cond.notify()
+        self._changed()
+
+    def _order(self):
+        return sorted(self.queued.items(), key=lambda item: (item[1]["tag"], item[1]["seq"]))
+
+    def positions(self):
+        """Map every queued task to (1-based position, estimated seconds until it starts)."""
+        with self._cond:
+            order = self._order()
+            return {task_id: (index + 1, self._wait_estimate([entry for _, entry in order[:index]]))
+                    for index, (task_id, _) in enumerate(order)}
+
+    def _changed(self):
+        if self.on_change is not None:
+            self.on_change(self.positions())
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                while not self.queued:
+                    self._cond.wait()
+                task_id, entry = self._order()[0]
+                del self.queued[task_id]
+                self.virtual_time = max(self.virtual_time, entry["start"])
+                entry["started"] = time.time()
+                self.running[task_id] = entry
+            self._changed()
+            try:
+                self.run(task_id, entry["payload"])
+            except Exception as e:
+                print(f"Task {task_id} failed:", e)
+            finally:
+                with self._cond:
+                    del self.running[task_id]
+                self._changed()
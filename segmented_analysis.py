@@ -0,0 +1,258 @@
+import difflib
+import json
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from instrumentation import current_span, run_in_context
+
+# Recordings longer than this are analysed in overlapping segments
+LONG_VIDEO_THRESHOLD = int(os.getenv("LONG_VIDEO_THRESHOLD", str(20 * 60)))
+SEGMENT_LENGTH = int(os.getenv("SEGMENT_LENGTH", str(10 * 60)))
+SEGMENT_OVERLAP = int(os.getenv("SEGMENT_OVERLAP", "30"))
+SEGMENT_WORKERS = int(os.getenv("SEGMENT_WORKERS", "4"))
+SEGMENT_RETRIES = 1
+
+# Steps from neighbouring segments closer than this (seconds) and this similar are duplicates
+DUPLICATE_TIME_TOLERANCE = 20
+DUPLICATE_SIMILARITY = 0.8
+
+
+def probe_duration(video_path):
+    """Return the duration of a video in seconds using ffprobe."""
+    result = subprocess.run(
+        ["ffprobe", "-v", "error", "-show_entries", "format=duration",
+         "-of", "default=noprint_wrappers=1:nokey=1", video_path],
+        capture_output=True, text=True, check=True,
+    )
+    return float(result.stdout.strip())
+
+
+def plan_segments(duration, segment_length=SEGMENT_LENGTH, overlap=SEGMENT_OVERLAP):
+    """Split [0, duration) into (start, end) windows that overlap by overlap seconds.
+
+    Raises ValueError unless 0 <= overlap < segment_length, since the windows
+    would otherwise never advance.
+    """
+    if overlap < 0 or overlap >= segment_length:
+        raise ValueError(f"Segment overlap must be at least 0 and below the segment length "
+                         f"({segment_length} s), got {overlap} s.")
+    if duration <= segment_length:
+        return [(0.0, duration)]
+    segments = []
+    start = 0.0
+    while True:
+        end = min(start + segment_length, duration)
+        segments.append((start, end))
+        if end >= duration:
+            return segments
+        start = end - overlap
+
+
+def keyframe_before(video_path, seconds):
+    """Return the time of the last video keyframe at or before seconds using ffprobe."""
+    if seconds <= 0:
+        return 0.0
+    # Reading an interval seeks to the keyframe before its start, so the
+    # frames listed run from that keyframe up to seconds
+    result = subprocess.run(
+        ["ffprobe", "-v", "error", "-select_streams", "v:0", "-skip_frame", "nokey",
+         "-show_entries", "frame=pts_time", "-of", "csv=p=0",
+         "-read_intervals", f"{seconds:.3f}%{seconds + 0.001:.3f}", video_path],
+        capture_output=True, text=True, check=True,
+    )
+    times = []
+    for line in result.stdout.split():
+        value = line.strip().strip(",")
+        if value and value != "N/A":
+            times.append(float(value))
+    earlier = [pts for pts in times if pts <= seconds]
+    return max(earlier) if earlier else seconds
+
+
+def split_video(video_path, segments, output_dir):
+    """Cut the video into segment files with stream copy (no re-encoding).
+
+    A stream copy can only start on a keyframe, so each cut is moved back to
+    the keyframe before its planned start. Returns (path, actual_start) pairs;
+    timestamps the model reads from a segment are relative to actual_start.
+    """
+    extension = os.path.splitext(video_path)[1] or ".mp4"
+    pieces = []
+    for index, (start, end) in enumerate(segments):
+        path = os.path.join(output_dir, f"segment_{index:03d}{extension}")
+        actual_start = keyframe_before(video_path, start)
+        subprocess.run(
+            ["ffmpeg", "-v", "error", "-y", "-ss", f"{actual_start:.3f}", "-i", video_path,
+             "-t", f"{end - actual_start:.3f}", "-c", "copy", "-avoid_negative_ts", "make_zero", path],
+            check=True,
+        )
+        pieces.append((path, actual_start))
+    return pieces
+
+
+def parse_timestamp(value):
+    """Parse 'SS', 'MM:SS' or 'HH:MM:SS' (optionally with fractions) into seconds."""
+    if not isinstance(value, str):
+        return None
+    match = re.search(r"\d+(?::\d+){0,2}(?:\.\d+)?", value)
+    if match is None:
+        return None
+    seconds = 0.0
+    for part in match.group(0).split(":"):
+        seconds = seconds * 60 + float(part)
+    return seconds
+
+
+def format_timestamp(seconds):
+    seconds = int(round(seconds))
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    if hours:
+        return f"{hours:02d}:{minutes:02d}:{seconds:02d}"
+    return f"{minutes:02d}:{seconds:02d}"
+
+
+def _shift(item, offset):
+    seconds = parse_timestamp(item.get("time_stamp"))
+    if seconds is not None:
+        item["time_stamp"] = format_timestamp(seconds + offset)
+    return seconds + offset if seconds is not None else None
+
+
+def _normalise(text):
+    return re.sub(r"\W+", " ", (text or "").lower()).strip()
+
+
+def _is_duplicate(step, seconds, previous_steps):
+    text = _normalise(step.get("step"))
+    for previous_text, previous_seconds in previous_steps:
+        if seconds is not None and previous_seconds is not None \
+                and abs(seconds - previous_seconds) > DUPLICATE_TIME_TOLERANCE:
+            continue
+        if difflib.SequenceMatcher(None, text, previous_text).ratio() >= DUPLICATE_SIMILARITY:
+            return True
+    return False
+
+
+def renumber_steps(list_of_steps):
+    """Regenerate the '1.0' / '1.1' numbering of groups and sub-steps in place."""
+    for group_index, group in enumerate(list_of_steps, start=1):
+        group["numbering"] = f"{group_index}.0"
+        for step_index, sub_step in enumerate(group.get("sub_steps", []), start=1):
+            sub_step["numbering"] = f"{group_index}.{step_index}"
+    return list_of_steps
+
+
+def merge_segment_results(results):
+    """Merge per-segment analyses, given as (start, end, json_data), into one process.
+
+    Timestamps are shifted to the full recording, steps repeated in the overlap
+    between neighbouring segments are dropped, a group continuing across a
+    segment boundary is joined back together and the steps are renumbered.
+    """
+    merged = None
+    previous_end = None
+    previous_steps = []
+    for start, end, json_data in results:
+        if json_data is None:
+            continue
+        json_data = json.loads(json.dumps(json_data))
+        if merged is None:
+            merged = {key: json_data.get(key) for key in ("process_name", "short_process_description")}
+            merged.update({"list_of_applications": [], "list_of_steps": [], "exceptions": [], "clarifications": []})
+
+        seen_apps = {_normalise(app.get("application_name")) for app in merged["list_of_applications"]}
+        for app in json_data.get("list_of_applications", []):
+            if _normalise(app.get("application_name")) not in seen_apps:
+                seen_apps.add(_normalise(app.get("application_name")))
+                merged["list_of_applications"].append(app)
+        seen_exceptions = {_normalise(item.get("exception")) for item in merged["exceptions"]}
+        for item in json_data.get("exceptions", []):
+            if _normalise(item.get("exception")) not in seen_exceptions:
+                seen_exceptions.add(_normalise(item.get("exception")))
+                merged["exceptions"].append(item)
+        for clarification in json_data.get("clarifications", []):
+            if clarification not in merged["clarifications"]:
+                merged["clarifications"].append(clarification)
+
+        current_steps = []
+        # Only the first group of a segment can continue the last one of the previous segment
+        seam = previous_end is not None
+        for group in json_data.get("list_of_steps", []):
+            _shift(group, start)
+            kept = []
+            for sub_step in group.get("sub_steps", []):
+                seconds = _shift(sub_step, start)
+                in_overlap = previous_end is not None and (seconds is None or seconds <= previous_end)
+                if in_overlap and _is_duplicate(sub_step, seconds, previous_steps):
+                    continue
+                kept.append(sub_step)
+                current_steps.append((_normalise(sub_step.get("step")), seconds))
+            if not kept:
+                continue
+            group["sub_steps"] = kept
+            last_group = merged["list_of_steps"][-1] if seam and merged["list_of_steps"] else None
+            seam = False
+            if last_group is not None and difflib.SequenceMatcher(
+                    None, _normalise(group.get("group_name")),
+                    _normalise(last_group.get("group_name"))).ratio() >= DUPLICATE_SIMILARITY:
+                last_group["sub_steps"].extend(kept)
+            else:
+                merged["list_of_steps"].append(group)
+        previous_end = end
+        previous_steps = current_steps
+
+    if merged is None:
+        return None
+    renumber_steps(merged["list_of_steps"])
+    return merged
+
+
+def analyse_in_segments(video_path, analyse_segment, duration=None, segment_length=SEGMENT_LENGTH,
+                        overlap=SEGMENT_OVERLAP, workers=SEGMENT_WORKERS):
+    """Analyse a long recording segment by segment in parallel and merge the results.
+
+    analyse_segment(path, start, end, index, count) must return the parsed
+    JSON for one segment (or None). Failed segments are retried once and then
+    reported as a clarification instead of failing the whole job.
+    """
+    if duration is None:
+        duration = probe_duration(video_path)
+    segments = plan_segments(duration, segment_length, overlap)
+    work_dir = tempfile.mkdtemp(prefix="segments_")
+    try:
+        pieces = split_video(video_path, segments, work_dir)
+
+        def run(index):
+            path, start = pieces[index]
+            end = segments[index][1]
+            for attempt in range(SEGMENT_RETRIES + 1):
+                try:
+                    json_data = analyse_segment(path, start, end, index, len(segments))
+                    if json_data is not None:
+                        return json_data
+                except Exception as e:
+                    print(f"Segment {index + 1}/{len(segments)} failed (attempt {attempt + 1}):", e)
+                if attempt < SEGMENT_RETRIES:
+                    current_span().add("retries")
+            return None
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [run_in_context(executor, run, index) for index in range(len(segments))]
+            analyses = [future.result() for future in futures]
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    merged = merge_segment_results([(start, end, json_data) for (_, start), (_, end), json_data
+                                    in zip(pieces, segments, analyses)])
+    if merged is not None:
+        for (start, end), json_data in zip(segments, analyses):
+            if json_data is None:
+                merged["clarifications"].append(
+                    f"The recording between {format_timestamp(start)} and {format_timestamp(end)} "
+                    "could not be analysed; steps from that part may be missing.")
+    return merged
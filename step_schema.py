@@ -0,0 +1,265 @@
+import hashlib
+import json
+import re
+
+# Response schema for the analysis call, matching the JSON layout in PDD_ANALYSIS_PROMPT
+SUB_STEP_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "step": {"type": "string"},
+        "numbering": {"type": "string"},
+        "time_stamp": {"type": "string"},
+    },
+    "required": ["step", "numbering", "time_stamp"],
+}
+
+STEP_GROUP_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "group_name": {"type": "string"},
+        "numbering": {"type": "string"},
+        "time_stamp": {"type": "string"},
+        "sub_steps": {"type": "array", "items": SUB_STEP_SCHEMA},
+    },
+    "required": ["group_name", "numbering", "time_stamp", "sub_steps"],
+}
+
+PROCESS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "process_name": {"type": "string"},
+        "short_process_description": {"type": "string"},
+        "list_of_applications": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "application_name": {"type": "string"},
+                    "type": {"type": "string"},
+                    "url": {"type": "string", "nullable": True},
+                },
+                "required": ["application_name", "type"],
+            },
+        },
+        "list_of_steps": {"type": "array", "items": STEP_GROUP_SCHEMA},
+        "exceptions": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "exception": {"type": "string"},
+                    "description": {"type": "string"},
+                },
+                "required": ["exception", "description"],
+            },
+        },
+        "clarifications": {"type": "array", "items": {"type": "string"}},
+    },
+    "required": ["process_name", "short_process_description", "list_of_applications",
+                 "list_of_steps", "exceptions", "clarifications"],
+}
+
+_TYPES = {"object": dict, "array": list, "string": str}
+
+
+def validate(data, schema=PROCESS_SCHEMA, path="$"):
+    """Return a list of 'path: problem' strings; empty when data matches schema."""
+    if data is None:
+        return [] if schema.get("nullable") else [f"{path}: missing value"]
+    expected = _TYPES[schema["type"]]
+    if not isinstance(data, expected):
+        return [f"{path}: expected {schema['type']}, got {type(data).__name__}"]
+    errors = []
+    if schema["type"] == "object":
+        for key in schema.get("required", []):
+            if key not in data:
+                errors.append(f"{path}.{key}: missing required field")
+        for key, child in schema["properties"].items():
+            if key in data:
+                errors.extend(validate(data[key], child, f"{path}.{key}"))
+    elif schema["type"] == "array":
+        for index, item in enumerate(data):
+            errors.extend(validate(item, schema["items"], f"{path}[{index}]"))
+    return errors
+
+
+def check_process(json_data):
+    """Raise ValueError when json_data does not match the process schema."""
+    errors = validate(json_data)
+    if errors:
+        raise ValueError("Invalid process JSON: " + "; ".join(errors[:5]))
+
+
+def validate_step_group(group, index=0):
+    return validate(group, STEP_GROUP_SCHEMA, f"$.list_of_steps[{index}]")
+
+
+def _section_hash(section):
+    return hashlib.sha256(json.dumps(section, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+def section_hashes(json_data):
+    """Hash the rendered sections of a process: header, applications and each step group.
+
+    Comparing these between two versions of the JSON tells the renderers
+    which parts of an edited process actually need rebuilding.
+    """
+    return {
+        "header": _section_hash([json_data.get("process_name"), json_data.get("short_process_description")]),
+        "applications": _section_hash(json_data.get("list_of_applications") or []),
+        "groups": [_section_hash(group) for group in json_data.get("list_of_steps") or []],
+    }
+
+
+class StreamingStepParser:
+    """Pull complete list_of_steps groups out of a JSON response while it streams in.
+
+    feed() scans only the newly received text and returns the step groups that
+    were completed by it, so callers can validate or render them before the
+    generation has finished.
+    """
+
+    _ARRAY_START = re.compile(r'"list_of_steps"\s*:\s*\[')
+
+    def __init__(self):
+        self.text = ""
+        self.groups = []
+        self._pos = 0
+        self._in_array = False
+        self._done = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._group_start = None
+
+    def feed(self, chunk):
+        self.text += chunk
+        completed = []
+        if self._done:
+            return completed
+        if not self._in_array:
+            match = self._ARRAY_START.search(self.text, max(0, self._pos - 32))
+            if match is None:
+                self._pos = len(self.text)
+                return completed
+            self._in_array = True
+            self._pos = match.end()
+        text = self.text
+        for i in range(self._pos, len(text)):
+            char = text[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                continue
+            if char == '"':
+                self._in_string = True
+            elif char in "{[":
+                if self._depth == 0:
+                    self._group_start = i
+                self._depth += 1
+            elif char in "}]":
+                if self._depth == 0:
+                    # Closing bracket of list_of_steps itself
+                    self._done = True
+                    self._pos = i + 1
+                    return completed
+                self._depth -= 1
+                if self._depth == 0:
+                    try:
+                        group = json.loads(text[self._group_start:i + 1])
+                    except json.JSONDecodeError:
+                        continue
+                    self.groups.append(group)
+                    completed.append(group)
+        self._pos = len(text)
+        return completed
+
+
+def _strip_to_object(text):
+    text = re.sub(r"^\s*```(?:json)?", "", text.strip())
+    text = re.sub(r"```\s*$", "", text)
+    start = text.find("{")
+    return text[start:] if start != -1 else text
+
+
+def close_truncated_json(text):
+    """Cut a truncated JSON document back to its last complete value and close it."""
+    stack = []
+    in_string = escape = False
+    cut, closers = None, ""
+    for i, char in enumerate(text):
+        if in_string:
+            if escape:
+                escape = False
+            elif char == "\\":
+                escape = True
+            elif char == '"':
+                in_string = False
+            continue
+        if char == '"':
+            in_string = True
+        elif char in "{[":
+            stack.append("}" if char == "{" else "]")
+        elif char in "}]" and stack:
+            stack.pop()
+            cut, closers = i + 1, "".join(reversed(stack))
+            if not stack:
+                return text[:cut]
+    if cut is None:
+        return None
+    return text[:cut] + closers
+
+
+def repair_locally(text):
+    """Try cheap local fixes for a broken analysis response.
+
+    Returns (json_data, errors): json_data is None when the text could not be
+    parsed at all, otherwise errors lists the schema problems left over.
+    """
+    text = _strip_to_object(text)
+    candidates = [text[:text.rfind("}") + 1]]
+    candidates.append(re.sub(r",\s*([}\]])", r"\1", candidates[0]))
+    closed = close_truncated_json(re.sub(r",\s*([}\]])", r"\1", text))
+    if closed is not None:
+        candidates.append(closed)
+    for candidate in candidates:
+        try:
+            data = json.loads(candidate)
+        except json.JSONDecodeError:
+            continue
+        if isinstance(data, dict):
+            normalize_process(data)
+        return data, validate(data)
+    return None, ["$: response is not valid JSON"]
+
+
+def _set_default(obj, key, value):
+    # Unlike setdefault this also replaces an explicit null
+    if obj.get(key) is None:
+        obj[key] = value
+
+
+def normalize_process(data):
+    """Fill in the fields a process may leave out or null, in place, and return it.
+
+    Covers sections the model can legitimately leave empty (e.g. after
+    truncation) and optional fields a user may drop while editing.
+    """
+    for key in ("list_of_applications", "list_of_steps", "exceptions", "clarifications"):
+        _set_default(data, key, [])
+    _set_default(data, "short_process_description", "")
+    for app in data["list_of_applications"]:
+        if isinstance(app, dict):
+            app.setdefault("url", None)
+    for group in data["list_of_steps"]:
+        if isinstance(group, dict):
+            _set_default(group, "time_stamp", "")
+            _set_default(group, "sub_steps", [])
+            for sub_step in group["sub_steps"]:
+                if isinstance(sub_step, dict):
+                    _set_default(sub_step, "time_stamp", "")
+    return data
@@ -0,0 +1,197 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+from uploads import UPLOAD_DIR
+
+STORAGE_OUTPUT_DIR = os.getenv("STORAGE_OUTPUT_DIR", "job_outputs")
+# Quota for uploaded videos and job outputs together
+STORAGE_MAX_BYTES = int(os.getenv("STORAGE_MAX_BYTES", str(5 * 1024 * 1024 * 1024)))
+STORAGE_MAX_AGE = int(os.getenv("STORAGE_MAX_AGE", str(7 * 24 * 3600)))
+# Generated artifacts kept in memory for downloads
+STORAGE_MEMORY_BYTES = int(os.getenv("STORAGE_MEMORY_BYTES", str(256 * 1024 * 1024)))
+
+
+class ArtifactBuffers:
+    """Bounded LRU of generated file contents keyed by path."""
+
+    def __init__(self, max_bytes=STORAGE_MEMORY_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def put(self, path, data):
+        key = os.path.abspath(path)
+        with self._lock:
+            if key in self.items:
+                self.size -= len(self.items.pop(key))
+            if len(data) > self.max_bytes:
+                return
+            self.items[key] = data
+            self.size += len(data)
+            while self.size > self.max_bytes:
+                _, old = self.items.popitem(last=False)
+                self.size -= len(old)
+
+    def get(self, path):
+        key = os.path.abspath(path)
+        with self._lock:
+            data = self.items.get(key)
+            if data is not None:
+                self.items.move_to_end(key)
+            return data
+
+    def discard(self, path):
+        """Forget path and, for a directory, everything under it."""
+        prefix = os.path.abspath(path)
+        with self._lock:
+            for key in [key for key in self.items if key == prefix or key.startswith(prefix + os.sep)]:
+                self.size -= len(self.items.pop(key))
+
+
+BUFFERS = ArtifactBuffers()
+
+
+def write_artifact(path, data):
+    """Write a generated file and keep its bytes in memory for downloads."""
+    # A uniquely named temp file, so concurrent writers of one path never share it
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp_")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    BUFFERS.put(path, data)
+    return path
+
+
+def remove_artifact(path):
+    """Delete a generated file that has been superseded, e.g. after a rename."""
+    BUFFERS.discard(path)
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def read_artifact(path):
+    """Return a generated file's bytes, from memory when possible, or None if it is gone."""
+    data = BUFFERS.get(path)
+    if data is not None:
+        return data
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except OSError:
+        return None
+    BUFFERS.put(path, data)
+    return data
+
+
+def _size(path):
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    total = 0
+    for root, _, names in os.walk(path):
+        for name in names:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+class StorageManager:
+    """Per-job output directories plus quota and age limits for uploads and outputs.
+
+    Uploaded videos and job directories are evicted together, oldest first by
+    last use, once they exceed max_age or the total exceeds max_bytes. Paths
+    of running jobs are passed as protected and never removed.
+    """
+
+    def __init__(self, upload_dir=UPLOAD_DIR, output_dir=STORAGE_OUTPUT_DIR,
+                 max_bytes=STORAGE_MAX_BYTES, max_age=STORAGE_MAX_AGE):
+        self.upload_dir = upload_dir
+        self.output_dir = output_dir
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self._lock = threading.Lock()
+
+    def job_dir(self, job_id):
+        path = os.path.join(self.output_dir, job_id)
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def touch(self, path):
+        """Mark a video or job directory as recently used."""
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+    def entries(self):
+        """Return (last_used, size, path) for every stored video and job directory."""
+        entries = []
+        for directory in (self.upload_dir, self.output_dir):
+            if not os.path.isdir(directory):
+                continue
+            for name in os.listdir(directory):
+                path = os.path.join(directory, name)
+                try:
+                    entries.append((os.path.getmtime(path), _size(path), path))
+                except OSError:
+                    continue
+        return entries
+
+    def usage(self):
+        """Total bytes held by stored videos and job directories."""
+        return sum(size for _, size, _ in self.entries())
+
+    def remove(self, path):
+        if os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+        else:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        BUFFERS.discard(path)
+
+    def evict(self, protected=()):
+        """Remove expired entries, then least recently used ones until under max_bytes."""
+        protected = {os.path.abspath(path) for path in protected if path}
+        now = time.time()
+        removed = []
+        with self._lock:
+            # Protected paths are in use now, so they count as recently used afterwards too
+            for path in protected:
+                self.touch(path)
+            entries = []
+            for last_used, size, path in self.entries():
+                if os.path.abspath(path) in protected:
+                    continue
+                if now - last_used > self.max_age:
+                    self.remove(path)
+                    removed.append(path)
+                else:
+                    entries.append((last_used, size, path))
+            total = self.usage()
+            for last_used, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                # Uploads still being written are hidden files; leave them alone
+                if os.path.basename(path).startswith("."):
+                    continue
+                self.remove(path)
+                removed.append(path)
+                total -= size
+        if removed:
+            print(f"Storage eviction removed {len(removed)} item(s)")
+        return removed
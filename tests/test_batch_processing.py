@@ -0,0 +1,19 @@
+import os
+
+from batch_processing import load_manifest, save_manifest
+from doc_processing import artifact_status
+
+
+def test_manifest_round_trip_leaves_no_temp_files(tmp_path):
+    manifest = {"jobs": {"abc": {"status": "partial"}}}
+    save_manifest(str(tmp_path), manifest)
+    save_manifest(str(tmp_path), manifest)
+    assert load_manifest(str(tmp_path)) == manifest
+    assert os.listdir(tmp_path) == ["manifest.json"]
+
+
+def test_artifact_status():
+    assert artifact_status("a.docx", "a.drawio") == "completed"
+    assert artifact_status(None, "a.drawio") == "partial"
+    assert artifact_status("a.docx", None) == "partial"
+    assert artifact_status(None, None) == "failed"
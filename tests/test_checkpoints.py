@@ -0,0 +1,25 @@
+import os
+import threading
+
+from checkpoints import Checkpoint
+
+
+def test_concurrent_writers_never_leave_a_partial_file(tmp_path):
+    texts = [str(index) * 200000 for index in range(8)]
+    errors = []
+
+    def write(text):
+        try:
+            for _ in range(5):
+                Checkpoint(str(tmp_path)).save_text("analyse", text)
+        except OSError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=write, args=(text,)) for text in texts]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors
+    assert Checkpoint(str(tmp_path)).load_text("analyse") in texts
+    assert sorted(os.listdir(tmp_path)) == ["analyse.txt", "checkpoint.json"]
@@ -0,0 +1,103 @@
+import threading
+
+from context_cache import FAILURE_BACKOFF, ContextCacheManager, FakeCacheBackend
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_manager(ttl=600, max_entries=20, fail_models=()):
+    clock = Clock()
+    backend = FakeCacheBackend(clock=clock, fail_models=fail_models)
+    return ContextCacheManager(backend, ttl=ttl, max_entries=max_entries, clock=clock), backend, clock
+
+
+def test_create_hit_expire_recreate():
+    manager, backend, clock = make_manager()
+    name = manager.get_or_create("model", "prompt", ["video"], ["file-1"])
+    assert backend.calls == [("create", "video-doc-process")]
+
+    clock.now += 100
+    assert manager.get_or_create("model", "prompt", ["video"], ["file-1"]) == name
+    assert len(backend.calls) == 1
+
+    clock.now += 600
+    recreated = manager.get_or_create("model", "prompt", ["video"], ["file-1"])
+    assert recreated != name
+    assert [call[0] for call in backend.calls] == ["create", "create"]
+    assert manager.model_for(recreated).generate_content("q").text == "Answer from model for: q"
+
+
+def test_refreshes_ttl_near_expiry():
+    manager, backend, clock = make_manager()
+    name = manager.get_or_create("model", "prompt", content_ids=["file-1"])
+    clock.now += 400
+    assert manager.get_or_create("model", "prompt", content_ids=["file-1"]) == name
+    assert backend.calls[-1] == ("extend", name)
+    clock.now += 500
+    assert manager.get_or_create("model", "prompt", content_ids=["file-1"]) == name
+
+
+def test_failed_create_is_not_retried_until_backoff():
+    manager, backend, clock = make_manager(fail_models=["small"])
+    assert manager.get_or_create("small", "prompt") is None
+    assert manager.get_or_create("small", "prompt") is None
+    assert len(backend.calls) == 1
+    clock.now += FAILURE_BACKOFF + 1
+    assert manager.get_or_create("small", "prompt") is None
+    assert len(backend.calls) == 2
+
+
+def test_evicts_least_recently_used():
+    manager, backend, clock = make_manager(max_entries=2)
+    first = manager.get_or_create("model", "a")
+    clock.now += 1
+    manager.get_or_create("model", "b")
+    clock.now += 1
+    manager.get_or_create("model", "a")
+    clock.now += 1
+    manager.get_or_create("model", "c")
+    assert ("delete", first) not in backend.calls
+    assert len(manager.entries) == 2
+    assert backend.calls[-1][0] == "delete"
+
+
+def test_slow_create_does_not_block_other_keys():
+    manager, backend, clock = make_manager()
+    started, release = threading.Event(), threading.Event()
+    create = backend.create
+
+    def slow_create(model, *args):
+        if model == "slow":
+            started.set()
+            release.wait(5)
+        return create(model, *args)
+
+    backend.create = slow_create
+    thread = threading.Thread(target=manager.get_or_create, args=("slow", "prompt"))
+    thread.start()
+    assert started.wait(5)
+    try:
+        assert manager.get_or_create("fast", "prompt") is not None
+    finally:
+        release.set()
+        thread.join(5)
+    assert len(manager.entries) == 2
+
+
+def test_concurrent_callers_share_one_create():
+    manager, backend, clock = make_manager()
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(manager.get_or_create("model", "prompt")))
+               for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    assert len(set(results)) == 1
+    assert [call[0] for call in backend.calls] == ["create"]
@@ -0,0 +1,95 @@
+import copy
+import os
+
+import pytest
+
+import doc_processing
+from benchmarks.synthetic import make_process
+from checkpoints import CHECKPOINT_FILE, Checkpoint
+from model_backend import FakeBackend
+
+
+@pytest.fixture
+def fake(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(doc_processing, "_context_caches", None)
+    backend = FakeBackend(process_json=make_process(20), time_scale=0)
+    previous = doc_processing._backend
+    doc_processing.set_model_backend(backend)
+    yield backend
+    doc_processing._backend = previous
+
+
+def make_video(tmp_path):
+    path = tmp_path / "video.mp4"
+    path.write_bytes(os.urandom(1000))
+    return str(path)
+
+
+def generations(backend):
+    return sum(1 for call in backend.calls if call.startswith("generate_content"))
+
+
+def test_default_output_dir_is_not_checkpointed(fake, tmp_path):
+    video = make_video(tmp_path)
+    word_file, drawio_file = doc_processing.process_video(video, use_cache=False, drawio_mode="local",
+                                                          preprocess=False)
+    assert word_file and drawio_file
+    assert not (tmp_path / CHECKPOINT_FILE).exists()
+    calls = generations(fake)
+    assert calls > 0
+    doc_processing.process_video(video, use_cache=False, drawio_mode="local", preprocess=False)
+    assert generations(fake) == 2 * calls
+
+
+def test_job_directory_resumes_only_when_asked(fake, tmp_path):
+    video = make_video(tmp_path)
+    job_dir = str(tmp_path / "job")
+    doc_processing.process_video(video, use_cache=False, output_dir=job_dir, drawio_mode="local",
+                                 preprocess=False, resume=True)
+    assert Checkpoint(job_dir).done("parse")
+    calls = generations(fake)
+    assert calls > 0
+
+    doc_processing.process_video(video, use_cache=False, output_dir=job_dir, drawio_mode="local",
+                                 preprocess=False, resume=True)
+    assert generations(fake) == calls
+
+    doc_processing.process_video(video, use_cache=False, output_dir=job_dir, drawio_mode="local",
+                                 preprocess=False)
+    assert generations(fake) == 2 * calls
+
+
+def test_rerender_accepts_an_application_without_url(tmp_path):
+    process = make_process(5)
+    job_dir = str(tmp_path / "job")
+    os.makedirs(job_dir)
+    checkpoint = Checkpoint(job_dir)
+    doc_processing.generate_artifacts(process, job_dir, "local", checkpoint)
+    checkpoint.save_json("parse", process)
+
+    edited = copy.deepcopy(process)
+    edited["list_of_applications"].append({"application_name": "Mail", "type": "Desktop"})
+    word_file, drawio_file = doc_processing.rerender_artifacts(job_dir, edited, "local")
+    assert word_file and drawio_file
+    assert Checkpoint(job_dir).load_json("parse")["list_of_applications"][-1]["url"] is None
+
+
+def test_partial_result_is_completed_from_the_cached_analysis(fake, tmp_path, monkeypatch):
+    video = make_video(tmp_path)
+
+    def broken(json_data, output_dir="."):
+        raise RuntimeError("template missing")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(doc_processing, "generate_word_file", broken)
+        word_file, drawio_file = doc_processing.process_video(video, drawio_mode="local", preprocess=False)
+    assert word_file is None and drawio_file
+    calls = generations(fake)
+
+    word_file, drawio_file = doc_processing.process_video(video, drawio_mode="local", preprocess=False)
+    assert word_file and drawio_file
+    assert generations(fake) == calls
+    # Now complete, so the next run is a plain hit
+    assert doc_processing.process_video(video, drawio_mode="local", preprocess=False) == (word_file, drawio_file)
+    assert generations(fake) == calls
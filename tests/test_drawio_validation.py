@@ -0,0 +1,49 @@
+from drawio_validation import repair_drawio_locally, validate_drawio
+
+
+def diagram(cells):
+    return ('<mxfile><diagram id="d" name="P"><mxGraphModel><root><mxCell id="0"/><mxCell id="1" parent="0"/>'
+            + "".join(cells) + "</root></mxGraphModel></diagram></mxfile>")
+
+
+def vertex(cell_id, value, parent="1"):
+    return (f'<mxCell id="{cell_id}" value="{value}" vertex="1" parent="{parent}">'
+            '<mxGeometry x="0" y="0" width="120" height="60" as="geometry"/></mxCell>')
+
+
+def edge(cell_id, source, target):
+    return (f'<mxCell id="{cell_id}" edge="1" source="{source}" target="{target}" parent="1">'
+            '<mxGeometry relative="1" as="geometry"/></mxCell>')
+
+
+STEPS = {"list_of_steps": [{"sub_steps": [{"numbering": "1.1", "step": "Open invoice"},
+                                          {"numbering": "1.2", "step": "Approve"}]}]}
+
+
+def test_valid_diagram_has_no_errors():
+    xml = diagram([vertex("a", "Open invoice"), vertex("b", "Approve"), edge("e", "a", "b")])
+    assert validate_drawio(xml, STEPS) == []
+
+
+def test_dangling_edge_is_removed_with_its_label():
+    label = ('<mxCell id="label" value="yes" vertex="1" connectable="0" parent="e">'
+             '<mxGeometry relative="1" as="geometry"/></mxCell>')
+    xml = diagram([vertex("a", "Open invoice"), edge("e", "a", "missing"), label, edge("e2", "e", "a")])
+    assert validate_drawio(xml)
+    repaired, errors = repair_drawio_locally(xml)
+    assert errors == []
+    for removed in ('id="e"', 'id="label"', 'id="e2"'):
+        assert removed not in repaired
+    assert 'id="a"' in repaired
+
+
+def test_repair_fills_missing_geometry_and_root_cells():
+    xml = '<mxGraphModel><root><mxCell id="a" value="Open &amp; check" vertex="1" parent="1"/></root></mxGraphModel>'
+    repaired, errors = repair_drawio_locally("```xml\n" + xml + "\n```")
+    assert errors == []
+    assert "<mxGeometry" in repaired
+
+
+def test_missing_sub_step_is_reported():
+    errors = validate_drawio(diagram([vertex("a", "Open invoice")]), STEPS)
+    assert errors == ["sub-step 1.2 'Approve' has no cell"]
@@ -0,0 +1,126 @@
+import threading
+import time
+
+import pytest
+
+import doc_processing
+from file_registry import FileRegistry
+from gemini_client import ResilientBackend, is_retryable
+from model_backend import FakeAPIError, FakeBackend
+
+
+@pytest.fixture
+def stuck():
+    # Calls that wait on this event never return until the test ends
+    release = threading.Event()
+    yield lambda: release.wait()
+    release.set()
+
+
+def test_stuck_calls_give_their_slots_back(stuck):
+    client = ResilientBackend(FakeBackend(), max_retries=0, max_concurrency=2)
+    for _ in range(2):
+        with pytest.raises(TimeoutError):
+            client.call(stuck, timeout=0.1)
+    started = time.monotonic()
+    with pytest.raises(TimeoutError):
+        client.call(stuck, timeout=0.1)
+    assert time.monotonic() - started < 1
+    assert client.call(lambda: "ok", timeout=1) == "ok"
+
+
+def test_waiting_for_a_slot_has_a_deadline(stuck):
+    client = ResilientBackend(FakeBackend(), max_retries=0, max_concurrency=1)
+    threading.Thread(target=client.call, args=(stuck, 5), daemon=True).start()
+    time.sleep(0.05)
+    started = time.monotonic()
+    with pytest.raises(TimeoutError, match="slot"):
+        client.call(lambda: "ok", timeout=0.1)
+    assert time.monotonic() - started < 1
+
+
+def test_losing_hedge_gives_its_slot_back(stuck):
+    client = ResilientBackend(FakeBackend(), max_retries=0, max_concurrency=2, hedge_after=0.05)
+    calls = []
+
+    def fn():
+        calls.append(None)
+        if len(calls) == 1:
+            stuck()
+        return "hedged"
+
+    assert client.call(fn, timeout=5, hedge=True) == "hedged"
+    assert len(calls) == 2
+    assert client._slots.acquire(blocking=False) and client._slots.acquire(blocking=False)
+
+
+def test_retries_fake_api_errors():
+    assert is_retryable(FakeAPIError(429))
+    assert is_retryable(FakeAPIError(503))
+    assert not is_retryable(FakeAPIError(400))
+    assert not is_retryable(ValueError("bad request"))
+
+
+def test_retries_google_api_core_errors():
+    exceptions = pytest.importorskip("google.api_core.exceptions")
+    assert is_retryable(exceptions.TooManyRequests("slow down"))
+    assert is_retryable(exceptions.ServiceUnavailable("try later"))
+    assert not is_retryable(exceptions.NotFound("gone"))
+
+
+@pytest.mark.parametrize("status, retryable", [(429, True), (503, True), (404, False)])
+def test_retries_http_errors_by_status(status, retryable):
+    errors = pytest.importorskip("googleapiclient.errors")
+    httplib2 = pytest.importorskip("httplib2")
+    error = errors.HttpError(httplib2.Response({"status": status}), b"{}")
+    assert is_retryable(error) is retryable
+
+
+def test_retries_dropped_connections():
+    requests = pytest.importorskip("requests")
+    assert is_retryable(requests.ConnectionError("connection reset"))
+    assert is_retryable(requests.Timeout("read timed out"))
+    assert is_retryable(ConnectionResetError())
+
+
+class DroppingBackend(FakeBackend):
+    """Fails the first upload with a dropped connection."""
+
+    def __init__(self, error, **kwargs):
+        super().__init__(**kwargs)
+        self.error = error
+
+    def upload_file(self, path, mime_type=None):
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
+        return super().upload_file(path, mime_type=mime_type)
+
+
+def test_upload_is_retried_after_a_dropped_connection(monkeypatch, tmp_path):
+    requests = pytest.importorskip("requests")
+    backend = DroppingBackend(requests.ConnectionError("connection aborted"), time_scale=0)
+    monkeypatch.setattr(doc_processing, "_backend", ResilientBackend(backend, backoff_base=0.01))
+    video = tmp_path / "video.mp4"
+    video.write_bytes(b"\0" * 100)
+    registry = FileRegistry(str(tmp_path / "files.sqlite3"))
+    file = doc_processing.get_or_upload_file(str(video), "hash", registry=registry, mime_type="video/mp4")
+    assert file.state.name == "ACTIVE"
+    assert backend.calls.count("upload_file") == 1
+
+
+def test_rate_limiter_applies_to_generations_only(monkeypatch):
+    class CountingLimiter:
+        acquired = 0
+
+        def acquire(self, tokens=1, timeout=None):
+            self.acquired += 1
+            return True
+
+    monkeypatch.setattr(doc_processing, "_backend", ResilientBackend(FakeBackend(time_scale=0)))
+    limiter = CountingLimiter()
+    assert doc_processing.set_rate_limiter(limiter) is None
+    doc_processing._backend.GenerativeModel("model").generate_content("question")
+    doc_processing._backend.call(lambda: "upload", timeout=1)
+    assert limiter.acquired == 1
+    assert doc_processing.set_rate_limiter(None) is limiter
@@ -0,0 +1,11 @@
+import pytest
+
+from benchmarks.bench_import import IMPORT_BUDGET_MS, MODULES, measure
+
+
+@pytest.mark.parametrize("module", MODULES)
+def test_startup_import_is_fast_and_lazy(module):
+    # Best of three cold imports, so one slow start on a busy machine does not fail the suite
+    results = [measure(module) for _ in range(3)]
+    assert all(not loaded for _, loaded in results), f"{module} loads {results[0][1]} at import"
+    assert min(milliseconds for milliseconds, _ in results) <= IMPORT_BUDGET_MS
@@ -0,0 +1,208 @@
+import json
+import socket
+import threading
+import time
+import urllib.request
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+import instrumentation
+import job_manager
+from instrumentation import JobTrace, MetricsRegistry, export_job, stage
+from job_manager import execute_rerender
+from job_service import JobServiceClient, JobServiceHandler, JobStore, StoredJob
+from scheduler import inflight, share_inflight_limits
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return JobStore(str(tmp_path / "jobs.sqlite3"), workers=1)
+
+
+@pytest.fixture
+def client(store):
+    handler = type("Handler", (JobServiceHandler,), {"store": store})
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True).start()
+    yield JobServiceClient(f"http://127.0.0.1:{server.server_address[1]}")
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def video(tmp_path):
+    path = tmp_path / "video.mp4"
+    path.write_bytes(b"\0" * 1000)
+    return str(path)
+
+
+def test_submit_keeps_allowed_options(client, store, video):
+    job_id = client.submit(video, user="alice", drawio_mode="llm", video_hash="abc")
+    job = store.get(job_id)
+    assert job["options"]["drawio_mode"] == "llm"
+    assert job["options"]["resume"] is True
+    assert job["output_dir"].endswith(job_id)
+
+
+@pytest.mark.parametrize("options", [{"output_dir": "/tmp"}, {"trace": None}, {"no_such_option": 1}])
+def test_submit_rejects_other_options(client, video, options):
+    with pytest.raises(ValueError, match="Unknown options"):
+        client.submit(video, **options)
+
+
+def test_submit_needs_a_video_on_the_shared_filesystem(client):
+    with pytest.raises(ValueError, match="shared filesystem"):
+        client._request("POST", "/jobs", {"video_path": "video.mp4"})
+
+
+PROCESS = {"process_name": "p", "short_process_description": "", "list_of_applications": [],
+           "list_of_steps": [], "exceptions": [], "clarifications": []}
+
+
+def finished_job(store, video):
+    job_id = store.submit(video, user="alice", cost=1.0)
+    store.claim("worker")
+    store.update(job_id, status="completed", word_file="old.docx", drawio_file="old.drawio")
+    return job_id
+
+
+def test_rerender_is_queued_for_a_worker(client, store, video, monkeypatch):
+    job_id = finished_job(store, video)
+    assert client.rerender(job_id, PROCESS)
+    assert store.get(job_id)["status"] == "queued"
+
+    data = store.claim("worker")
+    assert data["kind"] == "rerender"
+    assert json.loads(data["payload"]) == PROCESS
+    monkeypatch.setattr(job_manager, "rerender_artifacts", lambda output_dir, json_data, mode: ("new.docx", None))
+    execute_rerender(StoredJob(store, data), json.loads(data["payload"]))
+    job = store.get(job_id)
+    assert (job["status"], job["word_file"], job["drawio_file"]) == ("partial", "new.docx", None)
+
+
+def test_failed_rerender_keeps_the_previous_files(store, video, monkeypatch):
+    job_id = finished_job(store, video)
+    store.rerender(job_id, PROCESS)
+
+    def fail(output_dir, json_data, mode):
+        raise RuntimeError("template missing")
+
+    monkeypatch.setattr(job_manager, "rerender_artifacts", fail)
+    data = store.claim("worker")
+    execute_rerender(StoredJob(store, data), json.loads(data["payload"]))
+    job = store.get(job_id)
+    assert (job["status"], job["error"]) == ("failed", "template missing")
+    assert (job["word_file"], job["drawio_file"]) == ("old.docx", "old.drawio")
+
+
+def test_rerender_rejects_invalid_json_and_unfinished_jobs(client, store, video):
+    job_id = store.submit(video, user="alice", cost=1.0)
+    with pytest.raises(ValueError, match="Invalid process JSON"):
+        client.rerender(job_id, {"process_name": "p"})
+    with pytest.raises(ValueError, match="not finished"):
+        client.rerender(job_id, PROCESS)
+    assert not client.rerender("missing", PROCESS)
+
+
+def test_retry_after_rerender_runs_the_pipeline(store, video):
+    job_id = finished_job(store, video)
+    store.rerender(job_id, PROCESS)
+    store.update(store.claim("worker")["job_id"], status="completed")
+    assert store.retry(job_id)
+    data = store.claim("worker")
+    assert (data["kind"], data["payload"]) == ("process", None)
+
+
+def finished_trace(status="completed"):
+    trace = JobTrace()
+    with trace.activate(), stage("analyse"):
+        pass
+    trace.finish(status)
+    return trace
+
+
+def test_workers_add_up_metrics_in_the_store(store, tmp_path, monkeypatch):
+    monkeypatch.setattr(instrumentation, "_metrics_store", store)
+    # Two workers, each with its own process-wide registry
+    for registry in (MetricsRegistry(), MetricsRegistry()):
+        monkeypatch.setattr(instrumentation, "METRICS", registry)
+        export_job(finished_trace(), str(tmp_path / "metrics"))
+    assert ["videodoc_jobs_total", {"status": "completed"}, 2.0] in store.metrics()
+    text = (tmp_path / "metrics" / "metrics.prom").read_text()
+    assert 'videodoc_jobs_total{status="completed"} 2.0' in text
+
+
+def test_client_reports_the_service_metrics(client):
+    client.add_metrics([["videodoc_retries_total", {"stage": "analyse"}, 3]])
+    client.add_metrics([["videodoc_retries_total", {"stage": "analyse"}, 1]])
+    assert client.metrics() == [["videodoc_retries_total", {"stage": "analyse"}, 4.0]]
+    with urllib.request.urlopen(client.url + "/metrics") as response:
+        assert 'videodoc_retries_total{stage="analyse"} 4.0' in response.read().decode("utf-8")
+
+
+def test_slots_are_capped_across_processes(store):
+    first = store.acquire_slot("generate", 1, "worker-1")
+    acquired = threading.Event()
+
+    def second():
+        store.release_slot(store.acquire_slot("generate", 1, "worker-2", poll_interval=0.01))
+        acquired.set()
+
+    threading.Thread(target=second, daemon=True).start()
+    assert not acquired.wait(0.2)
+    store.release_slot(first)
+    assert acquired.wait(5)
+
+
+def test_slots_of_dead_workers_expire(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.sqlite3"), lease=0.05)
+    store.acquire_slot("upload", 1, "dead-worker")
+    time.sleep(0.1)
+    store.release_slot(store.acquire_slot("upload", 1, "worker", poll_interval=0.01))
+
+
+def test_inflight_takes_a_shared_slot(store, monkeypatch):
+    share_inflight_limits(store, "worker")
+    try:
+        with inflight("upload"):
+            with store._connect() as db:
+                assert db.execute("SELECT owner FROM slots WHERE kind = 'upload'").fetchall()[0][0] == "worker"
+    finally:
+        share_inflight_limits(None, None)
+    with store._connect() as db:
+        assert db.execute("SELECT COUNT(*) FROM slots").fetchone()[0] == 0
+
+
+def test_rerender_payload_is_normalized(store, video):
+    job_id = finished_job(store, video)
+    edited = dict(PROCESS, list_of_applications=[{"application_name": "Mail", "type": "Desktop"}])
+    store.rerender(job_id, edited)
+    payload = json.loads(store.claim("worker")["payload"])
+    assert payload["list_of_applications"] == [{"application_name": "Mail", "type": "Desktop", "url": None}]
+
+
+def test_unreachable_service_raises_runtime_error(video):
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    client = JobServiceClient(f"http://127.0.0.1:{port}")
+    with pytest.raises(RuntimeError, match="Job service unavailable"):
+        client.submit(video)
+    with pytest.raises(RuntimeError, match="Job service unavailable"):
+        client.get("abc")
+
+
+def test_service_timeout_raises_runtime_error():
+    # Accepts connections but never answers
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    sock.listen()
+    try:
+        client = JobServiceClient(f"http://127.0.0.1:{sock.getsockname()[1]}", timeout=0.2)
+        with pytest.raises(RuntimeError, match="Job service unavailable"):
+            client.get("abc")
+    finally:
+        sock.close()
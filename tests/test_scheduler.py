@@ -0,0 +1,91 @@
+import threading
+
+import pytest
+
+from scheduler import FairScheduler
+
+
+@pytest.fixture
+def busy_scheduler():
+    """A one-worker scheduler whose worker is held by a blocking task, so submissions stay queued."""
+    started = threading.Event()
+    release = threading.Event()
+
+    def run(task_id, payload):
+        if task_id == "blocker":
+            started.set()
+            release.wait(5)
+
+    def make(weights=None):
+        scheduler = FairScheduler(run=run, max_running=1, max_queued=100, max_queued_per_user=100,
+                                  max_wait=10 ** 9, weights=weights or {})
+        scheduler.submit("blocker", "someone", 1.0, None)
+        assert started.wait(5)
+        return scheduler
+
+    yield make
+    release.set()
+
+
+def order(scheduler):
+    positions = scheduler.positions()
+    return sorted(positions, key=lambda task_id: positions[task_id][0])
+
+
+def test_light_user_overtakes_a_heavy_backlog(busy_scheduler):
+    scheduler = busy_scheduler()
+    for index in range(3):
+        scheduler.submit(f"heavy-{index}", "heavy", 100.0, None)
+    scheduler.submit("light-0", "light", 10.0, None)
+    assert order(scheduler) == ["light-0", "heavy-0", "heavy-1", "heavy-2"]
+
+
+def test_equal_users_alternate(busy_scheduler):
+    scheduler = busy_scheduler()
+    for index in range(2):
+        scheduler.submit(f"a-{index}", "a", 50.0, None)
+    for index in range(2):
+        scheduler.submit(f"b-{index}", "b", 50.0, None)
+    assert order(scheduler) == ["a-0", "b-0", "a-1", "b-1"]
+
+
+def test_weight_gives_a_larger_share(busy_scheduler):
+    scheduler = busy_scheduler(weights={"a": 2.0})
+    for index in range(3):
+        scheduler.submit(f"b-{index}", "b", 100.0, None)
+        scheduler.submit(f"a-{index}", "a", 100.0, None)
+    # a's tags advance half as fast: 50, 100, 150 against b's 100, 200, 300
+    assert order(scheduler) == ["a-0", "b-0", "a-1", "a-2", "b-1", "b-2"]
+
+
+def test_admission_rejects_a_full_user_queue(busy_scheduler):
+    scheduler = busy_scheduler()
+    scheduler.max_queued_per_user = 1
+    scheduler.submit("a-0", "a", 10.0, None)
+    with pytest.raises(RuntimeError, match="already have 1 videos waiting"):
+        scheduler.submit("a-1", "a", 10.0, None)
+    scheduler.submit("b-0", "b", 10.0, None)
+
+
+def test_queued_tasks_run_in_fair_order():
+    ran = []
+    done = threading.Event()
+    gate = threading.Event()
+
+    def run(task_id, payload):
+        if task_id == "blocker":
+            gate.wait(5)
+            return
+        ran.append(task_id)
+        if len(ran) == 3:
+            done.set()
+
+    scheduler = FairScheduler(run=run, max_running=1, max_queued=100, max_queued_per_user=100,
+                              max_wait=10 ** 9, weights={})
+    scheduler.submit("blocker", "someone", 1.0, None)
+    scheduler.submit("heavy-0", "heavy", 100.0, None)
+    scheduler.submit("heavy-1", "heavy", 100.0, None)
+    scheduler.submit("light-0", "light", 10.0, None)
+    gate.set()
+    assert done.wait(5)
+    assert ran == ["light-0", "heavy-0", "heavy-1"]
@@ -0,0 +1,64 @@
+import subprocess
+
+import pytest
+
+import segmented_analysis
+from segmented_analysis import merge_segment_results, plan_segments, split_video
+
+
+def group(name, *steps):
+    return {"group_name": name, "numbering": "", "time_stamp": steps[0][1] if steps else "",
+            "sub_steps": [{"step": text, "numbering": "", "time_stamp": stamp} for text, stamp in steps]}
+
+
+def analysis(*groups):
+    return {"process_name": "p", "short_process_description": "", "list_of_applications": [],
+            "list_of_steps": list(groups), "exceptions": [], "clarifications": []}
+
+
+def test_plan_segments_overlap():
+    assert plan_segments(1500, 600, 30) == [(0.0, 600), (570, 1170), (1140, 1500)]
+
+
+@pytest.mark.parametrize("overlap", [-1, 600, 900])
+def test_plan_segments_rejects_an_overlap_that_never_advances(overlap):
+    with pytest.raises(ValueError, match="Segment overlap"):
+        plan_segments(1500, 600, overlap)
+
+
+def test_similar_groups_within_a_segment_stay_separate():
+    merged = merge_segment_results([
+        (0, 600, analysis(group("Enter invoice", ("Type amount", "00:10")),
+                          group("Enter invoices", ("Type date", "00:20")))),
+    ])
+    assert [g["group_name"] for g in merged["list_of_steps"]] == ["Enter invoice", "Enter invoices"]
+
+
+def test_group_continuing_across_the_seam_is_joined():
+    merged = merge_segment_results([
+        (0, 600, analysis(group("Enter invoice", ("Type amount", "09:50")))),
+        (570, 1170, analysis(group("Enter invoice", ("Type amount", "00:20"), ("Press save", "00:40")),
+                             group("Enter invoice", ("Type amount again", "05:00")))),
+    ])
+    steps = merged["list_of_steps"]
+    assert len(steps) == 2
+    assert [s["step"] for s in steps[0]["sub_steps"]] == ["Type amount", "Press save"]
+    assert steps[0]["sub_steps"][1] == {"step": "Press save", "numbering": "1.2", "time_stamp": "10:10"}
+    assert steps[1]["numbering"] == "2.0"
+
+
+def test_split_video_shifts_to_the_keyframe(monkeypatch, tmp_path):
+    commands = []
+
+    def run(command, **kwargs):
+        commands.append(command)
+        if command[0] == "ffprobe":
+            return subprocess.CompletedProcess(command, 0, stdout="565.200000\n568.433000,\n", stderr="")
+        return subprocess.CompletedProcess(command, 0)
+
+    monkeypatch.setattr(segmented_analysis.subprocess, "run", run)
+    pieces = split_video("in.mp4", [(0.0, 600), (570, 1170)], str(tmp_path))
+    assert [start for _, start in pieces] == [0.0, 568.433]
+    cut = commands[-1]
+    assert cut[cut.index("-ss") + 1] == "568.433"
+    assert cut[cut.index("-t") + 1] == "601.567"
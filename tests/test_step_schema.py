@@ -0,0 +1,60 @@
+import json
+
+from step_schema import close_truncated_json, repair_locally
+
+VALID = {
+    "process_name": "Invoice approval",
+    "short_process_description": "Approve an invoice",
+    "list_of_applications": [{"application_name": "SAP", "type": "Desktop"}],
+    "list_of_steps": [{
+        "group_name": "Open invoice",
+        "numbering": "1",
+        "time_stamp": "00:01",
+        "sub_steps": [{"step": "Open SAP", "numbering": "1.1", "time_stamp": "00:01"}],
+    }],
+    "exceptions": [],
+    "clarifications": [],
+}
+
+
+def test_repair_locally_accepts_valid_json():
+    data, errors = repair_locally(json.dumps(VALID))
+    assert errors == []
+    assert data["list_of_applications"][0]["url"] is None
+
+
+def test_repair_locally_strips_trailing_commas_and_fences():
+    text = "```json\n" + json.dumps(VALID)[:-1] + ",}\n```"
+    data, errors = repair_locally(text)
+    assert errors == []
+    assert data["process_name"] == "Invoice approval"
+
+
+def test_repair_locally_closes_truncated_json():
+    text = json.dumps(VALID)
+    data, errors = repair_locally(text[:text.index('"exceptions"')])
+    assert errors == []
+    assert data["exceptions"] == []
+
+
+def test_repair_locally_replaces_explicit_nulls():
+    data, errors = repair_locally('{"process_name":"x","list_of_applications":null}')
+    assert errors == []
+    assert data["list_of_applications"] == []
+    assert data["short_process_description"] == ""
+
+
+def test_repair_locally_replaces_null_sub_steps():
+    text = ('{"process_name":"x","list_of_steps":'
+            '[{"group_name":"g","numbering":"1","time_stamp":null,"sub_steps":null}]}')
+    data, errors = repair_locally(text)
+    assert errors == []
+    assert data["list_of_steps"][0] == {"group_name": "g", "numbering": "1", "time_stamp": "", "sub_steps": []}
+
+
+def test_repair_locally_reports_unparseable_text():
+    assert repair_locally("no json here") == (None, ["$: response is not valid JSON"])
+
+
+def test_close_truncated_json_returns_none_without_object():
+    assert close_truncated_json("plain text") is None
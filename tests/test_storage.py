@@ -0,0 +1,28 @@
+import os
+import threading
+
+from storage import BUFFERS, write_artifact
+
+
+def test_concurrent_artifact_writes_stay_whole(tmp_path):
+    path = str(tmp_path / "process.docx")
+    payloads = [bytes([index]) * 500000 for index in range(8)]
+    errors = []
+
+    def write(data):
+        try:
+            for _ in range(5):
+                write_artifact(path, data)
+        except OSError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=write, args=(data,)) for data in payloads]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors
+    with open(path, "rb") as f:
+        assert f.read() in payloads
+    assert os.listdir(tmp_path) == ["process.docx"]
+    BUFFERS.discard(path)
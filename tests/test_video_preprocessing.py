@@ -0,0 +1,52 @@
+import subprocess
+
+import pytest
+
+import video_preprocessing
+from video_preprocessing import parse_dedupe, preprocess_video
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("1", True), ("on", True), ("TRUE", True), (True, True),
+    ("0", False), ("off", False), ("false", False), ("no", False), (False, False),
+    ("auto", "auto"), (" Auto ", "auto"),
+])
+def test_parse_dedupe(value, expected):
+    assert parse_dedupe(value) == expected
+
+
+def test_parse_dedupe_rejects_other_values():
+    with pytest.raises(ValueError, match="Invalid dedupe setting"):
+        parse_dedupe("sometimes")
+
+
+@pytest.fixture
+def ffmpeg(monkeypatch, tmp_path):
+    commands = []
+
+    def run(command, **kwargs):
+        commands.append(command)
+        with open(command[-1], "wb") as f:
+            f.write(b"\0" * 10)
+        return subprocess.CompletedProcess(command, 0, "", "pts_time:0.0 pts_time:1.5")
+
+    def probe(video_path):
+        return {"format_name": "mp4", "duration": 10.0, "has_audio": True, "width": 1920, "height": 1080}
+
+    monkeypatch.setattr(video_preprocessing.subprocess, "run", run)
+    monkeypatch.setattr(video_preprocessing, "probe_video", probe)
+    video = tmp_path / "video.mp4"
+    video.write_bytes(b"\0" * 100)
+    return str(video), str(tmp_path), commands
+
+
+@pytest.mark.parametrize("dedupe, dropped", [("off", False), ("0", False), ("auto", False), ("on", True)])
+def test_dedupe_setting_controls_the_command(ffmpeg, dedupe, dropped):
+    video, output_dir, commands = ffmpeg
+    report = preprocess_video(video, output_dir, dedupe=dedupe)
+    command = commands[-1]
+    filters = command[command.index("-vf") + 1]
+    assert ("mpdecimate" in filters) == dropped
+    assert ("-an" in command) == dropped
+    assert ("-c:a" in command) != dropped
+    assert (report["timestamp_map"] == [0.0, 1.5]) == dropped
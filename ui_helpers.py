@@ -0,0 +1,44 @@
+import json
+import os
+import uuid
+
+import streamlit as st
+
+# Headers an authenticating proxy may set to identify the user, for fair scheduling
+USER_HEADERS = ("X-Forwarded-User", "X-Forwarded-Email")
+# Any client can send those headers, so only set this to 1 behind a proxy that overwrites them
+TRUST_PROXY_USER_HEADERS = os.getenv("TRUST_PROXY_USER_HEADERS", "0") == "1"
+
+
+def current_user():
+    """The user jobs are queued under: the proxy-authenticated user, else this browser session."""
+    if TRUST_PROXY_USER_HEADERS:
+        headers = getattr(getattr(st, "context", None), "headers", None) or {}
+        for header in USER_HEADERS:
+            if headers.get(header):
+                return headers[header]
+    if "user_id" not in st.session_state:
+        st.session_state.user_id = "session-" + uuid.uuid4().hex[:12]
+    return st.session_state.user_id
+
+
+def show_editor(manager, job):
+    """Let the user correct the extracted steps and update the files without a new analysis."""
+    try:
+        json_data = manager.analysis(job.job_id)
+    except RuntimeError as e:
+        st.warning(str(e))
+        return
+    if json_data is None:
+        return
+    with st.expander("Edit the extracted steps"):
+        text = st.text_area("Process JSON", value=json.dumps(json_data, indent=2), height=400,
+                            key=f"edit-{job.job_id}")
+        if st.button("Update files"):
+            # Only the sections that changed are rendered again
+            try:
+                manager.rerender(job.job_id, json.loads(text))
+            except (ValueError, RuntimeError) as e:
+                st.error(f"Could not update the files: {e}")
+            else:
+                st.rerun()
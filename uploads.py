@@ -0,0 +1,41 @@
+import hashlib
+import os
+import tempfile
+
+from result_cache import HASH_CHUNK_SIZE
+
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", "temp_videos")
+
+
+def save_upload(source, filename, upload_dir=UPLOAD_DIR, chunk_size=HASH_CHUNK_SIZE):
+    """Stream an uploaded file to disk under its content hash and return (path, video_hash).
+
+    source is any binary file object, such as Streamlit's UploadedFile. The
+    data is copied in chunks while it is hashed, written to a temporary file
+    and renamed into place, so memory stays bounded, readers never see a
+    partial file and identical uploads share one file on disk.
+    """
+    os.makedirs(upload_dir, exist_ok=True)
+    extension = os.path.splitext(filename)[1].lower()
+    digest = hashlib.sha256()
+    if hasattr(source, "seek"):
+        source.seek(0)
+    fd, tmp_path = tempfile.mkstemp(dir=upload_dir, prefix=".upload_", suffix=extension)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            for chunk in iter(lambda: source.read(chunk_size), b""):
+                digest.update(chunk)
+                f.write(chunk)
+        video_hash = digest.hexdigest()
+        path = os.path.join(upload_dir, video_hash + extension)
+        if os.path.exists(path):
+            # Same content uploaded before; keep the existing file
+            os.remove(tmp_path)
+            os.utime(path)
+        else:
+            os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return path, video_hash
@@ -0,0 +1,155 @@
+import json
+import os
+import re
+import subprocess
+import time
+
+from segmented_analysis import format_timestamp, parse_timestamp
+
+
+def parse_dedupe(value):
+    """Read a dedupe setting: True, False or "auto" (drop static frames only without audio)."""
+    if isinstance(value, bool):
+        return value
+    text = str(value).strip().lower()
+    if text in ("1", "true", "yes", "on"):
+        return True
+    if text in ("0", "false", "no", "off"):
+        return False
+    if text == "auto":
+        return "auto"
+    raise ValueError(f"Invalid dedupe setting {value!r}: use on, off or auto.")
+
+
+PREPROCESS_VIDEO = os.getenv("PREPROCESS_VIDEO", "0") == "1"
+PREPROCESS_MAX_HEIGHT = int(os.getenv("PREPROCESS_MAX_HEIGHT", "720"))
+PREPROCESS_FPS = float(os.getenv("PREPROCESS_FPS", "2"))
+# Dropping static frames shortens the timeline, which would desync narration, so
+# by default it only applies to recordings without an audio track
+PREPROCESS_DEDUPE = parse_dedupe(os.getenv("PREPROCESS_DEDUPE", "auto"))
+# Used to estimate the upload time saved, in bytes per second
+UPLOAD_BANDWIDTH = float(os.getenv("UPLOAD_BANDWIDTH", str(2.5 * 1024 * 1024)))
+
+# Container names reported by ffprobe and the MIME types Gemini expects for them
+MIME_TYPES = {
+    "mp4": "video/mp4",
+    "mov": "video/quicktime",
+    "avi": "video/x-msvideo",
+    "matroska": "video/x-matroska",
+    "webm": "video/webm",
+}
+EXTENSION_MIME_TYPES = {
+    ".mp4": "video/mp4",
+    ".mov": "video/quicktime",
+    ".avi": "video/x-msvideo",
+    ".mkv": "video/x-matroska",
+}
+
+
+def sniff_mime_type(video_path):
+    """Detect the container from the file's magic bytes."""
+    with open(video_path, "rb") as f:
+        header = f.read(16)
+    if header[4:8] == b"ftyp":
+        return "video/quicktime" if header[8:10] == b"qt" else "video/mp4"
+    if header[:4] == b"RIFF" and header[8:12] == b"AVI ":
+        return "video/x-msvideo"
+    if header[:4] == b"\x1a\x45\xdf\xa3":
+        return "video/webm" if b"webm" in header else "video/x-matroska"
+    return None
+
+
+def detect_mime_type(video_path):
+    """Return the MIME type of the actual container, falling back to the file extension."""
+    mime_type = sniff_mime_type(video_path)
+    if mime_type is None:
+        mime_type = EXTENSION_MIME_TYPES.get(os.path.splitext(video_path)[1].lower(), "video/mp4")
+    return mime_type
+
+
+def probe_video(video_path):
+    result = subprocess.run(
+        ["ffprobe", "-v", "error", "-show_format", "-show_streams", "-of", "json", video_path],
+        capture_output=True, text=True, check=True,
+    )
+    info = json.loads(result.stdout)
+    video = next((s for s in info["streams"] if s.get("codec_type") == "video"), {})
+    return {
+        "format_name": info["format"].get("format_name", ""),
+        "duration": float(info["format"].get("duration", 0) or 0),
+        "has_audio": any(s.get("codec_type") == "audio" for s in info["streams"]),
+        "width": video.get("width"),
+        "height": video.get("height"),
+    }
+
+
+def preprocess_video(video_path, output_dir, max_height=PREPROCESS_MAX_HEIGHT, fps=PREPROCESS_FPS,
+                     dedupe=PREPROCESS_DEDUPE):
+    """Shrink a recording before upload: lower fps, downscale and optionally drop static frames.
+
+    Returns a report with the new path and MIME type, byte and time savings,
+    and, when frames were dropped, timestamp_map: the original time in
+    seconds of every output frame, used to map step time stamps back.
+    """
+    started = time.time()
+    dedupe = parse_dedupe(dedupe)
+    info = probe_video(video_path)
+    if dedupe == "auto":
+        dedupe = not info["has_audio"]
+    filters = [f"fps={fps}"]
+    if dedupe:
+        # showinfo logs the original pts of every frame mpdecimate keeps
+        filters += ["mpdecimate", "showinfo", f"setpts=N/({fps}*TB)"]
+    filters.append(f"scale=-2:'min({max_height},ih)'")
+    output_path = os.path.join(output_dir, os.path.splitext(os.path.basename(video_path))[0] + "_preprocessed.mp4")
+    command = ["ffmpeg", "-hide_banner", "-y", "-i", video_path, "-vf", ",".join(filters), "-r", str(fps),
+               "-c:v", "libx264", "-preset", "veryfast", "-crf", "28", "-pix_fmt", "yuv420p"]
+    command += ["-an"] if dedupe else ["-c:a", "aac", "-b:a", "64k", "-ac", "1"]
+    command += ["-movflags", "+faststart", output_path]
+    result = subprocess.run(command, capture_output=True, text=True, check=True)
+
+    timestamp_map = None
+    if dedupe:
+        timestamp_map = [float(value) for value in re.findall(r"pts_time:\s*([0-9.]+)", result.stderr)]
+    original_bytes = os.path.getsize(video_path)
+    new_bytes = os.path.getsize(output_path)
+    duration = len(timestamp_map) / fps if timestamp_map else info["duration"]
+    report = {
+        "path": output_path,
+        "mime_type": "video/mp4",
+        "source_mime_type": MIME_TYPES.get(info["format_name"].split(",")[0], detect_mime_type(video_path)),
+        "fps": fps,
+        "timestamp_map": timestamp_map,
+        "original_bytes": original_bytes,
+        "bytes": new_bytes,
+        "bytes_saved": original_bytes - new_bytes,
+        "original_duration": info["duration"],
+        "duration": duration,
+        "duration_saved": max(0.0, info["duration"] - duration),
+        "preprocess_seconds": time.time() - started,
+    }
+    report["upload_seconds_saved"] = report["bytes_saved"] / UPLOAD_BANDWIDTH - report["preprocess_seconds"]
+    print(f"Pre-processed video: {original_bytes / 1e6:.1f} MB -> {new_bytes / 1e6:.1f} MB, "
+          f"{format_timestamp(info['duration'])} -> {format_timestamp(duration)} of video, "
+          f"~{report['upload_seconds_saved']:.0f} s upload time saved")
+    return report
+
+
+def map_timestamp(seconds, timestamp_map, fps):
+    """Map a time in the pre-processed video back to the original recording."""
+    if not timestamp_map:
+        return seconds
+    index = min(max(int(seconds * fps), 0), len(timestamp_map) - 1)
+    return timestamp_map[index]
+
+
+def remap_timestamps(json_data, timestamp_map, fps):
+    """Rewrite every time_stamp in the step JSON to refer to the original recording."""
+    if not timestamp_map:
+        return json_data
+    for group in json_data.get("list_of_steps", []):
+        for item in [group, *group.get("sub_steps", [])]:
+            seconds = parse_timestamp(item.get("time_stamp"))
+            if seconds is not None:
+                item["time_stamp"] = format_timestamp(map_timestamp(seconds, timestamp_map, fps))
+    return json_data